@@ -0,0 +1,143 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+from analyzers.internals.model_store import ModelStore
+from analyzers.internals.query_backend import DatabaseCache, QueryBackend
+from analyzers.internals.query_catalog import QUERY_CATALOG
+
+# the measures of every ranking entry by podcast genre, country and ranking genre, with the episodes of the ranked
+# podcast aggregated per podcast first (an entry counts all episodes of its podcast, as the joins of the queries did)
+QUERY_CATALOG.register('aggregate_cube.cells', '''
+    WITH PodcastEpisodes AS (
+        SELECT
+            Episodes.PodcastId AS PodcastId,
+            COUNT(*) AS EpisodeCount,
+            SUM(Episodes.DurationMs) AS DurationSum,
+            COUNT(Episodes.DurationMs) AS DurationCount,
+            SUM(EpisodeDates.EpochDay) AS EpochDaySum,
+            COUNT(EpisodeDates.EpochDay) AS EpochDayCount
+        FROM Episodes
+        INNER JOIN EpisodeDates ON EpisodeDates.EpisodeId = Episodes.Id
+        GROUP BY Episodes.PodcastId
+    )
+    SELECT
+        Podcasts.Genre AS Genre,
+        Rankings.Country AS Country,
+        Rankings.Genre AS RankingGenre,
+        COUNT(*) AS Entries,
+        SUM(RankedPodcasts.Rank) AS RankSum,
+        MIN(CASE WHEN PodcastEpisodes.PodcastId IS NOT NULL THEN RankedPodcasts.Rank END) AS MinRank,
+        COUNT(DISTINCT PodcastEpisodes.PodcastId) AS Podcasts,
+        COALESCE(SUM(PodcastEpisodes.EpisodeCount), 0) AS EpisodeCount,
+        COALESCE(SUM(PodcastEpisodes.DurationSum), 0) AS DurationSum,
+        COALESCE(SUM(PodcastEpisodes.DurationCount), 0) AS DurationCount,
+        COALESCE(SUM(PodcastEpisodes.EpochDaySum), 0) AS EpochDaySum,
+        COALESCE(SUM(PodcastEpisodes.EpochDayCount), 0) AS EpochDayCount
+    FROM RankedPodcasts
+    INNER JOIN Rankings ON Rankings.Id = RankedPodcasts.RankingId
+    INNER JOIN Podcasts ON Podcasts.Id = RankedPodcasts.PodcastId
+    LEFT JOIN PodcastEpisodes ON PodcastEpisodes.PodcastId = Podcasts.Id
+    GROUP BY Podcasts.Genre, Rankings.Country, Rankings.Genre
+''')
+
+# a dense podcast genre x country x ranking genre cube of the measures of all ranking entries, built in one pass per
+# database version and stored in the model store next to the database (<data_dir>/models/aggregate_cube.npz).
+# The genre/region views are roll-ups (sums over the dropped axes) and slices (where) of the cube:
+#   Entries        the number of ranking entries
+#   RankSum        the sum of their ranks
+#   MinRank        the best rank of the entries of podcasts with episodes (rolled up by minimum, NaN if none)
+#   Podcasts       the number of distinct podcasts with episodes. A podcast has one genre, so this only adds up
+#                  over the Genre axis, not over countries or ranking genres
+#   EpisodeCount   the episodes of the ranked podcasts, counted once per entry
+#   DurationSum, DurationCount, EpochDaySum, EpochDayCount   sums and counts of the (known) episode durations
+#                  and release days, counted once per entry
+class AggregateCube:
+    MODEL_NAME: str = 'aggregate_cube'
+    AXES: List[str] = ['Genre', 'Country', 'RankingGenre']
+    MEASURES: List[str] = ['Entries', 'RankSum', 'MinRank', 'Podcasts', 'EpisodeCount', 'DurationSum', 'DurationCount', 'EpochDaySum', 'EpochDayCount']
+    __cubes: DatabaseCache['AggregateCube'] = DatabaseCache()
+
+    # the labels of every axis
+    __labels: List[np.ndarray]
+    # genres x countries x ranking genres, int64 (MinRank float64)
+    __measures: Dict[str, np.ndarray]
+
+    def __init__(self, labels: List[np.ndarray], measures: Dict[str, np.ndarray]) -> None:
+        self.__labels = labels
+        self.__measures = measures
+
+    # returns the (shared) cube of the database the backend reads from (see DatabaseCache), loaded from the model
+    # store if it has been built for the database version before
+    @staticmethod
+    def for_backend(backend: QueryBackend) -> 'AggregateCube':
+        return AggregateCube.__cubes.get(backend, lambda: AggregateCube.__load_or_build(backend))
+
+    @staticmethod
+    def __load_or_build(backend: QueryBackend) -> 'AggregateCube':
+        store: ModelStore = ModelStore.for_database(backend.db_path())
+        state: Optional[Dict[str, np.ndarray]] = store.load(AggregateCube.MODEL_NAME, backend.db_version()) if backend.db_version() != 'unknown' else None
+        if state is not None:
+            return AggregateCube.from_state(state)
+        cube: AggregateCube = AggregateCube.from_cells(QUERY_CATALOG.execute(backend, 'aggregate_cube.cells'))
+        if backend.db_version() != 'unknown':
+            store.save(AggregateCube.MODEL_NAME, backend.db_version(), cube.state())
+        return cube
+
+    # builds the cube from its non-empty cells (AXES and MEASURES columns, see aggregate_cube.cells)
+    @staticmethod
+    def from_cells(cells: DataFrame) -> 'AggregateCube':
+        codes: List[np.ndarray] = []
+        labels: List[np.ndarray] = []
+        for axis in AggregateCube.AXES:
+            axis_codes, axis_labels = pd.factorize(cells[axis], sort=True, use_na_sentinel=False)
+            codes.append(axis_codes)
+            labels.append(np.asarray(axis_labels, dtype=object))
+        shape: Tuple[int, ...] = tuple(len(axis_labels) for axis_labels in labels)
+        measures: Dict[str, np.ndarray] = {}
+        for measure in AggregateCube.MEASURES:
+            if measure == 'MinRank':
+                values: np.ndarray = np.full(shape, np.nan)
+                values[tuple(codes)] = pd.to_numeric(cells[measure]).to_numpy(dtype=np.float64)
+            else:
+                values = np.zeros(shape, dtype=np.int64)
+                values[tuple(codes)] = pd.to_numeric(cells[measure]).fillna(0).to_numpy(dtype=np.int64)
+            measures[measure] = values
+        return AggregateCube(labels, measures)
+
+    # returns the cube as state arrays (see ModelStore)
+    def state(self) -> Dict[str, np.ndarray]:
+        state: Dict[str, np.ndarray] = {f'axis.{axis}': axis_labels.astype(str) for axis, axis_labels in zip(AggregateCube.AXES, self.__labels)}
+        state.update({f'measure.{measure}': values for measure, values in self.__measures.items()})
+        return state
+
+    @staticmethod
+    def from_state(state: Dict[str, np.ndarray]) -> 'AggregateCube':
+        labels: List[np.ndarray] = [state[f'axis.{axis}'].astype(object) for axis in AggregateCube.AXES]
+        return AggregateCube(labels, {measure: state[f'measure.{measure}'] for measure in AggregateCube.MEASURES})
+
+    def labels(self, axis: str) -> np.ndarray:
+        return self.__labels[AggregateCube.AXES.index(axis)].copy()
+
+    # rolls the cube up to the given axes: the measures of the cells selected by where (a predicate on the labels of
+    # an axis) are summed up over all other axes. Returns the by columns and the measures of all cells with entries
+    def roll_up(self, by: List[str], measures: List[str], where: Optional[Dict[str, Callable[[Any], bool]]] = None) -> DataFrame:
+        where = where if where is not None else {}
+        dropped: Tuple[int, ...] = tuple(index for index, axis in enumerate(AggregateCube.AXES) if axis not in by)
+        if 'Podcasts' in measures and any(AggregateCube.AXES[index] != 'Genre' for index in dropped):
+            raise Exception('Distinct podcasts can only be rolled up over the Genre axis')
+        selections: List[np.ndarray] = [np.flatnonzero([bool(where[axis](label)) for label in axis_labels]) if axis in where else np.arange(len(axis_labels)) for axis, axis_labels in zip(AggregateCube.AXES, self.__labels)]
+        cells = np.ix_(*selections)
+        entries: np.ndarray = self.__measures['Entries'][cells].sum(axis=dropped)
+        values: Dict[str, np.ndarray] = {}
+        for measure in measures:
+            selected: np.ndarray = self.__measures[measure][cells]
+            # fmin ignores the NaN of cells without podcasts with episodes
+            values[measure] = np.fmin.reduce(selected, axis=dropped) if measure == 'MinRank' else selected.sum(axis=dropped)
+        kept: List[int] = [index for index in range(len(AggregateCube.AXES)) if index not in dropped]
+        grid: List[np.ndarray] = np.meshgrid(*[self.__labels[index][selections[index]] for index in kept], indexing='ij')
+        present: np.ndarray = entries.ravel() > 0
+        data = DataFrame({AggregateCube.AXES[index]: labels.ravel()[present] for index, labels in zip(kept, grid)})
+        for measure in measures:
+            data[measure] = values[measure].ravel()[present]
+        return data[by + measures].sort_values(by=by, kind='mergesort').reset_index(drop=True)
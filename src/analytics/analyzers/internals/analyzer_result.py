@@ -1,37 +1,52 @@
+import copy
+import io
 import matplotlib as mpl
 from matplotlib.figure import Figure
 from pandas import DataFrame
 from contextlib import contextmanager
-import matplotlib.pyplot as plt
 from typing import Any, Callable, Generator, List, Optional, Tuple
+from analyzers.internals.figures import FigureStyle, show_figure
 
 class AnalyzerResult:
     __data_frame: DataFrame
     __render: Callable[['AnalyzerResult'], Figure]
     __model: Optional['AnalyzerResultModel'] = None
+    # the style (seaborn theme) the figure is rendered in, see FigureStyle
+    __style: Optional[str]
 
-    def __init__(self, data_frame: DataFrame, render: Callable[['AnalyzerResult'], Figure]) -> None:
+    def __init__(self, data_frame: DataFrame, render: Callable[['AnalyzerResult'], Figure], style: Optional[str] = None) -> None:
         self.__data_frame = data_frame
         self.__render = render
+        self.__style = style
         if mpl.is_interactive():
             mpl.interactive(False)
 
     def get_data_frame(self) -> DataFrame:
         return self.__data_frame
     
+    # returns a copy of the result (of the same type) with the same rendering and model, but a different data frame
+    def with_data_frame(self, data_frame: DataFrame) -> 'AnalyzerResult':
+        result = copy.copy(self)
+        result.__data_frame = data_frame
+        if self.__model is self:
+            # models are their own model
+            result.__model = result
+        return result
+
     def get_model(self) -> Optional['AnalyzerResultModel']:
         return self.__model
     
     def set_model(self, model: 'AnalyzerResultModel') -> None:
         self.__model = model
     
+    # renders the figure (with seaborn, on its own canvas), the style applies until the context is left, so that the
+    # figure is also saved in it
     @contextmanager
     def render(self: 'AnalyzerResult') -> Generator['RenderedAnalyzerResult', Any, Any]:
-        # uses seaborn to render the plot
-        plot: Figure = self.__render(self)
-        yield RenderedAnalyzerResult(plot)
-        plt.close(plot)
-    
+        with FigureStyle.use(self.__style):
+            with RenderedAnalyzerResult(self.__render(self)) as rendered_result:
+                yield rendered_result
+
 
 class AnalyzerResultModel(AnalyzerResult):
     _model_visualizations: List[Callable[[AnalyzerResult], Figure]]
@@ -39,7 +54,7 @@ class AnalyzerResultModel(AnalyzerResult):
     _palette: str
 
     def __init__(self, data_frame: DataFrame, theme: str, palette: str, render: Callable[['AnalyzerResult'], Figure]) -> None:
-        super().__init__(data_frame, render)
+        super().__init__(data_frame, render, theme)
         self._theme = theme
         self._palette = palette
         self._model_visualizations = []
@@ -51,7 +66,7 @@ class AnalyzerResultModel(AnalyzerResult):
     def get_visualizations(self) -> List[Tuple[AnalyzerResult, str]]:
         visualizations: List[Tuple[AnalyzerResult, str]] = []
         for visualization in self._model_visualizations:
-            visualizations.append((AnalyzerResult(self.get_data_frame(), visualization), visualization.__name__))
+            visualizations.append((AnalyzerResult(self.get_data_frame(), visualization, self._theme), visualization.__name__))
         return visualizations
 
 class RenderedAnalyzerResult:
@@ -62,16 +77,23 @@ class RenderedAnalyzerResult:
 
     def visualize(self) -> None:
         if self.__plot is not None:
-            plt.show()
+            show_figure(self.__plot)
 
     def save(self, file_name: str) -> None:
         if self.__plot is not None:
             self.__plot.savefig(file_name, dpi=300)
 
+    # returns the rendered plot as encoded image bytes (e.g. to serve it over HTTP)
+    def to_bytes(self, format: str = 'png') -> bytes:
+        if self.__plot is None:
+            return b''
+        buffer = io.BytesIO()
+        self.__plot.savefig(buffer, format=format, dpi=300)
+        return buffer.getvalue()
+
     def __enter__(self) -> 'RenderedAnalyzerResult':
         return self
 
     def __exit__(self, exc_type, exc_value, traceback) -> None:
-        if self.__plot is not None:
-            plt.close(self.__plot)
-            self.__plot = None
\ No newline at end of file
+        # the figure is not registered with pyplot, releasing it is enough
+        self.__plot = None
\ No newline at end of file
@@ -0,0 +1,70 @@
+from typing import Callable, Dict, List
+import pandas as pd
+from pandas import DataFrame
+from analyzers.internals.analyzer_result import AnalyzerResult
+from analyzers.internals.query_backend import QueryBackend
+from analyzers.internals.query_catalog import QUERY_CATALOG, CatalogQuery
+
+# brings a query result into a backend-independent form: rows in a canonical order, no index and
+# numeric columns as floats (backends disagree on integer widths and on integer vs. float averages)
+def _normalize(data: DataFrame) -> DataFrame:
+    # a meaningful index (e.g. the genres of a pivot table) is compared like the columns
+    data = data.copy() if isinstance(data.index, pd.RangeIndex) else data.reset_index()
+    for column in data.columns:
+        if pd.api.types.is_numeric_dtype(data[column]) and not pd.api.types.is_bool_dtype(data[column]):
+            data[column] = data[column].astype(float)
+        elif pd.api.types.is_datetime64_any_dtype(data[column]):
+            data[column] = data[column].dt.strftime('%Y-%m-%d %H:%M:%S')
+        else:
+            data[column] = data[column].astype(str)
+    # sort by the exact (non-float) columns first, so that rounding differences do not change the row order
+    exact: List[str] = [column for column in data.columns if data[column].dtype != float]
+    return data.sort_values(by=exact + [column for column in data.columns if column not in exact]).reset_index(drop=True)
+
+# runs every catalog query with its example parameters on both backends and compares the results.
+# returns the names of all queries whose results differ (or that failed on the candidate backend).
+# Queries restricted to other backends are skipped
+def check_backend_conformance(reference: QueryBackend, candidate: QueryBackend, rtol: float = 1e-9) -> List[str]:
+    mismatches: List[str] = []
+    names: List[str] = []
+    for name in QUERY_CATALOG.names():
+        query: CatalogQuery = QUERY_CATALOG.get(name)
+        if not query.supports(reference.name()) or not query.supports(candidate.name()):
+            print(f'[SKIPPED] {name} (not supported by both backends)')
+            continue
+        names.append(name)
+        example = query.example()
+        expected: DataFrame = _normalize(QUERY_CATALOG.execute(reference, name, **example))
+        try:
+            actual: DataFrame = _normalize(QUERY_CATALOG.execute(candidate, name, **example))
+            pd.testing.assert_frame_equal(expected, actual, check_dtype=False, rtol=rtol)
+        except Exception as e:
+            first_line: str = str(e).strip().splitlines()[0] if str(e).strip() != '' else type(e).__name__
+            print(f'[MISMATCH] {name}: {first_line}')
+            mismatches.append(name)
+            continue
+        print(f'[OK] {name} ({len(expected)} rows)')
+    print(f'{len(names) - len(mismatches)}/{len(names)} queries conform between {reference.name()} and {candidate.name()}')
+    return mismatches
+
+# runs every capability on both backends and compares their data frames. Unlike the catalog check, this covers the
+# computations on top of the queries (sketches, bootstrap intervals, models) and the full-text lookups, which
+# backends without a full-text index run on the SQLite database (see TextSearch).
+# returns the names of all capabilities whose frames differ (or that failed on the candidate backend)
+def check_capability_conformance(reference: Dict[str, Callable[[], AnalyzerResult]], candidate: Dict[str, Callable[[], AnalyzerResult]], rtol: float = 1e-9) -> List[str]:
+    mismatches: List[str] = []
+    for name in sorted(reference):
+        expected: DataFrame = _normalize(reference[name]().get_data_frame())
+        try:
+            if name not in candidate:
+                raise Exception('missing on the candidate backend')
+            actual: DataFrame = _normalize(candidate[name]().get_data_frame())
+            pd.testing.assert_frame_equal(expected, actual, check_dtype=False, rtol=rtol)
+        except Exception as e:
+            first_line: str = str(e).strip().splitlines()[0] if str(e).strip() != '' else type(e).__name__
+            print(f'[MISMATCH] {name}: {first_line}')
+            mismatches.append(name)
+            continue
+        print(f'[OK] {name} ({len(expected)} rows)')
+    print(f'{len(reference) - len(mismatches)}/{len(reference)} capabilities conform between the backends')
+    return mismatches
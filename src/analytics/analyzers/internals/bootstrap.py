@@ -0,0 +1,152 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+from analyzers.internals.query_backend import DatabaseCache, QueryBackend
+from analyzers.internals.query_catalog import QUERY_CATALOG
+
+# the ranked podcasts by country and ranking genre: their entries and rank sums, and the episodes (count, duration sum
+# and count) of the podcast. These are the units the genre/region averages are resampled from. The resamples draw units
+# by position, so the units are ordered (backends return groups in different orders)
+QUERY_CATALOG.register('bootstrap.ranked_podcasts', '''
+    WITH PodcastEpisodes AS (
+        SELECT
+            PodcastId,
+            COUNT(*) AS EpisodeCount,
+            SUM(DurationMs) AS DurationSum,
+            COUNT(DurationMs) AS DurationCount
+        FROM Episodes
+        GROUP BY PodcastId
+    )
+    SELECT
+        RankedPodcasts.PodcastId AS PodcastId,
+        Podcasts.Genre AS Genre,
+        Rankings.Country AS Country,
+        Rankings.Genre AS RankingGenre,
+        COUNT(*) AS Entries,
+        SUM(RankedPodcasts.Rank) AS RankSum,
+        COALESCE(MAX(PodcastEpisodes.EpisodeCount), 0) AS EpisodeCount,
+        COALESCE(MAX(PodcastEpisodes.DurationSum), 0) AS DurationSum,
+        COALESCE(MAX(PodcastEpisodes.DurationCount), 0) AS DurationCount
+    FROM RankedPodcasts
+    INNER JOIN Rankings ON Rankings.Id = RankedPodcasts.RankingId
+    INNER JOIN Podcasts ON Podcasts.Id = RankedPodcasts.PodcastId
+    LEFT JOIN PodcastEpisodes ON PodcastEpisodes.PodcastId = Podcasts.Id
+    GROUP BY RankedPodcasts.PodcastId, Podcasts.Genre, Rankings.Country, Rankings.Genre
+    ORDER BY RankedPodcasts.PodcastId, Rankings.Country, Rankings.Genre
+''')
+
+# the episode durations of every podcast
+QUERY_CATALOG.register('bootstrap.podcast_durations', '''
+    SELECT
+        Podcasts.Id AS PodcastId,
+        Podcasts.Genre AS Genre,
+        SUM(Episodes.DurationMs) AS DurationSum,
+        COUNT(Episodes.DurationMs) AS DurationCount
+    FROM Podcasts
+    INNER JOIN Episodes ON Episodes.PodcastId = Podcasts.Id
+    GROUP BY Podcasts.Id, Podcasts.Genre
+''')
+
+# resamples the units of every cell: returns the lower and upper quantile of the resampled ratios (sum of the
+# numerators / sum of the denominators) per cell. Every cell draws from its own random stream (seed, cell), so the
+# intervals do not depend on how the cells are split between processes
+def _resample_cells(cells: List[Tuple[int, np.ndarray, np.ndarray]], resamples: int, quantiles: Tuple[float, float], seed: int, chunk_elements: int) -> List[Tuple[float, float]]:
+    intervals: List[Tuple[float, float]] = []
+    for cell, numerators, denominators in cells:
+        units: int = len(numerators)
+        rng: np.random.Generator = np.random.default_rng([seed, cell])
+        # resampled index matrices of at most chunk_elements indices at a time
+        chunk: int = max(1, chunk_elements // units)
+        ratios: List[np.ndarray] = []
+        for start in range(0, resamples, chunk):
+            indices: np.ndarray = rng.integers(0, units, size=(min(chunk, resamples - start), units), dtype=np.uint16 if units <= np.iinfo(np.uint16).max else np.int64)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                ratios.append(numerators[indices].sum(axis=1) / denominators[indices].sum(axis=1))
+        values: np.ndarray = np.concatenate(ratios)
+        values = values[np.isfinite(values)]
+        intervals.append((float(np.quantile(values, quantiles[0])), float(np.quantile(values, quantiles[1]))) if len(values) > 0 else (np.nan, np.nan))
+    return intervals
+
+# percentile bootstrap confidence intervals of averages per cell (e.g. per genre and country). The averages are
+# ratios of sums over independent units (podcasts), e.g. the rank sum over the number of entries, and the units of
+# each cell are resampled with replacement. Resamples are drawn as index matrices, cells are processed in batches of
+# similar size, spread across processes once there is enough work. The settings apply to all analyzers
+class CellBootstrap:
+    __resamples: int = 10_000
+    __confidence: float = 0.95
+    __seed: int = 0
+    __workers: Optional[int] = None
+    # the number of resampled units (resamples x units) from which on batches run in worker processes
+    __PARALLEL_ELEMENTS: int = 200_000_000
+    __BATCH_ELEMENTS: int = 50_000_000
+    __CHUNK_ELEMENTS: int = 4_000_000
+
+    __ranked_podcasts: DatabaseCache[DataFrame] = DatabaseCache()
+
+    # resamples = 0 disables the intervals
+    @staticmethod
+    def configure(resamples: int, confidence: float = 0.95, seed: int = 0, workers: Optional[int] = None) -> None:
+        if not 0 < confidence < 1:
+            raise Exception('The confidence level must be between 0 and 1')
+        CellBootstrap.__resamples = resamples
+        CellBootstrap.__confidence = confidence
+        CellBootstrap.__seed = seed
+        CellBootstrap.__workers = workers
+
+    @staticmethod
+    def enabled() -> bool:
+        return CellBootstrap.__resamples > 0
+
+    # returns the (shared) ranked podcasts of the database the backend reads from (see bootstrap.ranked_podcasts and
+    # DatabaseCache)
+    @staticmethod
+    def ranked_podcasts(backend: QueryBackend) -> DataFrame:
+        return CellBootstrap.__ranked_podcasts.get(backend, lambda: QUERY_CATALOG.execute(backend, 'bootstrap.ranked_podcasts'))
+
+    # returns the confidence interval (<prefix>Lower, <prefix>Upper) of the ratio of the numerator and denominator sums
+    # of the units of every cell (keys). Without resamples, the intervals are empty (NaN)
+    @staticmethod
+    def ratio_intervals(units: DataFrame, keys: List[str], numerator: str, denominator: str, prefix: str) -> DataFrame:
+        groups = units.groupby(keys, sort=True)
+        cells: DataFrame = groups.size().reset_index()[keys]
+        lower, upper = prefix + 'Lower', prefix + 'Upper'
+        if not CellBootstrap.enabled() or len(cells) == 0:
+            return cells.assign(**{lower: np.nan, upper: np.nan})
+        numerators: np.ndarray = units[numerator].to_numpy(dtype=np.float64)
+        denominators: np.ndarray = units[denominator].to_numpy(dtype=np.float64)
+        # the positions of the units of every cell, in the order of the cells
+        group_ids: np.ndarray = groups.ngroup().to_numpy()
+        order: np.ndarray = np.argsort(group_ids, kind='stable')
+        bounds: np.ndarray = np.searchsorted(group_ids[order], np.arange(len(cells) + 1))
+        batches: List[List[Tuple[int, np.ndarray, np.ndarray]]] = [[]]
+        batch_elements: int = 0
+        total_elements: int = 0
+        for cell in range(len(cells)):
+            positions: np.ndarray = order[bounds[cell]:bounds[cell + 1]]
+            elements: int = len(positions) * CellBootstrap.__resamples
+            if batch_elements > 0 and batch_elements + elements > CellBootstrap.__BATCH_ELEMENTS:
+                batches.append([])
+                batch_elements = 0
+            batches[-1].append((cell, numerators[positions], denominators[positions]))
+            batch_elements += elements
+            total_elements += elements
+        alpha: float = (1 - CellBootstrap.__confidence) / 2
+        arguments = (CellBootstrap.__resamples, (alpha, 1 - alpha), CellBootstrap.__seed, CellBootstrap.__CHUNK_ELEMENTS)
+        workers: int = CellBootstrap.__workers if CellBootstrap.__workers is not None else min(len(batches), os.cpu_count() or 1)
+        if workers > 1 and len(batches) > 1 and total_elements >= CellBootstrap.__PARALLEL_ELEMENTS:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results: List[List[Tuple[float, float]]] = list(executor.map(_resample_cells, batches, *[[argument] * len(batches) for argument in arguments]))
+        else:
+            results = [_resample_cells(batch, *arguments) for batch in batches]
+        intervals: np.ndarray = np.array([interval for batch in results for interval in batch], dtype=np.float64).reshape(-1, 2)
+        return cells.assign(**{lower: intervals[:, 0], upper: intervals[:, 1]})
+
+    # formats an interval for plot annotations, e.g. '[12.3, 15.1]'
+    @staticmethod
+    def format_interval(lower: float, upper: float, format_value: Callable[[float], str] = lambda value: f'{value:.1f}') -> str:
+        if pd.isna(lower) or pd.isna(upper):
+            return ''
+        return f'[{format_value(lower)}, {format_value(upper)}]'
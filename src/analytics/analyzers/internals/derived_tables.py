@@ -0,0 +1,64 @@
+import os
+import sqlite3
+from typing import List, Optional
+
+# bookkeeping of the tables derived from the rankings database (see EpisodeDates and TextIndex). Every derived
+# table is tagged with the database version it has been built for and, for tables built in batches, the position
+# (e.g. the last row id) up to which it has been built, so that an interrupted build can be resumed.
+# The derived tables are stored in a side database next to the rankings database (<db file>.derived.db), which the
+# query backends attach as 'derived': the rankings database itself is never written to
+class DerivedTables:
+    TABLE: str = 'DerivedTables'
+    # the name the side database is attached with
+    SCHEMA: str = 'derived'
+
+    # the side database holding the derived tables of the rankings database
+    @staticmethod
+    def path(db_path: str) -> str:
+        return os.path.abspath(db_path) + '.derived.db'
+
+    # opens the side database to build derived tables in, with the rankings database attached read-only as 'source'
+    @staticmethod
+    def connect(db_path: str) -> sqlite3.Connection:
+        connection = sqlite3.connect(f'file:{DerivedTables.path(db_path)}', uri=True, timeout=600)
+        connection.execute('ATTACH DATABASE ? AS source', (f'file:{os.path.abspath(db_path)}?mode=ro',))
+        return connection
+
+    # returns the version the derived table has been built for, or None if it has not been built (or was removed)
+    @staticmethod
+    def version(connection: sqlite3.Connection, name: str) -> Optional[str]:
+        row = DerivedTables.__marker(connection, name)
+        return None if row is None else str(row[0])
+
+    # returns the position up to which the derived table has been built, or None
+    @staticmethod
+    def position(connection: sqlite3.Connection, name: str) -> Optional[int]:
+        row = DerivedTables.__marker(connection, name)
+        return None if row is None or row[1] is None else int(row[1])
+
+    @staticmethod
+    def mark(connection: sqlite3.Connection, name: str, version: str, position: Optional[int] = None) -> None:
+        connection.execute(f'CREATE TABLE IF NOT EXISTS {DerivedTables.TABLE} (Name TEXT NOT NULL PRIMARY KEY, Version TEXT NOT NULL, Position INTEGER)')
+        # the position has been added later on
+        if 'Position' not in [column[1] for column in connection.execute(f'PRAGMA table_info({DerivedTables.TABLE})')]:
+            connection.execute(f'ALTER TABLE {DerivedTables.TABLE} ADD COLUMN Position INTEGER')
+        connection.execute(f'INSERT OR REPLACE INTO {DerivedTables.TABLE} (Name, Version, Position) VALUES (?, ?, ?)', (name, version, position))
+
+    # the names of all derived tables of the database (as recorded, whether or not they still exist)
+    @staticmethod
+    def names(connection: sqlite3.Connection, schema: str = 'main') -> List[str]:
+        if not DerivedTables.__exists(connection, DerivedTables.TABLE, schema):
+            return []
+        return [str(row[0]) for row in connection.execute(f'SELECT Name FROM {schema}.{DerivedTables.TABLE}')]
+
+    @staticmethod
+    def __marker(connection: sqlite3.Connection, name: str):
+        if not DerivedTables.__exists(connection, DerivedTables.TABLE) or not DerivedTables.__exists(connection, name):
+            return None
+        columns: List[str] = [column[1] for column in connection.execute(f'PRAGMA table_info({DerivedTables.TABLE})')]
+        position: str = 'Position' if 'Position' in columns else 'NULL'
+        return connection.execute(f'SELECT Version, {position} FROM {DerivedTables.TABLE} WHERE Name = ?', (name,)).fetchone()
+
+    @staticmethod
+    def __exists(connection: sqlite3.Connection, table: str, schema: str = 'main') -> bool:
+        return connection.execute(f'SELECT 1 FROM {schema}.sqlite_master WHERE type = \'table\' AND name = ?', (table,)).fetchone() is not None
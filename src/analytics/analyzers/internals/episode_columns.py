@@ -0,0 +1,180 @@
+import os
+import re
+import shutil
+import uuid
+from typing import Callable, Dict, List, Optional
+import numpy as np
+from pandas import DataFrame
+from analyzers.internals.query_backend import DatabaseCache, QueryBackend
+from analyzers.internals.query_catalog import QUERY_CATALOG
+
+QUERY_CATALOG.register('episode_columns.counts', '''
+    SELECT
+        (SELECT COUNT(*) FROM Episodes WHERE PodcastId IS NOT NULL) AS Episodes,
+        (SELECT COUNT(*) FROM RankedPodcasts) AS Entries,
+        (SELECT COUNT(*) FROM Rankings) AS Rankings
+''')
+
+# streamed in chunks, ordered by podcast, so that the episodes of a podcast are a contiguous range
+QUERY_CATALOG.register('episode_columns.episodes', '''
+    SELECT Episodes.PodcastId, Episodes.DurationMs, EpisodeDates.EpochDay, Episodes.ReleaseDatePrecision
+    FROM Episodes
+    LEFT JOIN EpisodeDates ON EpisodeDates.EpisodeId = Episodes.Id
+    WHERE Episodes.PodcastId IS NOT NULL
+    ORDER BY Episodes.PodcastId ASC, Episodes.Id ASC
+''')
+
+QUERY_CATALOG.register('episode_columns.ranked_podcasts', '''
+    SELECT PodcastId, RankingId, Rank
+    FROM RankedPodcasts
+    ORDER BY PodcastId ASC, RankingId ASC
+''')
+
+QUERY_CATALOG.register('episode_columns.rankings', '''
+    SELECT Id AS RankingId, Genre, Country, PodcastDataSetId
+    FROM Rankings
+    ORDER BY Id ASC
+''')
+
+# the hot columns of the episodes and the keys of the rankings as fixed-width numpy arrays, written once per database
+# version next to the database (<data_dir>/columns/<version>/<table>.<column>.npy) and opened memory-mapped, so that
+# all processes analyzing the same version share one (page cache) copy instead of querying and holding their own:
+#   episodes.PodcastId, episodes.DurationMs     int64, the episodes of every podcast are a contiguous range
+#   episodes.EpochDay                           int32, days since 1970-01-01 (see EpisodeDates), MISSING if unknown
+#   episodes.Precision                          int8, the index of the release date precision in PRECISIONS, or -1
+#   ranked_podcasts.PodcastId, .RankingId, .Rank   int64, int64, int32
+#   rankings.RankingId, .PodcastDataSetId       int64 (MISSING if the ranking has no data set), sorted by id
+#   rankings.Genre, .Country                    fixed-width unicode
+# Databases without a version are not persisted, their columns are held in memory
+class EpisodeColumns:
+    DIRECTORY: str = 'columns'
+    PRECISIONS: List[str] = ['day', 'month', 'year']
+    # the value of missing integers
+    MISSING: int = int(np.iinfo(np.int32).min)
+    __CHUNK_SIZE: int = 250_000
+
+    __stores: DatabaseCache['EpisodeColumns'] = DatabaseCache()
+
+    __columns: Dict[str, np.ndarray]
+
+    def __init__(self, columns: Dict[str, np.ndarray]) -> None:
+        self.__columns = columns
+
+    # returns the (shared) columns of the database the backend reads from (see DatabaseCache), opened from the
+    # columns directory or written once per database version
+    @staticmethod
+    def for_backend(backend: QueryBackend) -> 'EpisodeColumns':
+        return EpisodeColumns.__stores.get(backend, lambda: EpisodeColumns.__open_or_write(backend))
+
+    @staticmethod
+    def __open_or_write(backend: QueryBackend) -> 'EpisodeColumns':
+        if backend.db_version() == 'unknown':
+            return EpisodeColumns.build(backend)
+        directory: str = EpisodeColumns.directory(backend.db_path(), backend.db_version())
+        store: Optional[EpisodeColumns] = EpisodeColumns.open(directory)
+        return store if store is not None else EpisodeColumns.__write(backend, directory)
+
+    # the directory of the columns of a database version
+    @staticmethod
+    def directory(db_path: str, version: str) -> str:
+        return os.path.join(os.path.dirname(os.path.abspath(db_path)), EpisodeColumns.DIRECTORY, re.sub(r'[^\w.-]', '_', version))
+
+    # opens the columns in the directory read-only and memory-mapped, None if they have not been written
+    @staticmethod
+    def open(directory: str) -> Optional['EpisodeColumns']:
+        if not os.path.isdir(directory):
+            return None
+        columns: Dict[str, np.ndarray] = {}
+        for file_name in sorted(os.listdir(directory)):
+            if file_name.endswith('.npy'):
+                columns[file_name[:-len('.npy')]] = np.load(os.path.join(directory, file_name), mmap_mode='r', allow_pickle=False)
+        return EpisodeColumns(columns)
+
+    # reads the columns from the database into memory
+    @staticmethod
+    def build(backend: QueryBackend) -> 'EpisodeColumns':
+        return EpisodeColumns(EpisodeColumns.__fill(backend, lambda name, dtype, length: np.empty(length, dtype=dtype)))
+
+    # writes the columns to a directory of its own first, which then replaces the (missing) directory of the version,
+    # so that readers never see partially written columns. If another process has written the version in the
+    # meantime, its columns are used
+    @staticmethod
+    def __write(backend: QueryBackend, directory: str) -> 'EpisodeColumns':
+        print(f'Writing the episode columns of database version {backend.db_version()}...')
+        temporary_directory: str = f'{directory}.{uuid.uuid4().hex}.tmp'
+        os.makedirs(temporary_directory)
+        try:
+            columns: Dict[str, np.ndarray] = EpisodeColumns.__fill(backend, lambda name, dtype, length: np.lib.format.open_memmap(os.path.join(temporary_directory, name + '.npy'), mode='w+', dtype=dtype, shape=(length,)))
+            for values in columns.values():
+                values.flush()
+            del columns
+            try:
+                os.rename(temporary_directory, directory)
+            except OSError:
+                if not os.path.isdir(directory):
+                    raise
+        finally:
+            shutil.rmtree(temporary_directory, ignore_errors=True)
+        store: Optional[EpisodeColumns] = EpisodeColumns.open(directory)
+        if store is None:
+            raise Exception(f'Failed to write the episode columns to \'{directory}\'')
+        return store
+
+    # fills the columns allocated by allocate(name, dtype, length) from the database, the episodes chunk by chunk
+    @staticmethod
+    def __fill(backend: QueryBackend, allocate: Callable[[str, np.dtype, int], np.ndarray]) -> Dict[str, np.ndarray]:
+        counts: DataFrame = QUERY_CATALOG.execute(backend, 'episode_columns.counts')
+        episodes: int = int(counts['Episodes'].iloc[0])
+        columns: Dict[str, np.ndarray] = {
+            'episodes.PodcastId': allocate('episodes.PodcastId', np.dtype(np.int64), episodes),
+            'episodes.DurationMs': allocate('episodes.DurationMs', np.dtype(np.int64), episodes),
+            'episodes.EpochDay': allocate('episodes.EpochDay', np.dtype(np.int32), episodes),
+            'episodes.Precision': allocate('episodes.Precision', np.dtype(np.int8), episodes)
+        }
+        position: int = 0
+        for chunk in QUERY_CATALOG.execute_chunks(backend, 'episode_columns.episodes', EpisodeColumns.__CHUNK_SIZE):
+            end: int = position + len(chunk)
+            if end > episodes:
+                raise Exception('The episodes have changed while their columns were written')
+            columns['episodes.PodcastId'][position:end] = chunk['PodcastId'].to_numpy(dtype=np.int64)
+            columns['episodes.DurationMs'][position:end] = chunk['DurationMs'].to_numpy(dtype=np.int64)
+            columns['episodes.EpochDay'][position:end] = chunk['EpochDay'].fillna(EpisodeColumns.MISSING).to_numpy(dtype=np.int32)
+            precisions: np.ndarray = np.full(len(chunk), -1, dtype=np.int8)
+            for code, precision in enumerate(EpisodeColumns.PRECISIONS):
+                precisions[(chunk['ReleaseDatePrecision'] == precision).to_numpy()] = code
+            columns['episodes.Precision'][position:end] = precisions
+            position = end
+        if position != episodes:
+            raise Exception('The episodes have changed while their columns were written')
+        entries: DataFrame = QUERY_CATALOG.execute(backend, 'episode_columns.ranked_podcasts')
+        for column, dtype in [('PodcastId', np.int64), ('RankingId', np.int64), ('Rank', np.int32)]:
+            columns['ranked_podcasts.' + column] = allocate('ranked_podcasts.' + column, np.dtype(dtype), len(entries))
+            columns['ranked_podcasts.' + column][:] = entries[column].to_numpy(dtype=dtype)
+        rankings: DataFrame = QUERY_CATALOG.execute(backend, 'episode_columns.rankings')
+        for column in ['RankingId', 'PodcastDataSetId', 'Genre', 'Country']:
+            values: np.ndarray = rankings[column].fillna(EpisodeColumns.MISSING).to_numpy(dtype=np.int64) if column in ('RankingId', 'PodcastDataSetId') else rankings[column].to_numpy().astype(str)
+            # text columns are as wide as their longest value
+            columns['rankings.' + column] = allocate('rankings.' + column, values.dtype if values.dtype.kind == 'U' else np.dtype(np.int64), len(values))
+            columns['rankings.' + column][:] = values
+        return columns
+
+    # returns a (read-only, for stored columns) column by name (<table>.<column>)
+    def column(self, name: str) -> np.ndarray:
+        if name not in self.__columns:
+            raise Exception(f'Unknown episode column \'{name}\'')
+        return self.__columns[name]
+
+    def names(self) -> List[str]:
+        return list(self.__columns.keys())
+
+    def episode_count(self) -> int:
+        return len(self.__columns['episodes.PodcastId'])
+
+    # returns the episodes in [start, stop) as a frame of PodcastId, DurationMs and EpochDay (NaN if unknown)
+    def episodes(self, start: int = 0, stop: Optional[int] = None) -> DataFrame:
+        epoch_days: np.ndarray = self.__columns['episodes.EpochDay'][start:stop]
+        return DataFrame({
+            'PodcastId': self.__columns['episodes.PodcastId'][start:stop],
+            'DurationMs': self.__columns['episodes.DurationMs'][start:stop],
+            'EpochDay': np.where(epoch_days == EpisodeColumns.MISSING, np.nan, epoch_days)
+        })
@@ -0,0 +1,97 @@
+import sqlite3
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+from analyzers.internals.derived_tables import DerivedTables
+
+# the date parts of every episode, derived from its release date once per database version and stored in the
+# side database of the rankings database (EpisodeDates, see DerivedTables), so that the queries group and filter on indexed integer keys instead of
+# parsing ReleaseDate row by row:
+#   EpochDay    days since 1970-01-01 (the first day of the month/year for releases of month/year precision)
+#   Weekday     0 (Sunday) to 6 (Saturday), as strftime('%w')
+#   IsoYear     the ISO 8601 year the ISO week belongs to
+#   IsoWeek     1 to 53
+#   Year, Month the calendar year and month (1 to 12)
+#   MonthIndex  Year * 12 + Month - 1, a consecutive month key
+# Release dates that cannot be parsed have NULL date parts
+class EpisodeDates:
+    TABLE: str = 'EpisodeDates'
+    __CHUNK_SIZE: int = 250_000
+
+    # builds the table, unless it has already been built for the given database version.
+    # Concurrent processes are serialized by the write lock of the database
+    @staticmethod
+    def ensure(db_path: str, version: str) -> None:
+        connection: sqlite3.Connection = DerivedTables.connect(db_path)
+        try:
+            if DerivedTables.version(connection, EpisodeDates.TABLE) == version:
+                return
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                # another process may have built the table while we were waiting for the lock
+                if DerivedTables.version(connection, EpisodeDates.TABLE) != version:
+                    EpisodeDates.__build(connection, version)
+                connection.commit()
+            except BaseException:
+                connection.rollback()
+                raise
+        except sqlite3.OperationalError as e:
+            raise Exception(f'Failed to build the {EpisodeDates.TABLE} table of \'{db_path}\': {e}')
+        finally:
+            connection.close()
+
+    @staticmethod
+    def __build(connection: sqlite3.Connection, version: str) -> None:
+        print(f'Deriving the release date parts of all episodes (database version {version})...')
+        connection.execute(f'DROP TABLE IF EXISTS main.{EpisodeDates.TABLE}')
+        connection.execute(f'''
+            CREATE TABLE {EpisodeDates.TABLE} (
+                EpisodeId INTEGER NOT NULL PRIMARY KEY,
+                PodcastId INTEGER,
+                ReleaseDatePrecision TEXT,
+                EpochDay INTEGER,
+                Weekday INTEGER,
+                IsoYear INTEGER,
+                IsoWeek INTEGER,
+                Year INTEGER,
+                Month INTEGER,
+                MonthIndex INTEGER
+            )''')
+        insert: str = f'INSERT INTO {EpisodeDates.TABLE} VALUES ({", ".join(["?"] * 10)})'
+        reader = connection.cursor()
+        reader.execute('SELECT Id, PodcastId, ReleaseDatePrecision, ReleaseDate FROM source.Episodes')
+        while True:
+            rows = reader.fetchmany(EpisodeDates.__CHUNK_SIZE)
+            if len(rows) == 0:
+                break
+            parts: DataFrame = EpisodeDates.derive(DataFrame(rows, columns=['EpisodeId', 'PodcastId', 'ReleaseDatePrecision', 'ReleaseDate']))
+            # sqlite3 binds Python ints and None only, not numpy scalars or pandas' missing values
+            values = parts.astype(object).where(parts.notna(), None).itertuples(index=False, name=None)
+            connection.executemany(insert, values)
+        reader.close()
+        connection.execute(f'CREATE INDEX IX_{EpisodeDates.TABLE}_PodcastId ON {EpisodeDates.TABLE} (PodcastId, EpochDay)')
+        connection.execute(f'CREATE INDEX IX_{EpisodeDates.TABLE}_Precision_EpochDay ON {EpisodeDates.TABLE} (ReleaseDatePrecision, EpochDay)')
+        DerivedTables.mark(connection, EpisodeDates.TABLE, version)
+
+    # derives the date parts of episodes (EpisodeId, PodcastId, ReleaseDatePrecision, ReleaseDate) in one vectorized pass
+    @staticmethod
+    def derive(episodes: DataFrame) -> DataFrame:
+        dates: pd.Series = pd.to_datetime(episodes['ReleaseDate'], errors='coerce', format='ISO8601')
+        valid: pd.Series = dates.notna()
+        iso: DataFrame = dates.dt.isocalendar()
+        year: pd.Series = dates.dt.year.astype('Int64')
+        month: pd.Series = dates.dt.month.astype('Int64')
+        epoch_day: pd.Series = pd.Series(dates.to_numpy(dtype='datetime64[D]').astype(np.int64), index=dates.index).where(valid).astype('Int64')
+        return DataFrame({
+            'EpisodeId': episodes['EpisodeId'],
+            'PodcastId': episodes['PodcastId'],
+            'ReleaseDatePrecision': episodes['ReleaseDatePrecision'],
+            'EpochDay': epoch_day,
+            # pandas counts from Monday (0), strftime('%w') from Sunday (0)
+            'Weekday': ((dates.dt.dayofweek + 1) % 7).astype('Int64'),
+            'IsoYear': iso['year'].astype('Int64'),
+            'IsoWeek': iso['week'].astype('Int64'),
+            'Year': year,
+            'Month': month,
+            'MonthIndex': year * 12 + month - 1
+        })
@@ -0,0 +1,121 @@
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from pandas import DataFrame, Series
+from analyzers.internals.episode_columns import EpisodeColumns
+from analyzers.internals.membership_index import MembershipIndex
+from analyzers.internals.quantile_sketch import QuantileSketch
+from analyzers.internals.query_backend import DatabaseCache, QueryBackend
+from analyzers.internals.query_catalog import QUERY_CATALOG
+
+QUERY_CATALOG.register('episode_sketches.podcasts', '''
+    SELECT Id AS PodcastId, Genre
+    FROM Podcasts
+''')
+
+# quantile sketches of the episode and podcast measures, by podcast genre, by ranking country and over all podcasts.
+# Measures: DurationMs (per episode), EpisodeCount and FirstRelease (per podcast, as days since 1970-01-01).
+# Built in one pass over the (memory-mapped) episode columns, where every chunk is sketched separately and merged into
+# the result
+class EpisodeSketches:
+    MEASURES: List[str] = ['DurationMs', 'EpisodeCount', 'FirstRelease']
+    DIMENSIONS: List[str] = ['Genre', 'Country', 'All']
+
+    __sketches_by_database: DatabaseCache['EpisodeSketches'] = DatabaseCache()
+
+    __k: int
+    # by measure, dimension and dimension value
+    __sketches: Dict[Tuple[str, str, str], QuantileSketch]
+
+    def __init__(self, k: int = 200) -> None:
+        self.__k = k
+        self.__sketches = {}
+
+    # returns the (shared) sketches of the database the backend reads from (see DatabaseCache)
+    @staticmethod
+    def for_backend(backend: QueryBackend, chunk_size: int = 250_000) -> 'EpisodeSketches':
+        return EpisodeSketches.__sketches_by_database.get(backend, lambda: EpisodeSketches.build(backend, chunk_size))
+
+    @staticmethod
+    def build(backend: QueryBackend, chunk_size: int = 250_000, k: int = 200) -> 'EpisodeSketches':
+        genres: Series = QUERY_CATALOG.execute(backend, 'episode_sketches.podcasts').set_index('PodcastId')['Genre']
+        # the countries of the overall rankings every podcast has been ranked in
+        countries: MembershipIndex = MembershipIndex.for_backend(backend)
+        result = EpisodeSketches(k)
+        # the episodes of the last podcast of a chunk may continue in the next chunk
+        carry: Optional[DataFrame] = None
+        episodes: EpisodeColumns = EpisodeColumns.for_backend(backend)
+        for start in range(0, episodes.episode_count(), chunk_size):
+            chunk: DataFrame = episodes.episodes(start, start + chunk_size)
+            if carry is not None:
+                chunk = pd.concat([carry, chunk], ignore_index=True)
+            last_podcast = chunk['PodcastId'].iloc[-1]
+            carry = chunk[chunk['PodcastId'] == last_podcast]
+            result.merge(EpisodeSketches.__sketch_chunk(chunk[chunk['PodcastId'] != last_podcast], genres, countries, k))
+        if carry is not None:
+            result.merge(EpisodeSketches.__sketch_chunk(carry, genres, countries, k))
+        return result
+
+    @staticmethod
+    def __sketch_chunk(episodes: DataFrame, genres: Series, countries: MembershipIndex, k: int) -> 'EpisodeSketches':
+        sketches = EpisodeSketches(k)
+        if len(episodes) == 0:
+            return sketches
+        podcasts: DataFrame = episodes.groupby('PodcastId', as_index=False).agg(
+            EpisodeCount=('DurationMs', 'size'),
+            # release dates of lower precision ('2020', '2020-05') start at the first day of the year (or month)
+            FirstRelease=('EpochDay', 'min'))
+        for data, measures in [(episodes[['PodcastId', 'DurationMs']], ['DurationMs']), (podcasts, ['EpisodeCount', 'FirstRelease'])]:
+            labels, members = countries.lookup(data['PodcastId'].to_numpy(), by='Country', genre='All')
+            for measure in measures:
+                sketches.update(measure, 'All', np.full(len(data), 'All'), data[measure].to_numpy())
+                sketches.update(measure, 'Genre', data['PodcastId'].map(genres).to_numpy(), data[measure].to_numpy())
+                for country, ranked in zip(labels, members.T):
+                    if ranked.any():
+                        sketches.__get_or_create(measure, 'Country', str(country)).update(data[measure].to_numpy()[ranked])
+        return sketches
+
+    # adds the values to the sketches of their dimension values
+    def update(self, measure: str, dimension: str, keys: np.ndarray, values: np.ndarray) -> None:
+        for key, indices in pd.Series(np.arange(len(keys))).groupby(keys).groups.items():
+            self.__get_or_create(measure, dimension, str(key)).update(values[np.asarray(indices)])
+
+    def merge(self, other: 'EpisodeSketches') -> None:
+        for (measure, dimension, key), sketch in other.__sketches.items():
+            self.__get_or_create(measure, dimension, key).merge(sketch)
+
+    def __get_or_create(self, measure: str, dimension: str, key: str) -> QuantileSketch:
+        sketch: Optional[QuantileSketch] = self.__sketches.get((measure, dimension, key))
+        if sketch is None:
+            sketch = QuantileSketch(self.__k)
+            self.__sketches[(measure, dimension, key)] = sketch
+        return sketch
+
+    def get(self, measure: str, dimension: str, key: str) -> QuantileSketch:
+        sketch: Optional[QuantileSketch] = self.__sketches.get((measure, dimension, key))
+        if sketch is None:
+            raise Exception(f'No sketch of {measure} for {dimension} \'{key}\'')
+        return sketch
+
+    def keys(self, measure: str, dimension: str) -> List[str]:
+        return sorted(key for sketch_measure, sketch_dimension, key in self.__sketches if sketch_measure == measure and sketch_dimension == dimension)
+
+    # returns the summary statistics of the measure for every value of the dimension, one row per value
+    def summary(self, measure: str, dimension: str) -> DataFrame:
+        rows: List[Dict[str, object]] = []
+        for key in self.keys(measure, dimension):
+            sketch: QuantileSketch = self.get(measure, dimension, key)
+            p05, q1, median, q3, p95 = sketch.quantiles([0.05, 0.25, 0.5, 0.75, 0.95])
+            rows.append({
+                dimension: key,
+                'Count': sketch.count(),
+                'Mean': sketch.mean(),
+                'Min': sketch.min(),
+                'P05': p05,
+                'Q1': q1,
+                'Median': median,
+                'Q3': q3,
+                'P95': p95,
+                'Max': sketch.max()
+            })
+        return DataFrame(rows, columns=[dimension, 'Count', 'Mean', 'Min', 'P05', 'Q1', 'Median', 'Q3', 'P95', 'Max'])
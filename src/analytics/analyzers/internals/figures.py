@@ -0,0 +1,81 @@
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Generator, Optional, Tuple
+import matplotlib as mpl
+from matplotlib.axes import Axes
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+import matplotlib.pyplot as plt
+import seaborn as sns
+from seaborn.matrix import ClusterGrid
+
+# pyplot is only used where it cannot be avoided (clustermaps and showing figures), one thread at a time
+_PYPLOT_LOCK: threading.Lock = threading.Lock()
+
+# creates a figure with a single axes on its own Agg canvas. Unlike plt.subplots, the figure is not registered with
+# pyplot, so it can be rendered in any thread and is freed once it is no longer referenced (no plt.close needed)
+def create_figure(figsize: Optional[Tuple[float, float]] = None) -> Tuple[Figure, Axes]:
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    ax: Axes = fig.add_subplot()
+    return fig, ax
+
+# sns.clustermap creates its figure with pyplot: the clustermap is drawn under the pyplot lock, then its figure is
+# detached from pyplot and moved to its own Agg canvas, like the figures of create_figure
+def create_cluster_grid(**kwargs: Any) -> ClusterGrid:
+    with _PYPLOT_LOCK:
+        cluster_grid: ClusterGrid = sns.clustermap(**kwargs)
+        plt.close(cluster_grid.figure)
+    FigureCanvasAgg(cluster_grid.figure)
+    return cluster_grid
+
+# shows the figure in a window of pyplot's (interactive) backend, blocking until it is closed
+def show_figure(figure: Figure) -> None:
+    with _PYPLOT_LOCK:
+        # pyplot adopts the figure as if it had created it
+        plt.figure(FigureClass=lambda **kwargs: figure)
+        plt.show()
+        plt.close(figure)
+    FigureCanvasAgg(figure)
+
+# the style (seaborn theme) figures are rendered in. matplotlib reads the style from its global rcParams while figures
+# are created, drawn and saved, so there is one style per process at a time: renders in the same style run
+# concurrently, a render in another style waits until they are done and then switches the rcParams. The rcParams of
+# a style are those of sns.set_theme(style=style)
+class FigureStyle:
+    __condition: threading.Condition = threading.Condition()
+    __style: Optional[str] = None
+    __active: int = 0
+    __params: Dict[str, Dict[str, Any]] = {}
+
+    # renders in the style for the duration of the context (without a style, in the current rcParams)
+    @staticmethod
+    @contextmanager
+    def use(style: Optional[str]) -> Generator[None, Any, Any]:
+        if style is None:
+            yield
+            return
+        with FigureStyle.__condition:
+            while FigureStyle.__active > 0 and FigureStyle.__style != style:
+                FigureStyle.__condition.wait()
+            if FigureStyle.__style != style:
+                mpl.rcParams.update(FigureStyle.__style_params(style))
+                FigureStyle.__style = style
+            FigureStyle.__active += 1
+        try:
+            yield
+        finally:
+            with FigureStyle.__condition:
+                FigureStyle.__active -= 1
+                FigureStyle.__condition.notify_all()
+
+    # called with the condition held and no active renders, as sns.set_theme changes the rcParams until they are restored
+    @staticmethod
+    def __style_params(style: str) -> Dict[str, Any]:
+        params: Optional[Dict[str, Any]] = FigureStyle.__params.get(style)
+        if params is None:
+            with mpl.rc_context():
+                sns.set_theme(style=style)
+                params = {key: value for key, value in mpl.rcParams.items() if key != 'backend'}
+            FigureStyle.__params[style] = params
+        return params
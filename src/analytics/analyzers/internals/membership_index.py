@@ -0,0 +1,107 @@
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+from analyzers.internals.query_backend import DatabaseCache, QueryBackend
+from analyzers.internals.query_catalog import QUERY_CATALOG
+
+# the ranking categories (country and ranking genre) every podcast has been ranked in, in any data set
+QUERY_CATALOG.register('membership_index.memberships', '''
+    SELECT DISTINCT RankedPodcasts.PodcastId, Rankings.Country, Rankings.Genre
+    FROM RankedPodcasts
+    INNER JOIN Rankings ON Rankings.Id = RankedPodcasts.RankingId
+    INNER JOIN Podcasts ON Podcasts.Id = RankedPodcasts.PodcastId
+    ORDER BY RankedPodcasts.PodcastId ASC
+''')
+
+# maps every ranked podcast to a bitmap of the ranking categories (country x ranking genre) it has been ranked in.
+# Per-country (or per-genre) aggregates are computed by aggregating per podcast first and scattering the per-podcast
+# aggregates through the bitmap (see scatter), so a podcast ranked in many rankings is counted once per country
+# without joining the rankings or deduplicating the joined rows
+class MembershipIndex:
+    DIMENSIONS: List[str] = ['Country', 'Genre']
+
+    __indexes: DatabaseCache['MembershipIndex'] = DatabaseCache()
+
+    # sorted
+    __podcast_ids: np.ndarray
+    # Country and Genre of every category (bit)
+    __categories: DataFrame
+    # podcasts x categories, packed into bytes (np.packbits, 8 categories per byte)
+    __bits: np.ndarray
+    # the unpacked masks returned by members, by their arguments
+    __members: Dict[Tuple[str, Optional[str], Optional[str]], Tuple[np.ndarray, np.ndarray]]
+
+    def __init__(self, memberships: DataFrame) -> None:
+        self.__podcast_ids = np.unique(memberships['PodcastId'].to_numpy())
+        self.__categories = memberships[['Country', 'Genre']].drop_duplicates().sort_values(by=['Country', 'Genre']).reset_index(drop=True)
+        codes: Dict[Tuple[str, str], int] = {category: code for code, category in enumerate(zip(self.__categories['Country'], self.__categories['Genre']))}
+        rows: np.ndarray = np.searchsorted(self.__podcast_ids, memberships['PodcastId'].to_numpy())
+        columns: np.ndarray = np.array([codes[category] for category in zip(memberships['Country'], memberships['Genre'])], dtype=np.int64)
+        members: np.ndarray = np.zeros((len(self.__podcast_ids), len(self.__categories)), dtype=bool)
+        members[rows, columns] = True
+        self.__bits = np.packbits(members, axis=1)
+        self.__members = {}
+
+    # returns the (shared) index of the database the backend reads from (see DatabaseCache)
+    @staticmethod
+    def for_backend(backend: QueryBackend) -> 'MembershipIndex':
+        return MembershipIndex.__indexes.get(backend, lambda: MembershipIndex(QUERY_CATALOG.execute(backend, 'membership_index.memberships')))
+
+    def podcast_ids(self) -> np.ndarray:
+        return self.__podcast_ids.copy()
+
+    # the countries or ranking genres of the index, sorted
+    def labels(self, by: str) -> np.ndarray:
+        MembershipIndex.__check_dimension(by)
+        return np.sort(self.__categories[by].unique())
+
+    # returns the labels of the dimension and a podcasts x labels mask, selecting the countries (or ranking genres)
+    # every podcast of the index has been ranked in. genre (or country) restricts the rankings to those of the given
+    # ranking genre (or country), e.g. by='Country', genre='All' selects the countries of the overall rankings
+    def members(self, by: str, genre: Optional[str] = None, country: Optional[str] = None) -> Tuple[np.ndarray, np.ndarray]:
+        MembershipIndex.__check_dimension(by)
+        key: Tuple[str, Optional[str], Optional[str]] = (by, genre, country)
+        cached: Optional[Tuple[np.ndarray, np.ndarray]] = self.__members.get(key)
+        if cached is not None:
+            return cached
+        selected: np.ndarray = np.ones(len(self.__categories), dtype=bool)
+        if genre is not None:
+            selected &= self.__categories['Genre'].to_numpy() == genre
+        if country is not None:
+            selected &= self.__categories['Country'].to_numpy() == country
+        labels: np.ndarray = np.sort(self.__categories.loc[selected, by].unique())
+        # categories x labels, the label of every selected category
+        indicator: np.ndarray = (self.__categories[by].to_numpy()[:, np.newaxis] == labels[np.newaxis, :]) & selected[:, np.newaxis]
+        categories: np.ndarray = np.unpackbits(self.__bits, axis=1, count=len(self.__categories))
+        members: Tuple[np.ndarray, np.ndarray] = (labels, (categories.astype(np.int32) @ indicator.astype(np.int32)) > 0)
+        self.__members[key] = members
+        return members
+
+    # like members, but for the given podcasts (one row per podcast id, podcasts that have never been ranked have no labels)
+    def lookup(self, podcast_ids: np.ndarray, by: str, genre: Optional[str] = None, country: Optional[str] = None) -> Tuple[np.ndarray, np.ndarray]:
+        labels, members = self.members(by, genre, country)
+        result: np.ndarray = np.zeros((len(podcast_ids), len(labels)), dtype=bool)
+        if len(self.__podcast_ids) == 0:
+            return labels, result
+        rows: np.ndarray = np.minimum(np.searchsorted(self.__podcast_ids, podcast_ids), len(self.__podcast_ids) - 1)
+        ranked: np.ndarray = self.__podcast_ids[rows] == podcast_ids
+        result[ranked] = members[rows[ranked]]
+        return labels, result
+
+    # sums the per-podcast measures (one row per podcast, with a PodcastId column) of all podcasts ranked in a
+    # country (or ranking genre), see members. Returns one row per label with at least one ranked podcast:
+    # the label column (by), the measures and the number of podcasts (Podcasts)
+    def scatter(self, data: DataFrame, measures: List[str], by: str, genre: Optional[str] = None, country: Optional[str] = None) -> DataFrame:
+        labels, members = self.lookup(data['PodcastId'].to_numpy(), by, genre, country)
+        # labels x podcasts @ podcasts x measures
+        selection: np.ndarray = members.T.astype(np.float64)
+        result: DataFrame = pd.DataFrame(selection @ data[measures].to_numpy(dtype=np.float64), columns=measures)
+        result.insert(0, by, labels)
+        result['Podcasts'] = selection.sum(axis=1).astype(np.int64)
+        return result[result['Podcasts'] > 0].reset_index(drop=True)
+
+    @staticmethod
+    def __check_dimension(by: str) -> None:
+        if by not in MembershipIndex.DIMENSIONS:
+            raise Exception(f'Unknown membership dimension \'{by}\', expected one of {", ".join(MembershipIndex.DIMENSIONS)}')
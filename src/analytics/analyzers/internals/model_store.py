@@ -0,0 +1,87 @@
+import os
+import uuid
+from typing import Dict, List, Optional
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+# persists the fitted state of models as compressed numpy archives (<directory>/<name>.npz), tagged with
+# the version of the rankings database they were fitted on. Archives hold plain arrays only (no pickles),
+# so loading a model neither executes code nor touches the database
+class ModelStore:
+    __directory: str
+
+    def __init__(self, directory: str) -> None:
+        self.__directory = os.path.abspath(directory)
+
+    # returns the store next to the given rankings database (<data_dir>/models)
+    @staticmethod
+    def for_database(db_path: str) -> 'ModelStore':
+        return ModelStore(os.path.join(os.path.dirname(os.path.abspath(db_path)), 'models'))
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.__directory, name + '.npz')
+
+    # writes the state atomically, so that concurrent readers never see a partially written archive
+    def save(self, name: str, version: str, state: Dict[str, np.ndarray]) -> None:
+        os.makedirs(self.__directory, exist_ok=True)
+        # a unique temporary file per writer, as several processes may fit and save the same model at once
+        temporary_path: str = f'{self.path(name)}.{uuid.uuid4().hex}.tmp'
+        try:
+            with open(temporary_path, 'wb') as f:
+                np.savez_compressed(f, __version__=np.array(version), **state)
+            os.replace(temporary_path, self.path(name))
+        except BaseException:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+            raise
+
+    # returns the state, unless it does not exist or has been fitted on another database version
+    # (any version is accepted if version is None)
+    def load(self, name: str, version: Optional[str] = None) -> Optional[Dict[str, np.ndarray]]:
+        if not os.path.exists(self.path(name)):
+            return None
+        with np.load(self.path(name), allow_pickle=False) as archive:
+            state: Dict[str, np.ndarray] = {key: archive[key] for key in archive.files}
+        if version is not None and str(state['__version__']) != version:
+            return None
+        return state
+
+    # returns the version of the database the stored state has been fitted on
+    @staticmethod
+    def version(state: Dict[str, np.ndarray]) -> str:
+        return str(state['__version__'])
+
+    # converts the columns of a data frame to state arrays ('<prefix>.<column>'). Text columns are stored as
+    # fixed-width unicode arrays, so that they can be loaded without pickling, with a mask of their missing values
+    # ('<prefix>.<column>.__nulls__', if there are any). Nullable numeric columns (e.g. Int64) are stored as floats
+    # with NaN for missing values. Other columns are stored with their plain dtype (frames received from other
+    # processes may carry dtype metadata, which numpy cannot store)
+    @staticmethod
+    def frame_to_state(data: DataFrame, prefix: str) -> Dict[str, np.ndarray]:
+        state: Dict[str, np.ndarray] = {f'{prefix}.__columns__': np.array(list(data.columns), dtype=str)}
+        for column in data.columns:
+            series: pd.Series = data[column]
+            if pd.api.types.is_extension_array_dtype(series.dtype) and pd.api.types.is_numeric_dtype(series.dtype) and not pd.api.types.is_bool_dtype(series.dtype):
+                state[f'{prefix}.{column}'] = series.to_numpy(dtype=np.float64, na_value=np.nan)
+                continue
+            values: np.ndarray = series.to_numpy()
+            if values.dtype != object:
+                state[f'{prefix}.{column}'] = values.view(np.dtype(values.dtype.str))
+                continue
+            nulls: np.ndarray = series.isna().to_numpy()
+            state[f'{prefix}.{column}'] = np.where(nulls, '', values).astype(str)
+            if nulls.any():
+                state[f'{prefix}.{column}.__nulls__'] = nulls
+        return state
+
+    @staticmethod
+    def frame_from_state(state: Dict[str, np.ndarray], prefix: str) -> DataFrame:
+        columns: List[str] = state[f'{prefix}.__columns__'].tolist()
+        data = DataFrame({column: state[f'{prefix}.{column}'] for column in columns}, columns=columns)
+        # text columns become object columns, as in frames read from the database, with None for missing values
+        for column in columns:
+            nulls: Optional[np.ndarray] = state.get(f'{prefix}.{column}.__nulls__')
+            if nulls is not None:
+                data[column] = data[column].astype(object).where(~nulls, None)
+        return data
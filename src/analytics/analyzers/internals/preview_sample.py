@@ -0,0 +1,184 @@
+import json
+import os
+import re
+import sqlite3
+import warnings
+from typing import Dict, List, Optional
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+from scipy import stats
+from analyzers.internals.derived_tables import DerivedTables
+from analyzers.internals.query_backend import read_db_version
+from analyzers.internals.text_index import TextIndex
+
+# describes how the columns of a capability's data frame are estimated from a sample of podcasts.
+# keys identify the rows (in addition to all non-numeric columns), totals are sums over podcasts that have to be
+# scaled up to the population. All other numeric columns are averages or ratios, which are taken as they are
+class PreviewEstimate:
+    keys: List[str]
+    totals: List[str]
+
+    def __init__(self, keys: Optional[List[str]] = None, totals: Optional[List[str]] = None) -> None:
+        self.keys = keys if keys is not None else []
+        self.totals = totals if totals is not None else []
+
+# a deterministic, seeded sample of the podcasts of a rankings database, stratified by genre and market.
+# The sample is written to its own database (with the episodes and ranking entries of the sampled podcasts, and all
+# data sets and rankings), so that every capability runs on it unchanged. The sample is further split into disjoint,
+# equally stratified random groups that are written to databases as well: the spread of the estimates of the groups
+# yields the confidence intervals of the estimates of the whole sample (random group variance estimation)
+class PreviewSample:
+    __fraction: float
+    __directory: str
+    __db_file: str
+    __population: int
+    __sample_size: int
+    __group_sizes: List[int]
+
+    def __init__(self, directory: str, db_file: str, fraction: float, population: int, sample_size: int, group_sizes: List[int]) -> None:
+        self.__directory = directory
+        self.__db_file = db_file
+        self.__fraction = fraction
+        self.__population = population
+        self.__sample_size = sample_size
+        self.__group_sizes = group_sizes
+
+    # returns the sample of the given database, creating it unless it has already been created for this database version
+    @staticmethod
+    def create(db_path: str, fraction: float, seed: int = 0, groups: int = 5) -> 'PreviewSample':
+        if not 0 < fraction <= 1:
+            raise Exception('The preview fraction must be in (0, 1]')
+        if groups < 2:
+            raise Exception('The preview needs at least 2 random groups to estimate confidence intervals')
+        db_path = os.path.abspath(db_path)
+        version: str = read_db_version(db_path)
+        directory: str = os.path.join(os.path.dirname(db_path), 'preview', re.sub(r'[^\w.-]', '_', version), f'{fraction:g}-{seed}-{groups}')
+        info_file: str = os.path.join(directory, 'sample.json')
+        # the info file is written last, so it marks a completely written sample
+        if os.path.exists(info_file):
+            with open(info_file, 'r') as f:
+                info = json.load(f)
+            return PreviewSample(directory, os.path.basename(db_path), fraction, info['population'], info['sample_size'], info['group_sizes'])
+        print(f'Sampling {fraction:.1%} of the podcasts of \'{db_path}\' (seed {seed}, {groups} groups)...')
+        source = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+        try:
+            podcasts: DataFrame = pd.read_sql_query('SELECT Id, Genre, Market FROM Podcasts ORDER BY Id ASC', source)
+        finally:
+            source.close()
+        sample, assignment = PreviewSample.__stratified_sample(podcasts, fraction, seed, groups)
+        PreviewSample.__write_database(db_path, os.path.join(directory, 'sample'), f'{version}+preview-{fraction:g}-{seed}', sample)
+        group_sizes: List[int] = []
+        for group in range(groups):
+            members: np.ndarray = sample[assignment == group]
+            PreviewSample.__write_database(db_path, os.path.join(directory, f'group-{group}'), f'{version}+preview-{fraction:g}-{seed}-group-{group}', members)
+            group_sizes.append(len(members))
+        with open(info_file, 'w') as f:
+            json.dump({'population': len(podcasts), 'sample_size': len(sample), 'group_sizes': group_sizes}, f)
+        return PreviewSample(directory, os.path.basename(db_path), fraction, len(podcasts), len(sample), group_sizes)
+
+    # samples the same fraction of every stratum. Fractional sample sizes are rounded randomly, so that the expected
+    # sample size of every stratum is exact. Returns the sampled podcast ids and their random group
+    @staticmethod
+    def __stratified_sample(podcasts: DataFrame, fraction: float, seed: int, groups: int):
+        rng: np.random.Generator = np.random.default_rng(seed)
+        sample: List[np.ndarray] = []
+        assignment: List[np.ndarray] = []
+        position: int = 0
+        for _, stratum in podcasts.groupby(['Genre', 'Market'], sort=True):
+            size: float = fraction * len(stratum)
+            sample_size: int = int(np.floor(size)) + int(rng.random() < size - np.floor(size))
+            members: np.ndarray = rng.permutation(stratum['Id'].to_numpy())[:sample_size]
+            sample.append(members)
+            # members are dealt to the groups in turn (continuing across strata), so every group is stratified as well
+            assignment.append((position + np.arange(sample_size)) % groups)
+            position += sample_size
+        return np.concatenate(sample), np.concatenate(assignment)
+
+    # copies the schema and the rows belonging to the given podcasts into a new database in the directory
+    @staticmethod
+    def __write_database(source_path: str, directory: str, version: str, podcast_ids: np.ndarray) -> None:
+        os.makedirs(directory, exist_ok=True)
+        target_path: str = os.path.join(directory, os.path.basename(source_path))
+        temporary_path: str = target_path + '.tmp'
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        target = sqlite3.connect(f'file:{temporary_path}', uri=True)
+        try:
+            target.execute('ATTACH DATABASE ? AS source', (f'file:{source_path}?mode=ro',))
+            target.execute('CREATE TEMP TABLE SampledPodcasts (Id INTEGER PRIMARY KEY)')
+            target.executemany('INSERT INTO temp.SampledPodcasts (Id) VALUES (?)', [(int(podcast_id),) for podcast_id in podcast_ids])
+            # the derived tables are not copied, but built for the sample by its query backend
+            derived: List[str] = DerivedTables.names(target, 'source') + [DerivedTables.TABLE]
+            schema = [entry for entry in target.execute('SELECT type, name, sql, tbl_name FROM source.sqlite_master WHERE sql IS NOT NULL AND name NOT LIKE \'sqlite_%\'').fetchall()
+                      if entry[3] not in derived and not TextIndex.is_index_table(entry[3])]
+            for _, table, sql, _ in [entry for entry in schema if entry[0] == 'table']:
+                target.execute(sql)
+                columns: List[str] = [column[1] for column in target.execute(f'PRAGMA source.table_info("{table}")')]
+                if table == 'Podcasts':
+                    condition: str = 'WHERE Id IN (SELECT Id FROM temp.SampledPodcasts)'
+                elif 'PodcastId' in columns:
+                    condition = 'WHERE PodcastId IN (SELECT Id FROM temp.SampledPodcasts)'
+                else:
+                    condition = ''
+                target.execute(f'INSERT INTO main."{table}" SELECT * FROM source."{table}" {condition}')
+            # indexes are created after the rows have been inserted
+            for _, _, sql, _ in [entry for entry in schema if entry[0] != 'table']:
+                target.execute(sql)
+            target.commit()
+            target.execute('DETACH DATABASE source')
+        finally:
+            target.close()
+        os.replace(temporary_path, target_path)
+        with open(target_path + '.version', 'w') as f:
+            f.write(version)
+
+    def fraction(self) -> float:
+        return self.__fraction
+
+    def groups(self) -> int:
+        return len(self.__group_sizes)
+
+    def sample_path(self) -> str:
+        return os.path.join(self.__directory, 'sample', self.__db_file)
+
+    def group_paths(self) -> List[str]:
+        return [os.path.join(self.__directory, f'group-{group}', self.__db_file) for group in range(self.groups())]
+
+    # combines the frame computed on the sample with the frames computed on the random groups into the estimate:
+    # totals are scaled up to the population and every estimated column gets a confidence interval (<column>CILow/High)
+    def estimate(self, sample: DataFrame, group_frames: List[DataFrame], estimate: PreviewEstimate, confidence: float = 0.95) -> DataFrame:
+        keys: List[str] = [column for column in sample.columns if column in estimate.keys or not pd.api.types.is_numeric_dtype(sample[column]) or pd.api.types.is_bool_dtype(sample[column])]
+        estimated: List[str] = [column for column in sample.columns if column not in keys]
+        data: DataFrame = sample.copy()
+        for column in estimate.totals:
+            data[column] = data[column] * (self.__population / max(1, self.__sample_size))
+        if len(estimated) == 0 or len(keys) == 0:
+            return data
+        groups: List[DataFrame] = []
+        for group, (frame, size) in enumerate(zip(group_frames, self.__group_sizes)):
+            frame = frame[keys + estimated].drop_duplicates(subset=keys).copy()
+            for column in estimate.totals:
+                frame[column] = frame[column] * (self.__population / max(1, size))
+            groups.append(frame.rename(columns={column: f'{column}@{group}' for column in estimated}))
+        aligned: DataFrame = data[keys].copy()
+        for frame in groups:
+            aligned = aligned.merge(frame, on=keys, how='left')
+        # every sample row has exactly one aligned row, unless the keys do not identify the rows
+        if len(aligned) != len(data):
+            return data
+        t: float = float(stats.t.ppf(0.5 + confidence / 2, len(groups) - 1))
+        for column in estimated:
+            values: np.ndarray = aligned[[f'{column}@{group}' for group in range(len(groups))]].to_numpy(dtype=np.float64)
+            if column in estimate.totals:
+                # a group without the row has a total of zero for it
+                values = np.nan_to_num(values, nan=0.0)
+            available: np.ndarray = np.sum(~np.isnan(values), axis=1)
+            # rows present in fewer than 2 groups have no variance estimate
+            with warnings.catch_warnings(), np.errstate(invalid='ignore', divide='ignore'):
+                warnings.simplefilter('ignore', RuntimeWarning)
+                variance: np.ndarray = np.nanvar(values, axis=1, ddof=1) / available
+            half_width: np.ndarray = np.where(available >= 2, t * np.sqrt(variance), np.nan)
+            data[f'{column}CILow'] = data[column].to_numpy(dtype=np.float64) - half_width
+            data[f'{column}CIHigh'] = data[column].to_numpy(dtype=np.float64) + half_width
+        return data
@@ -0,0 +1,132 @@
+from typing import Any, Dict, List, Sequence
+import numpy as np
+
+# a mergeable KLL quantile sketch. Values are kept in a hierarchy of compactors, where an item on level h
+# stands for 2^h values of the stream. Whenever a level exceeds its capacity, it is sorted and every other
+# item (starting at a random offset) is promoted to the next level, so the sketch keeps O(k log n) items.
+# The rank error of a quantile is about 1.7 / k (k = 200: ~0.85%). Streams of at most k values are exact
+class QuantileSketch:
+    __k: int
+    __levels: List[np.ndarray]
+    __count: int
+    __sum: float
+    __min: float
+    __max: float
+    __rng: np.random.Generator
+
+    def __init__(self, k: int = 200, seed: int = 0) -> None:
+        if k < 8:
+            raise Exception('The sketch size k must be at least 8')
+        self.__k = k
+        self.__levels = [np.empty(0, dtype=np.float64)]
+        self.__count = 0
+        self.__sum = 0.0
+        self.__min = np.inf
+        self.__max = -np.inf
+        # the compaction offsets are seeded, so that the same stream always yields the same sketch
+        self.__rng = np.random.default_rng(seed)
+
+    def count(self) -> int:
+        return self.__count
+
+    def mean(self) -> float:
+        return self.__sum / self.__count if self.__count > 0 else np.nan
+
+    def min(self) -> float:
+        return self.__min if self.__count > 0 else np.nan
+
+    def max(self) -> float:
+        return self.__max if self.__count > 0 else np.nan
+
+    # the number of items the sketch currently retains
+    def size(self) -> int:
+        return sum(len(level) for level in self.__levels)
+
+    # adds a batch of values to the sketch (NaN values are ignored)
+    def update(self, values: Any) -> None:
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+        self.__count += len(values)
+        self.__sum += float(values.sum())
+        self.__min = min(self.__min, float(values.min()))
+        self.__max = max(self.__max, float(values.max()))
+        self.__levels[0] = np.concatenate([self.__levels[0], values])
+        self.__compress()
+
+    # adds all values summarized by the other sketch to this sketch
+    def merge(self, other: 'QuantileSketch') -> None:
+        if other.__count == 0:
+            return
+        while len(self.__levels) < len(other.__levels):
+            self.__levels.append(np.empty(0, dtype=np.float64))
+        for level, items in enumerate(other.__levels):
+            self.__levels[level] = np.concatenate([self.__levels[level], items])
+        self.__count += other.__count
+        self.__sum += other.__sum
+        self.__min = min(self.__min, other.__min)
+        self.__max = max(self.__max, other.__max)
+        self.__compress()
+
+    # lower levels hold fewer values per item, so they get smaller capacities (geometrically decreasing by 2/3)
+    def __capacity(self, level: int) -> int:
+        depth: int = len(self.__levels) - level - 1
+        return max(2, int(np.ceil(self.__k * (2 / 3) ** depth)))
+
+    def __compress(self) -> None:
+        level: int = 0
+        while level < len(self.__levels):
+            items: np.ndarray = self.__levels[level]
+            if len(items) > self.__capacity(level):
+                grown: bool = level + 1 == len(self.__levels)
+                if grown:
+                    self.__levels.append(np.empty(0, dtype=np.float64))
+                items = np.sort(items)
+                # with an odd number of items, the largest one stays on its level
+                kept: np.ndarray = items[len(items) - len(items) % 2:]
+                pairs: np.ndarray = items[:len(items) - len(items) % 2]
+                promoted: np.ndarray = pairs[int(self.__rng.integers(2))::2]
+                self.__levels[level + 1] = np.concatenate([self.__levels[level + 1], promoted])
+                self.__levels[level] = kept
+                if grown:
+                    # a new level shrinks the capacities of all levels below it, which are compacted again
+                    level = 0
+                    continue
+            level += 1
+
+    # returns the (lower) quantiles of the summarized values for the given fractions in [0, 1]
+    def quantiles(self, fractions: Sequence[float]) -> np.ndarray:
+        if self.__count == 0:
+            return np.full(len(fractions), np.nan)
+        items: np.ndarray = np.concatenate(self.__levels)
+        weights: np.ndarray = np.concatenate([np.full(len(items_on_level), 2 ** level, dtype=np.float64) for level, items_on_level in enumerate(self.__levels)])
+        order: np.ndarray = np.argsort(items, kind='mergesort')
+        items = items[order]
+        cumulative: np.ndarray = np.cumsum(weights[order])
+        targets: np.ndarray = np.asarray(fractions, dtype=np.float64) * cumulative[-1]
+        indices: np.ndarray = np.clip(np.searchsorted(cumulative, targets, side='left'), 0, len(items) - 1)
+        result: np.ndarray = items[indices]
+        # the extremes are tracked exactly
+        result[np.asarray(fractions) <= 0] = self.__min
+        result[np.asarray(fractions) >= 1] = self.__max
+        return result
+
+    def quantile(self, fraction: float) -> float:
+        return float(self.quantiles([fraction])[0])
+
+    # returns box plot statistics in the format of matplotlib's Axes.bxp.
+    # The whiskers extend to 1.5 times the interquartile range, clipped to the range of the values
+    def box_plot_statistics(self, label: str) -> Dict[str, Any]:
+        q1, median, q3 = self.quantiles([0.25, 0.5, 0.75])
+        iqr: float = q3 - q1
+        return {
+            'label': label,
+            'mean': self.mean(),
+            'med': median,
+            'q1': q1,
+            'q3': q3,
+            'whislo': max(self.min(), q1 - 1.5 * iqr),
+            'whishi': min(self.max(), q3 + 1.5 * iqr),
+            'fliers': []
+        }
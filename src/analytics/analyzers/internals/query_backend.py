@@ -0,0 +1,370 @@
+import functools
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any, Callable, ContextManager, Dict, Generator, Generic, Hashable, Iterator, List, Optional, Tuple, TypeVar
+import pandas as pd
+from pandas import DataFrame
+from sqlalchemy import Connection, Engine, create_engine, event, make_url
+from analyzers.internals.derived_tables import DerivedTables
+from analyzers.internals.episode_dates import EpisodeDates
+from analyzers.internals.query_catalog import CatalogQuery
+from analyzers.internals.text_index import TextIndex
+
+# returns the version (GitHub release date) of a rankings database, as written by GitHubRelease
+def read_db_version(db_path: str) -> str:
+    version_file: str = db_path + '.version'
+    if not os.path.exists(version_file):
+        return 'unknown'
+    with open(version_file, 'r') as f:
+        return f.read().strip()
+
+# returns the version of a rankings database or, for databases without a version file (e.g. built locally), their size
+# and modification time, so that a modified or replaced database can still be told apart from its predecessor
+def read_db_revision(db_path: str) -> str:
+    version: str = read_db_version(db_path)
+    if version != 'unknown' or not os.path.exists(db_path):
+        return version
+    stat: os.stat_result = os.stat(db_path)
+    return f'unknown-{stat.st_size}-{stat.st_mtime_ns}'
+
+# executes catalog queries on a single connection (see QueryBackend.session)
+class QuerySession(ABC):
+    @abstractmethod
+    def execute(self, query: CatalogQuery, parameters: Dict[str, Any]) -> DataFrame:
+        pass
+
+    # streams the result in frames of at most chunk_size rows, for results that should not be held in memory at once
+    @abstractmethod
+    def execute_chunks(self, query: CatalogQuery, parameters: Dict[str, Any], chunk_size: int) -> Iterator[DataFrame]:
+        pass
+
+# the derived tables (see DerivedTables) by the name queries read them with, and the function building them
+_DERIVED_TABLES: Dict[str, Callable[[str, str], None]] = {
+    EpisodeDates.TABLE: EpisodeDates.ensure,
+    **{name: functools.partial(TextIndex.ensure, table=table) for table in TextIndex.TABLES for name in [table.name, table.vocabulary]}
+}
+
+# a database engine the analyzer queries are executed on.
+# The derived tables of the rankings database (EpisodeDates, TextIndex) are built in its side database when the
+# first query reading from them is prepared, for the revision of the database (see read_db_revision)
+class QueryBackend(ABC):
+    __db_path: str
+    # the revision of the database every derived table has been built for
+    __prepared: Dict[str, str]
+    __prepare_lock: threading.Lock
+
+    def __init__(self, db_path: str) -> None:
+        self.__db_path = os.path.abspath(db_path)
+        self.__prepared = {}
+        self.__prepare_lock = threading.Lock()
+
+    # builds the derived tables the query reads from, unless they have been built for the current revision of the
+    # database before (QueryCatalog prepares every query before executing it)
+    def prepare(self, query: CatalogQuery) -> None:
+        sql: str = query.sql(self.name())
+        revision: Optional[str] = None
+        for table in _DERIVED_TABLES:
+            if re.search(rf'\b{table}\b', sql) is not None:
+                revision = revision if revision is not None else self.db_revision()
+                if self.__prepared.get(table) != revision:
+                    self._ensure_derived(table)
+
+    def _ensure_derived(self, table: str) -> None:
+        with self.__prepare_lock:
+            if not os.path.exists(self.__db_path):
+                return
+            revision: str = self.db_revision()
+            if self.__prepared.get(table) == revision:
+                return
+            _DERIVED_TABLES[table](self.__db_path, revision)
+            self.__prepared[table] = revision
+
+    # the name of the backend, which is also the SQL dialect of the catalog queries it runs
+    @abstractmethod
+    def name(self) -> str:
+        pass
+
+    # the rankings database the backend reads from
+    def db_path(self) -> str:
+        return self.__db_path
+
+    def db_version(self) -> str:
+        return read_db_version(self.__db_path)
+
+    # tells modified databases without a version apart (see read_db_revision)
+    def db_revision(self) -> str:
+        return read_db_revision(self.__db_path)
+
+    # opens a session for the duration of the context (implementations are @contextmanager generators)
+    @abstractmethod
+    def session(self) -> ContextManager[QuerySession]:
+        pass
+
+    def dispose(self) -> None:
+        pass
+
+T = TypeVar('T')
+
+# a process-wide cache of a structure built from the rankings database (e.g. a rank matrix), shared by all analyzers
+# reading the same database with the same backend. Every structure is built once per database revision (and per
+# parameters, if it has any), so that a database without a version is rebuilt once it has been modified. Older
+# revisions of the same database are never queried again and are dropped
+class DatabaseCache(Generic[T]):
+    # (database, backend, parameters) -> (revision, structure)
+    __entries: Dict[Tuple[str, str, Hashable], Tuple[str, T]]
+    __lock: threading.Lock
+
+    def __init__(self) -> None:
+        self.__entries = {}
+        self.__lock = threading.Lock()
+
+    # returns the structure of the database the backend reads from, building it with build() if there is none for the
+    # current revision yet. Lookups wait for a running build, so every structure is built only once
+    def get(self, backend: QueryBackend, build: Callable[[], T], parameters: Hashable = None) -> T:
+        revision: str = backend.db_revision()
+        key: Tuple[str, str, Hashable] = (backend.db_path(), backend.name(), parameters)
+        with self.__lock:
+            entry: Optional[Tuple[str, T]] = self.__entries.get(key)
+            if entry is not None and entry[0] == revision:
+                return entry[1]
+            value: T = build()
+            for stale in [stale for stale, (stale_revision, _) in self.__entries.items() if stale[:2] == key[:2] and stale_revision != revision]:
+                del self.__entries[stale]
+            self.__entries[key] = (revision, value)
+            return value
+
+class SqliteQuerySession(QuerySession):
+    __connection: Connection
+
+    def __init__(self, connection: Connection) -> None:
+        self.__connection = connection
+
+    def execute(self, query: CatalogQuery, parameters: Dict[str, Any]) -> DataFrame:
+        return pd.read_sql_query(query.statement(), self.__connection, params=parameters)
+
+    def execute_chunks(self, query: CatalogQuery, parameters: Dict[str, Any], chunk_size: int) -> Iterator[DataFrame]:
+        # stream_results fetches the rows from the cursor as they are consumed instead of buffering them
+        connection: Connection = self.__connection.execution_options(stream_results=True)
+        return pd.read_sql_query(query.statement(), connection, params=parameters, chunksize=chunk_size)
+
+# the default backend, running the catalog queries on the SQLite database through SQLAlchemy.
+# With in_memory, the database is copied into a shared-cache in-memory database using the online backup API,
+# so that queries never touch the (possibly network-backed) file again. Databases larger than max_in_memory_bytes
+# are queried from the file instead, memory-mapped to avoid read syscalls
+class SqliteQueryBackend(QueryBackend):
+    __engine: Engine
+    # keeps the shared in-memory database alive, as SQLite drops it once its last connection is closed
+    __memory_connection: Optional[sqlite3.Connection] = None
+
+    def __init__(self, connection_string: str, in_memory: bool = False, max_in_memory_bytes: int = 1024 ** 3) -> None:
+        super().__init__(str(make_url(connection_string).database))
+        size: int = os.path.getsize(self.db_path()) if os.path.exists(self.db_path()) else 0
+        if in_memory and size <= max_in_memory_bytes:
+            self.__engine = self.__create_memory_engine(size)
+        else:
+            if in_memory:
+                print(f'\'{self.db_path()}\' ({size / 1024 ** 2:.0f} MiB) exceeds the in-memory limit of {max_in_memory_bytes / 1024 ** 2:.0f} MiB, using the memory-mapped file instead')
+            self.__engine = create_engine(connection_string)
+            if in_memory:
+                self.__enable_mmap(size)
+        self.__attach_derived()
+
+    def __create_memory_engine(self, size: int) -> Engine:
+        print(f'Loading \'{self.db_path()}\' ({size / 1024 ** 2:.0f} MiB) into memory...')
+        memory_uri: str = f'file:rankings-{uuid.uuid4().hex}?mode=memory&cache=shared'
+        self.__memory_connection = sqlite3.connect(memory_uri, uri=True, check_same_thread=False)
+        source = sqlite3.connect(f'file:{self.db_path()}?mode=ro', uri=True)
+        try:
+            source.backup(self.__memory_connection)
+        finally:
+            source.close()
+        # every pooled connection attaches to the same shared in-memory database
+        return create_engine('sqlite://', creator=lambda: sqlite3.connect(memory_uri, uri=True, check_same_thread=False))
+
+    # every connection attaches the side database of the derived tables (which stays on disk, also in memory)
+    def __attach_derived(self) -> None:
+        derived_path: str = DerivedTables.path(self.db_path())
+
+        @event.listens_for(self.__engine, 'connect')
+        def connect(dbapi_connection: Any, _) -> None:
+            dbapi_connection.execute(f'ATTACH DATABASE ? AS {DerivedTables.SCHEMA}', (derived_path,))
+
+    def __enable_mmap(self, size: int) -> None:
+        @event.listens_for(self.__engine, 'connect')
+        def connect(dbapi_connection: Any, _) -> None:
+            cursor = dbapi_connection.cursor()
+            cursor.execute(f'PRAGMA mmap_size = {size}')
+            cursor.close()
+
+    def name(self) -> str:
+        return 'sqlite'
+
+    def engine(self) -> Engine:
+        return self.__engine
+
+    @contextmanager
+    def session(self) -> Generator[QuerySession, Any, Any]:
+        with self.__engine.connect() as connection:
+            yield SqliteQuerySession(connection)
+
+    def dispose(self) -> None:
+        self.__engine.dispose()
+        if self.__memory_connection is not None:
+            self.__memory_connection.close()
+            self.__memory_connection = None
+
+class DuckDbQuerySession(QuerySession):
+    __cursor: Any
+
+    def __init__(self, cursor: Any) -> None:
+        self.__cursor = cursor
+
+    def execute(self, query: CatalogQuery, parameters: Dict[str, Any]) -> DataFrame:
+        return self.__cursor.execute(self.__sql(query), parameters).fetchdf()
+
+    def execute_chunks(self, query: CatalogQuery, parameters: Dict[str, Any], chunk_size: int) -> Iterator[DataFrame]:
+        self.__cursor.execute(self.__sql(query), parameters)
+        # DuckDB produces its results in vectors of 2048 rows
+        vectors: int = max(1, chunk_size // 2048)
+        while True:
+            chunk: DataFrame = self.__cursor.fetch_df_chunk(vectors)
+            if len(chunk) == 0:
+                return
+            yield chunk
+
+    def __sql(self, query: CatalogQuery) -> str:
+        # DuckDB uses $name instead of :name for named parameters (but '::' for casts)
+        return re.sub(r'(?<![:\w]):(\w+)', r'$\1', query.sql('duckdb'))
+
+# an in-process columnar backend running the catalog queries on DuckDB (optional dependency).
+# The analytically relevant columns of the rankings database are exported once per database revision (see
+# read_db_revision) into Parquet files, which DuckDB then scans in a vectorized fashion. Tables are exported in chunks
+# (one Parquet file each), so that no table is ever held in memory as a whole, and the exports of older revisions are
+# deleted once a new revision has been exported
+class DuckDbQueryBackend(QueryBackend):
+    # the tables and columns exported from the rankings database. Free text columns (descriptions, URIs) are left out
+    COLUMNAR_TABLES: Dict[str, List[str]] = {
+        'DataSets': ['Id', 'CollectedAt'],
+        'Rankings': ['Id', 'Genre', 'Country', 'PodcastDataSetId'],
+        'RankedPodcasts': ['RankingId', 'PodcastId', 'Rank'],
+        'Podcasts': ['Id', 'ShowName', 'Genre', 'Market'],
+        'Episodes': ['Id', 'PodcastId', 'DurationMs', 'ReleaseDate', 'ReleaseDatePrecision'],
+        EpisodeDates.TABLE: ['EpisodeId', 'PodcastId', 'ReleaseDatePrecision', 'EpochDay', 'Weekday', 'IsoYear', 'IsoWeek', 'Year', 'Month', 'MonthIndex']
+    }
+    __CHUNK_SIZE: int = 250_000
+
+    __export_root: str
+    __export_dir: str
+    __connection: Any
+    __lock: threading.Lock
+
+    def __init__(self, db_path: str, export_dir: Optional[str] = None) -> None:
+        super().__init__(db_path)
+        try:
+            import duckdb
+        except ImportError:
+            raise Exception('The columnar query backend requires the optional \'duckdb\' package')
+        if export_dir is None:
+            export_dir = os.path.join(os.path.dirname(self.db_path()), 'columnar')
+        # <export_dir>/<database file>/<revision>, as several databases may be kept in the same directory
+        self.__export_root = os.path.join(export_dir, os.path.basename(self.db_path()))
+        self.__export_dir = os.path.join(self.__export_root, re.sub(r'[^\w.-]', '_', self.db_revision()))
+        self.__lock = threading.Lock()
+        self.__export()
+        self.__connection = duckdb.connect(':memory:')
+        for table in self.COLUMNAR_TABLES:
+            self.__connection.execute(f'CREATE VIEW {table} AS SELECT * FROM read_parquet(\'{self.__table_dir(table)}/*.parquet\')')
+
+    def name(self) -> str:
+        return 'duckdb'
+
+    # the directory of the Parquet files of a table, which only exists once the table has been exported completely
+    def __table_dir(self, table: str) -> str:
+        return os.path.join(self.__export_dir, table).replace('\\', '/')
+
+    # the DuckDB type of a column, from the type affinity of its declared SQLite type, so that every chunk of a table is
+    # written with the same types (e.g. a chunk without any duration would otherwise be written as text)
+    @staticmethod
+    def __column_type(declared_type: str) -> str:
+        declared_type = declared_type.upper()
+        if 'INT' in declared_type:
+            return 'BIGINT'
+        if any(affinity in declared_type for affinity in ('REAL', 'FLOA', 'DOUB')):
+            return 'DOUBLE'
+        return 'VARCHAR'
+
+    # exports the columnar tables of the current database revision, unless they have already been exported
+    def __export(self) -> None:
+        import duckdb
+        missing: List[str] = [table for table in self.COLUMNAR_TABLES if not os.path.isdir(self.__table_dir(table))]
+        if len(missing) == 0:
+            return
+        print(f'Exporting {len(missing)} tables of \'{self.db_path()}\' to columnar storage...')
+        for table in missing:
+            if table in _DERIVED_TABLES:
+                self._ensure_derived(table)
+        os.makedirs(self.__export_dir, exist_ok=True)
+        export = duckdb.connect(':memory:')
+        with sqlite3.connect(f'file:{self.db_path()}?mode=ro', uri=True) as source:
+            source.execute(f'ATTACH DATABASE ? AS {DerivedTables.SCHEMA}', (f'file:{DerivedTables.path(self.db_path())}?mode=ro',))
+            for table in missing:
+                schema: str = DerivedTables.SCHEMA if table in _DERIVED_TABLES else 'main'
+                declared_types: Dict[str, str] = {row[1]: row[2] for row in source.execute(f'PRAGMA {schema}.table_info({table})')}
+                columns: List[str] = self.COLUMNAR_TABLES[table]
+                casts: str = ', '.join(f'CAST({column} AS {DuckDbQueryBackend.__column_type(declared_types[column])}) AS {column}' for column in columns)
+                # write to a temporary directory first, so that an interrupted export is never mistaken for a complete one
+                temporary_dir: str = f'{self.__table_dir(table)}.{uuid.uuid4().hex}.tmp'
+                os.makedirs(temporary_dir)
+                try:
+                    chunks: Iterator[DataFrame] = pd.read_sql_query(f'SELECT {", ".join(columns)} FROM {table}', source, chunksize=DuckDbQueryBackend.__CHUNK_SIZE)
+                    for index, chunk in enumerate(chunks):
+                        export.register('export_data', chunk)
+                        export.execute(f'COPY (SELECT {casts} FROM export_data) TO \'{temporary_dir}/part-{index:05d}.parquet\' (FORMAT PARQUET)')
+                        export.unregister('export_data')
+                    if len(os.listdir(temporary_dir)) == 0:
+                        # an empty table still needs a file with its columns
+                        export.execute(f'COPY (SELECT {", ".join(f"CAST(NULL AS {DuckDbQueryBackend.__column_type(declared_types[column])}) AS {column}" for column in columns)} LIMIT 0) TO \'{temporary_dir}/part-00000.parquet\' (FORMAT PARQUET)')
+                    try:
+                        os.rename(temporary_dir, self.__table_dir(table))
+                    except OSError:
+                        # another process has exported the table in the meantime
+                        if not os.path.isdir(self.__table_dir(table)):
+                            raise
+                finally:
+                    shutil.rmtree(temporary_dir, ignore_errors=True)
+        export.close()
+        self.__delete_old_exports()
+
+    # deletes the exports of other revisions of the database, which are never read again (by this process)
+    def __delete_old_exports(self) -> None:
+        for entry in os.listdir(self.__export_root):
+            path: str = os.path.join(self.__export_root, entry)
+            if path != self.__export_dir and os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+
+    @contextmanager
+    def session(self) -> Generator[QuerySession, Any, Any]:
+        # DuckDB connections must not be shared between threads, but cursors of the same connection can
+        with self.__lock:
+            cursor = self.__connection.cursor()
+        try:
+            yield DuckDbQuerySession(cursor)
+        finally:
+            cursor.close()
+
+    def dispose(self) -> None:
+        self.__connection.close()
+
+# creates the query backend with the given name for the rankings database
+def create_query_backend(backend: str, connection_string: str, in_memory: bool = False, max_in_memory_bytes: int = 1024 ** 3) -> QueryBackend:
+    if backend == 'sqlite':
+        return SqliteQueryBackend(connection_string, in_memory, max_in_memory_bytes)
+    if backend == 'duckdb':
+        return DuckDbQueryBackend(str(make_url(connection_string).database))
+    raise Exception(f'Unknown query backend \'{backend}\'')
@@ -0,0 +1,199 @@
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+from pandas import DataFrame
+from sqlalchemy import Float, Integer, String, TextClause, bindparam, text
+from sqlalchemy.types import TypeEngine
+
+if TYPE_CHECKING:
+    from analyzers.internals.query_backend import QueryBackend
+
+# maps the python types allowed for bind parameters to their SQL types
+_PARAMETER_TYPES: Dict[type, TypeEngine] = {
+    int: Integer(),
+    float: Float(),
+    str: String()
+}
+
+# a named SQL query with typed bind parameters (':name' placeholders in the SQL).
+# The SQL is written for SQLite, backends with a different SQL dialect may provide their own variant.
+# Queries using features only some backends have (e.g. SQLite's full-text search) can be restricted to them
+class CatalogQuery:
+    __name: str
+    __sql: str
+    __parameters: Dict[str, type]
+    __dialects: Dict[str, str]
+    __example: Dict[str, Any]
+    __backends: Optional[List[str]]
+    __statement: TextClause
+
+    def __init__(self, name: str, sql: str, parameters: Mapping[str, type], dialects: Mapping[str, str], example: Mapping[str, Any], backends: Optional[Sequence[str]] = None) -> None:
+        for parameter, parameter_type in parameters.items():
+            if parameter_type not in _PARAMETER_TYPES:
+                raise Exception(f'Unsupported type {parameter_type.__name__} for parameter \'{parameter}\' of query \'{name}\'')
+        self.__name = name
+        self.__sql = sql
+        self.__parameters = dict(parameters)
+        self.__dialects = dict(dialects)
+        self.__example = dict(example)
+        self.__backends = list(backends) if backends is not None else None
+        # the statement is compiled once and reused for every execution (and parameter set)
+        self.__statement = text(sql).bindparams(*[bindparam(parameter, type_=_PARAMETER_TYPES[parameter_type]) for parameter, parameter_type in parameters.items()])
+
+    def name(self) -> str:
+        return self.__name
+
+    # returns the SQL of the query in the given dialect, falling back to the SQLite SQL
+    def sql(self, dialect: str = 'sqlite') -> str:
+        return self.__dialects.get(dialect, self.__sql)
+
+    # a representative parameter set, e.g. to check backends for conformance
+    def example(self) -> Dict[str, Any]:
+        return dict(self.__example)
+
+    def parameters(self) -> Dict[str, type]:
+        return dict(self.__parameters)
+
+    # whether the query can be executed on the backend with the given name
+    def supports(self, backend: str) -> bool:
+        return self.__backends is None or backend in self.__backends
+
+    def statement(self) -> TextClause:
+        return self.__statement
+
+    # validates the given parameter values against the declared parameters
+    def bind(self, values: Mapping[str, Any]) -> Dict[str, Any]:
+        missing: List[str] = [parameter for parameter in self.__parameters if parameter not in values]
+        unknown: List[str] = [parameter for parameter in values if parameter not in self.__parameters]
+        if len(missing) > 0 or len(unknown) > 0:
+            raise Exception(f'Invalid parameters for query \'{self.__name}\' (missing: {missing}, unknown: {unknown})')
+        bound: Dict[str, Any] = {}
+        for parameter, parameter_type in self.__parameters.items():
+            value: Any = values[parameter]
+            # bool is a subclass of int, but almost certainly a mistake here
+            if isinstance(value, bool) or not isinstance(value, parameter_type):
+                if parameter_type is float and isinstance(value, int) and not isinstance(value, bool):
+                    value = float(value)
+                else:
+                    raise Exception(f'Parameter \'{parameter}\' of query \'{self.__name}\' must be of type {parameter_type.__name__}, got {type(value).__name__}')
+            bound[parameter] = value
+        return bound
+
+# execution statistics of a single catalog query
+class QueryStatistics:
+    executions: int = 0
+    rows: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+
+    def record(self, seconds: float, rows: int) -> None:
+        self.executions += 1
+        self.rows += rows
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+
+    def mean_seconds(self) -> float:
+        return self.total_seconds / self.executions if self.executions > 0 else 0.0
+
+# registry of all analyzer queries. Queries are registered once (at import time of the analyzer
+# modules) and executed by name, with parameters passed as bind parameters instead of being
+# formatted into the SQL, so that statements can be reused and results can be keyed by parameters
+class QueryCatalog:
+    __queries: Dict[str, CatalogQuery]
+    # statistics by query and backend
+    __statistics: Dict[Tuple[str, str], QueryStatistics]
+    __lock: threading.Lock
+
+    def __init__(self) -> None:
+        self.__queries = {}
+        self.__statistics = {}
+        self.__lock = threading.Lock()
+
+    def register(self, name: str, sql: str, parameters: Optional[Mapping[str, type]] = None, dialects: Optional[Mapping[str, str]] = None, example: Optional[Mapping[str, Any]] = None, backends: Optional[Sequence[str]] = None) -> CatalogQuery:
+        if name in self.__queries:
+            raise Exception(f'Query \'{name}\' is already registered')
+        parameters = parameters if parameters is not None else {}
+        if example is None:
+            example = {}
+            if len(parameters) > 0:
+                raise Exception(f'Query \'{name}\' has parameters, but no example parameter set')
+        query = CatalogQuery(name, sql, parameters, dialects if dialects is not None else {}, example, backends)
+        query.bind(example)
+        self.__queries[name] = query
+        return query
+
+    def get(self, name: str) -> CatalogQuery:
+        query: Optional[CatalogQuery] = self.__queries.get(name)
+        if query is None:
+            raise Exception(f'Unknown query \'{name}\'')
+        return query
+
+    def __get_supported(self, name: str, backend: 'QueryBackend') -> CatalogQuery:
+        query: CatalogQuery = self.get(name)
+        if not query.supports(backend.name()):
+            raise Exception(f'Query \'{name}\' is not supported by the {backend.name()} backend')
+        return query
+
+    def names(self) -> List[str]:
+        return sorted(self.__queries.keys())
+
+    # executes the named query with the given parameters
+    def execute(self, backend: 'QueryBackend', name: str, **parameters: Any) -> DataFrame:
+        return self.execute_batch(backend, name, [parameters])[0]
+
+    # executes the named query once for every parameter set, reusing a single connection (and prepared statement)
+    def execute_batch(self, backend: 'QueryBackend', name: str, parameter_sets: Sequence[Mapping[str, Any]]) -> List[DataFrame]:
+        query: CatalogQuery = self.__get_supported(name, backend)
+        bound_sets: List[Dict[str, Any]] = [query.bind(parameters) for parameters in parameter_sets]
+        backend.prepare(query)
+        results: List[DataFrame] = []
+        with backend.session() as session:
+            for bound in bound_sets:
+                start: float = time.perf_counter()
+                data: DataFrame = session.execute(query, bound)
+                self.record(query.name(), backend.name(), time.perf_counter() - start, len(data))
+                results.append(data)
+        return results
+
+    # executes the named query and streams its result in frames of at most chunk_size rows.
+    # The time spent consuming the frames is not included in the statistics
+    def execute_chunks(self, backend: 'QueryBackend', name: str, chunk_size: int, **parameters: Any) -> Iterator[DataFrame]:
+        query: CatalogQuery = self.__get_supported(name, backend)
+        bound: Dict[str, Any] = query.bind(parameters)
+        backend.prepare(query)
+        seconds: float = 0.0
+        rows: int = 0
+        with backend.session() as session:
+            start: float = time.perf_counter()
+            for chunk in session.execute_chunks(query, bound, chunk_size):
+                seconds += time.perf_counter() - start
+                rows += len(chunk)
+                yield chunk
+                start = time.perf_counter()
+        self.record(query.name(), backend.name(), seconds, rows)
+
+    def record(self, name: str, backend: str, seconds: float, rows: int) -> None:
+        with self.__lock:
+            statistics: QueryStatistics = self.__statistics.setdefault((name, backend), QueryStatistics())
+            statistics.record(seconds, rows)
+
+    # returns the execution statistics of all queries that have been executed so far
+    def statistics(self) -> DataFrame:
+        with self.__lock:
+            return DataFrame([{
+                'Query': name,
+                'Backend': backend,
+                'Executions': statistics.executions,
+                'Rows': statistics.rows,
+                'TotalSeconds': statistics.total_seconds,
+                'MeanSeconds': statistics.mean_seconds(),
+                'MaxSeconds': statistics.max_seconds
+            } for (name, backend), statistics in self.__statistics.items()], columns=['Query', 'Backend', 'Executions', 'Rows', 'TotalSeconds', 'MeanSeconds', 'MaxSeconds'])
+
+    def print_statistics(self) -> None:
+        statistics: DataFrame = self.statistics().sort_values(by='TotalSeconds', ascending=False)
+        print('Query statistics:')
+        print(statistics.to_string(index=False, float_format=lambda x: f'{x:.4f}'))
+
+# the catalog all analyzers register their queries with
+QUERY_CATALOG = QueryCatalog()
@@ -0,0 +1,95 @@
+from typing import List, Optional, Tuple
+import numpy as np
+from pandas import DataFrame
+from scipy import sparse
+from analyzers.internals.query_backend import DatabaseCache, QueryBackend
+from analyzers.internals.query_catalog import QUERY_CATALOG
+
+QUERY_CATALOG.register('rank_matrix.podcasts', '''
+    SELECT Id AS PodcastId, Genre
+    FROM Podcasts
+    ORDER BY Id ASC
+''')
+
+QUERY_CATALOG.register('rank_matrix.rankings', '''
+    SELECT Id AS RankingId, Genre, Country
+    FROM Rankings
+    ORDER BY Id ASC
+''')
+
+QUERY_CATALOG.register('rank_matrix.entries', '''
+    SELECT RankedPodcasts.PodcastId, RankedPodcasts.RankingId, RankedPodcasts.Rank
+    FROM RankedPodcasts
+    INNER JOIN Rankings ON Rankings.Id = RankedPodcasts.RankingId
+    INNER JOIN Podcasts ON Podcasts.Id = RankedPodcasts.PodcastId
+''')
+
+# a sparse podcasts x rankings matrix of the ranks of all ranked podcasts. Averages that treat podcasts missing
+# from a ranking as ranked at a fixed rank are computed from the explicit entries and the number of missing
+# rankings, so the podcasts x rankings cross product is never materialized
+class RankMatrix:
+    __matrices: DatabaseCache['RankMatrix'] = DatabaseCache()
+
+    __podcast_ids: np.ndarray
+    __podcast_genres: np.ndarray
+    __ranking_ids: np.ndarray
+    __ranking_genres: np.ndarray
+    __ranking_countries: np.ndarray
+    # podcasts x rankings, the sum of the ranks and the number of entries (duplicate entries are summed up)
+    __ranks: sparse.csr_matrix
+    __counts: sparse.csr_matrix
+
+    def __init__(self, podcasts: DataFrame, rankings: DataFrame, entries: DataFrame) -> None:
+        self.__podcast_ids = podcasts['PodcastId'].to_numpy()
+        self.__podcast_genres = podcasts['Genre'].to_numpy()
+        self.__ranking_ids = rankings['RankingId'].to_numpy()
+        self.__ranking_genres = rankings['Genre'].to_numpy()
+        self.__ranking_countries = rankings['Country'].to_numpy()
+        # both id columns are sorted, so the matrix coordinates are found by binary search
+        rows: np.ndarray = np.searchsorted(self.__podcast_ids, entries['PodcastId'].to_numpy())
+        columns: np.ndarray = np.searchsorted(self.__ranking_ids, entries['RankingId'].to_numpy())
+        shape: Tuple[int, int] = (len(self.__podcast_ids), len(self.__ranking_ids))
+        self.__ranks = sparse.csr_matrix((entries['Rank'].to_numpy(dtype=np.float64), (rows, columns)), shape=shape)
+        self.__counts = sparse.csr_matrix((np.ones(len(entries), dtype=np.float64), (rows, columns)), shape=shape)
+
+    # returns the (shared) rank matrix of the database the backend reads from (see DatabaseCache)
+    @staticmethod
+    def for_backend(backend: QueryBackend) -> 'RankMatrix':
+        return RankMatrix.__matrices.get(backend, lambda: RankMatrix(
+            QUERY_CATALOG.execute(backend, 'rank_matrix.podcasts'),
+            QUERY_CATALOG.execute(backend, 'rank_matrix.rankings'),
+            QUERY_CATALOG.execute(backend, 'rank_matrix.entries')))
+
+    def podcast_ids(self) -> np.ndarray:
+        return self.__podcast_ids.copy()
+
+    def podcast_genres(self) -> np.ndarray:
+        return self.__podcast_genres.copy()
+
+    # returns a mask over the rankings, selecting the rankings of the given genre and countries (None selects all)
+    def ranking_mask(self, genre: Optional[str] = None, countries: Optional[List[str]] = None) -> np.ndarray:
+        mask: np.ndarray = np.ones(len(self.__ranking_ids), dtype=bool)
+        if genre is not None:
+            mask &= self.__ranking_genres == genre
+        if countries is not None:
+            mask &= np.isin(self.__ranking_countries, countries)
+        return mask
+
+    # returns the sum of the ranks and the number of entries of every podcast in the selected rankings
+    def rank_sums(self, ranking_mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        selection: np.ndarray = ranking_mask.astype(np.float64)
+        return self.__ranks @ selection, self.__counts @ selection
+
+    # returns the number of the selected rankings every podcast is not ranked in
+    def missing_rankings(self, ranking_mask: np.ndarray) -> np.ndarray:
+        present: np.ndarray = (self.__counts > 0).astype(np.float64) @ ranking_mask.astype(np.float64)
+        return int(ranking_mask.sum()) - present
+
+    # returns the average rank of every podcast over its entries in the ranked rankings, where every
+    # ranking of the filled rankings that does not contain the podcast adds an entry of missing_rank.
+    # Podcasts without any (explicit or filled) entry have an average rank of NaN
+    def average_ranks(self, ranked_mask: np.ndarray, filled_mask: np.ndarray, missing_rank: float) -> np.ndarray:
+        sums, counts = self.rank_sums(ranked_mask)
+        missing: np.ndarray = self.missing_rankings(filled_mask)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return (sums + missing * missing_rank) / (counts + missing)
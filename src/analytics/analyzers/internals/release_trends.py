@@ -0,0 +1,163 @@
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+from matplotlib.figure import Figure
+from analyzers.internals.figures import create_figure
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+import seaborn as sns
+from analyzers.internals.analyzer_result import AnalyzerResult
+from analyzers.internals.model_store import ModelStore
+from analyzers.internals.query_backend import QueryBackend, create_query_backend, read_db_version
+
+# a trend of one capability over the releases: the value aggregated per release and key
+class TrendView:
+    capability: str
+    key: str
+    value: str
+    # 'mean' or 'sum' over the other dimensions of the capability (e.g. the countries)
+    aggregate: str
+    title: str
+    # ranks are plotted top down, so that rising lines mean better ranks
+    invert: bool
+
+    def __init__(self, capability: str, key: str, value: str, aggregate: str, title: str, invert: bool = False) -> None:
+        self.capability = capability
+        self.key = key
+        self.value = value
+        self.aggregate = aggregate
+        self.title = title
+        self.invert = invert
+
+TREND_VIEWS: List[TrendView] = [
+    TrendView('genre_vs_rank', 'Genre', 'AvgRank', 'mean', 'Average Rank by Genre over Releases', invert=True),
+    TrendView('genre_vs_presence_by_region', 'Genre', 'NumPodcasts', 'sum', 'Ranked Podcasts by Genre over Releases'),
+    TrendView('duration_by_genre', 'Genre', 'AvgDurationMs', 'mean', 'Average Episode Duration by Genre over Releases'),
+    TrendView('episode_count_by_genre_and_region', 'Genre', 'AvgNumEpisodes', 'mean', 'Average Number of Episodes by Genre over Releases'),
+    TrendView('upload_frequency_by_day_of_week', 'DayOfWeekName', 'Uploads', 'sum', 'Uploads by Day of Week over Releases')
+]
+
+# computes the capabilities of one release (in a worker process): returns their frames by capability name
+def _analyze_release(db_path: str, analyzer_types: List[type], capability_names: List[str], backend_name: str, theme: str, palette: str) -> Dict[str, DataFrame]:
+    connection_string: str = 'sqlite:///' + os.path.abspath(db_path)
+    backend: QueryBackend = create_query_backend(backend_name, connection_string)
+    frames: Dict[str, DataFrame] = {}
+    for analyzer_type in analyzer_types:
+        analyzer = analyzer_type(connection_string, theme, palette, backend)
+        for capability in analyzer.capabilities():
+            if capability.__name__ in capability_names:
+                frames[capability.__name__] = capability().get_data_frame()
+    return frames
+
+# runs a set of capabilities on every release of the rankings database (one database file per release, tagged with
+# its GitHub publication date in <file>.version) and merges their frames with a release dimension:
+#   Release      the name of the release (the directory of a rankings.db, otherwise the file name)
+#   PublishedAt  the publication date of the release
+# The releases are analyzed in parallel worker processes. The frames of every release are cached by capability and
+# release version (<cache_dir>/<version>/<capability>.npz, see ModelStore), so adding a release only computes that
+# release, and adding a capability only computes that capability
+class ReleaseTrends:
+    __frames: Dict[str, DataFrame]
+    __theme: str
+    __palette: str
+
+    def __init__(self, frames: Dict[str, DataFrame], theme: str, palette: str) -> None:
+        self.__frames = frames
+        self.__theme = theme
+        self.__palette = palette
+
+    @staticmethod
+    def run(db_paths: List[str], analyzer_types: List[type], capability_names: List[str], cache_dir: str, backend_name: str = 'sqlite', theme: str = 'darkgrid', palette: str = 'viridis', workers: Optional[int] = None) -> 'ReleaseTrends':
+        releases: List[Tuple[str, str, str]] = [ReleaseTrends.__release(db_path) for db_path in db_paths]
+        if len(set(version for _, _, version in releases)) < len(releases):
+            raise Exception('Every release must have a distinct version')
+        stores: List[ModelStore] = [ReleaseTrends.store(cache_dir, version) for _, _, version in releases]
+        frames: List[Dict[str, DataFrame]] = [{} for _ in releases]
+        missing: List[List[str]] = [[] for _ in releases]
+        for index, ((_, _, version), store) in enumerate(zip(releases, stores)):
+            for name in capability_names:
+                state: Optional[Dict[str, np.ndarray]] = store.load(name, version)
+                if state is not None:
+                    frames[index][name] = ModelStore.frame_from_state(state, 'data')
+                else:
+                    missing[index].append(name)
+        pending: List[int] = [index for index in range(len(releases)) if len(missing[index]) > 0]
+        print(f'Analyzing {len(pending)} of {len(releases)} releases ({len(releases) - len(pending)} cached)...')
+        if workers is None:
+            workers = min(len(pending), os.cpu_count() or 1)
+        arguments = ([releases[index][0] for index in pending], [analyzer_types] * len(pending), [missing[index] for index in pending], [backend_name] * len(pending), [theme] * len(pending), [palette] * len(pending))
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results: List[Dict[str, DataFrame]] = list(executor.map(_analyze_release, *arguments))
+        else:
+            results = [_analyze_release(*release_arguments) for release_arguments in zip(*arguments)]
+        for index, computed in zip(pending, results):
+            for name, data in computed.items():
+                stores[index].save(name, releases[index][2], ModelStore.frame_to_state(data, 'data'))
+                frames[index][name] = data
+        merged: Dict[str, DataFrame] = {}
+        for name in capability_names:
+            release_frames: List[DataFrame] = [release_frames[name].assign(Release=release, PublishedAt=pd.Timestamp(version)) for (_, release, version), release_frames in zip(releases, frames) if name in release_frames]
+            if len(release_frames) == 0:
+                raise Exception(f'Unknown capability \'{name}\'')
+            data: DataFrame = pd.concat(release_frames, ignore_index=True)
+            merged[name] = data[['Release', 'PublishedAt'] + [column for column in data.columns if column not in ('Release', 'PublishedAt')]].sort_values(by='PublishedAt', kind='stable').reset_index(drop=True)
+        return ReleaseTrends(merged, theme, palette)
+
+    # the path, name and version of a release database
+    @staticmethod
+    def __release(db_path: str) -> Tuple[str, str, str]:
+        if not os.path.exists(db_path):
+            raise Exception(f'Release database \'{db_path}\' does not exist')
+        version: str = read_db_version(db_path)
+        if version == 'unknown':
+            raise Exception(f'Release database \'{db_path}\' has no version file ({db_path}.version)')
+        directory, file_name = os.path.split(os.path.abspath(db_path))
+        return db_path, os.path.basename(directory) if file_name == 'rankings.db' else file_name, version
+
+    # the cache of the frames of a release version (see WorkQueue, whose workers fill the same cache).
+    # Versions are timestamps (2023-07-16T12:00:00Z), which are not valid directory names everywhere
+    @staticmethod
+    def store(cache_dir: str, version: str) -> ModelStore:
+        return ModelStore(os.path.join(cache_dir, re.sub(r'[^0-9A-Za-z_.-]', '-', version)))
+
+    # the merged frame of a capability over all releases
+    def get_data_frame(self, capability: str) -> DataFrame:
+        if capability not in self.__frames:
+            raise Exception(f'Capability \'{capability}\' has not been analyzed across releases')
+        return self.__frames[capability]
+
+    def capability_names(self) -> List[str]:
+        return list(self.__frames.keys())
+
+    # the trend views of all analyzed capabilities by name (trend_<capability>)
+    def trends(self) -> Dict[str, Callable[[], AnalyzerResult]]:
+        trends: Dict[str, Callable[[], AnalyzerResult]] = {}
+        for view in TREND_VIEWS:
+            if view.capability in self.__frames:
+                trend: Callable[[], AnalyzerResult] = (lambda view: lambda: self.trend(view))(view)
+                trend.__name__ = 'trend_' + view.capability
+                trends[trend.__name__] = trend
+        return trends
+
+    # the value of the view per release and key
+    def trend(self, view: TrendView) -> AnalyzerResult:
+        data: DataFrame = self.get_data_frame(view.capability).groupby(['Release', 'PublishedAt', view.key], as_index=False)[view.value].agg(view.aggregate)
+        data = data.sort_values(by=['PublishedAt', view.key]).reset_index(drop=True)
+
+        def render(result: AnalyzerResult) -> Figure:
+            fig, ax = create_figure(figsize=(12, 8))
+            sns.lineplot(data=result.get_data_frame(), x='PublishedAt', y=view.value, hue=view.key, palette=self.__palette, marker='o', ax=ax)
+            if view.invert:
+                ax.invert_yaxis()
+            ax.set_title(view.title)
+            ax.set_xlabel('Release')
+            ax.tick_params(axis='x', labelrotation=45)
+            ax.set_ylabel(view.value)
+            ax.legend(title=view.key, bbox_to_anchor=(1.02, 1), loc='upper left')
+            fig.tight_layout()
+            return fig
+
+        return AnalyzerResult(data, render, self.__theme)
@@ -0,0 +1,133 @@
+import gc
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+from pandas import DataFrame
+from analyzers.internals.analyzer_result import AnalyzerResult, AnalyzerResultModel
+
+# returns a field of /proc/self/status in bytes (Linux only), or None
+def _process_status_bytes(field: str) -> Optional[int]:
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+# the memory used by one capability, while it was computed and persisted
+class CapabilityMemoryReport:
+    name: str
+    seconds: float
+    # peak of the memory allocated through Python (incl. numpy and pandas buffers), None if not measured
+    peak_mb: Optional[float]
+    # resident set size of the process after the capability has been persisted and freed
+    rss_mb: Optional[float]
+    budget_mb: Optional[float]
+    # 'ok', 'over budget' (its peak exceeded the budget) or 'aborted' (the process ran out of memory)
+    status: str
+
+    def __init__(self, name: str, seconds: float, peak_mb: Optional[float], rss_mb: Optional[float], budget_mb: Optional[float], status: str) -> None:
+        self.name = name
+        self.seconds = seconds
+        self.peak_mb = peak_mb
+        self.rss_mb = rss_mb
+        self.budget_mb = budget_mb
+        self.status = status
+
+# persists the results of capabilities (figure and model visualizations) one at a time, and frees the data frames
+# and figures as soon as they are written, so that at most one result is alive at any time.
+# Capabilities can be given memory budgets (in MB). Budgets are measured and reported, not enforced: the allocations
+# of a capability with a budget are traced (tracemalloc) while it runs, and capabilities whose peak exceeds their
+# budget are reported. Limiting the memory of the process (e.g. its address space) would also constrain the threads
+# of the servers and the memory-mapped databases, and tracing slows allocations down, so capabilities without a
+# budget are not traced. A capability that runs the process out of memory is reported and skipped
+class ResultSink:
+    __file_name: Callable[[str], str]
+    __visualize: bool
+    __default_budget_mb: Optional[float]
+    __budgets_mb: Dict[str, float]
+    __reports: List[CapabilityMemoryReport]
+    __reuse: Optional[Callable[[str, AnalyzerResult, List[str]], bool]]
+
+    # file_name maps the name of a capability (or model visualization) to the file it is saved to. reuse(name, result,
+    # names) is asked before the figures of a computed result (the capability and its model visualizations, names) are
+    # rendered, and returns whether they have been taken over from earlier results instead
+    def __init__(self, file_name: Callable[[str], str], visualize: bool = False, default_budget_mb: Optional[float] = None, budgets_mb: Optional[Dict[str, float]] = None, reuse: Optional[Callable[[str, AnalyzerResult, List[str]], bool]] = None) -> None:
+        self.__file_name = file_name
+        self.__reuse = reuse
+        self.__visualize = visualize
+        self.__default_budget_mb = default_budget_mb
+        self.__budgets_mb = dict(budgets_mb) if budgets_mb is not None else {}
+        self.__reports = []
+
+    def budget_mb(self, name: str) -> Optional[float]:
+        return self.__budgets_mb.get(name, self.__default_budget_mb)
+
+    # computes the capability and saves its figure and model visualizations
+    def persist(self, capability: Callable[[], AnalyzerResult]) -> CapabilityMemoryReport:
+        name: str = capability.__name__
+        budget_mb: Optional[float] = self.budget_mb(name)
+        # another component may be tracing already (e.g. python -X tracemalloc), which is left running
+        trace: bool = budget_mb is not None and not tracemalloc.is_tracing()
+        if trace:
+            tracemalloc.start()
+        if budget_mb is not None:
+            tracemalloc.reset_peak()
+        status: str = 'ok'
+        peak_mb: Optional[float] = None
+        start: float = time.perf_counter()
+        try:
+            self.__persist(name, capability)
+        except MemoryError:
+            status = 'aborted'
+        finally:
+            if budget_mb is not None:
+                peak_mb = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+            if trace:
+                tracemalloc.stop()
+            # the figures of a failing render are only freed once their reference cycles are collected
+            gc.collect()
+        seconds: float = time.perf_counter() - start
+        if status == 'ok' and budget_mb is not None and peak_mb is not None and peak_mb > budget_mb:
+            status = 'over budget'
+        rss: Optional[int] = _process_status_bytes('VmRSS')
+        report = CapabilityMemoryReport(name, seconds, peak_mb, rss / 1024 ** 2 if rss is not None else None, budget_mb, status)
+        if status == 'over budget':
+            print(f'Capability {name} exceeded its memory budget of {budget_mb:g} MB (peak {peak_mb:.1f} MB)')
+        elif status == 'aborted':
+            print(f'Capability {name} ran out of memory')
+        self.__reports.append(report)
+        return report
+
+    # the result, its figures and its frame are only referenced from this frame, so they are freed when it returns
+    def __persist(self, name: str, capability: Callable[[], AnalyzerResult]) -> None:
+        result: AnalyzerResult = capability()
+        model: Optional[AnalyzerResultModel] = result.get_model()
+        visualizations = model.get_visualizations() if model is not None else []
+        if self.__reuse is not None and self.__reuse(name, result, [name] + [visualization_name for _, visualization_name in visualizations]):
+            return
+        with result.render() as rendered_result:
+            if self.__visualize:
+                rendered_result.visualize()
+            rendered_result.save(self.__file_name(name))
+        for visualization, visualization_name in visualizations:
+            with visualization.render() as rendered_visualization:
+                if self.__visualize:
+                    rendered_visualization.visualize()
+                rendered_visualization.save(self.__file_name(visualization_name))
+
+    def reports(self) -> DataFrame:
+        return DataFrame([{
+            'Capability': report.name,
+            'Seconds': report.seconds,
+            'PeakMB': report.peak_mb,
+            'RssMB': report.rss_mb,
+            'BudgetMB': report.budget_mb,
+            'Status': report.status
+        } for report in self.__reports], columns=['Capability', 'Seconds', 'PeakMB', 'RssMB', 'BudgetMB', 'Status'])
+
+    def print_report(self) -> None:
+        print('Capability memory:')
+        print(self.reports().to_string(index=False, float_format=lambda x: f'{x:.1f}'))
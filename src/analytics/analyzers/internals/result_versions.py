@@ -0,0 +1,104 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import uuid
+from typing import Dict, List, Optional
+import pandas as pd
+from pandas import DataFrame
+
+# returns a fingerprint of the content of a data frame (its columns and values, not its index)
+def frame_fingerprint(data: DataFrame) -> str:
+    digest = hashlib.sha256()
+    digest.update(json.dumps([str(column) for column in data.columns]).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(data, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+# the rendered results of every database version, of which one is published as the current results:
+#   <output_dir>/versions/<version>/podcast_<name>.png   the figures of a version
+#   <output_dir>/versions/<version>/fingerprints.json    the fingerprints of the frames the figures were rendered from
+#   <output_dir>/current                                 a symbolic link to the directory of the current version
+# A version is rendered into a staging directory and published by replacing the link, so readers of the current
+# results see the previous version until the new one is complete. Figures of frames that have not changed since the
+# current version are linked instead of rendered again. Only the current and the previous version are kept
+class ResultVersions:
+    FINGERPRINTS: str = 'fingerprints.json'
+    __output_dir: str
+
+    def __init__(self, output_dir: str) -> None:
+        self.__output_dir = os.path.abspath(output_dir)
+        os.makedirs(self.__versions_dir(), exist_ok=True)
+
+    def __versions_dir(self) -> str:
+        return os.path.join(self.__output_dir, 'versions')
+
+    def version_dir(self, version: str) -> str:
+        return os.path.join(self.__versions_dir(), re.sub(r'[^\w.-]', '_', version))
+
+    def current_link(self) -> str:
+        return os.path.join(self.__output_dir, 'current')
+
+    # the directory of the current version, None if no version has been published yet
+    def current_dir(self) -> Optional[str]:
+        if not os.path.islink(self.current_link()):
+            return None
+        return os.path.join(self.__output_dir, os.readlink(self.current_link()))
+
+    # the version the current results have been rendered from
+    def current_version(self) -> Optional[str]:
+        current: Optional[str] = self.current_dir()
+        if current is None or not os.path.exists(os.path.join(current, ResultVersions.FINGERPRINTS)):
+            return None
+        with open(os.path.join(current, ResultVersions.FINGERPRINTS), 'r') as f:
+            return json.load(f)['version']
+
+    # the fingerprints of the frames of the current results, by capability name
+    def current_fingerprints(self) -> Dict[str, str]:
+        current: Optional[str] = self.current_dir()
+        if current is None or not os.path.exists(os.path.join(current, ResultVersions.FINGERPRINTS)):
+            return {}
+        with open(os.path.join(current, ResultVersions.FINGERPRINTS), 'r') as f:
+            return json.load(f)['fingerprints']
+
+    # creates the staging directory of a version
+    def stage(self, version: str) -> str:
+        staging_dir: str = f'{self.version_dir(version)}.{uuid.uuid4().hex}.staging'
+        os.makedirs(staging_dir)
+        return staging_dir
+
+    # takes the figures over from the current results into the staging directory (hard links where possible).
+    # Returns False if the current results do not contain all of them
+    def reuse(self, staging_dir: str, file_names: List[str]) -> bool:
+        current: Optional[str] = self.current_dir()
+        if current is None or not all(os.path.exists(os.path.join(current, file_name)) for file_name in file_names):
+            return False
+        for file_name in file_names:
+            try:
+                os.link(os.path.join(current, file_name), os.path.join(staging_dir, file_name))
+            except OSError:
+                shutil.copy2(os.path.join(current, file_name), os.path.join(staging_dir, file_name))
+        return True
+
+    # publishes the staged results of a version as the current results, and removes all but the previous version
+    def publish(self, staging_dir: str, version: str, fingerprints: Dict[str, str]) -> None:
+        with open(os.path.join(staging_dir, ResultVersions.FINGERPRINTS), 'w') as f:
+            json.dump({'version': version, 'fingerprints': fingerprints}, f, indent=2, sort_keys=True)
+        previous: Optional[str] = self.current_dir()
+        target: str = self.version_dir(version)
+        if os.path.exists(target):
+            # the version has been rendered before (e.g. with a different set of capabilities): its directory is
+            # moved aside, as the current link may still point to it
+            os.rename(target, f'{target}.{uuid.uuid4().hex}.replaced')
+        os.rename(staging_dir, target)
+        temporary_link: str = f'{self.current_link()}.{uuid.uuid4().hex}.tmp'
+        os.symlink(os.path.relpath(target, self.__output_dir), temporary_link, target_is_directory=True)
+        os.replace(temporary_link, self.current_link())
+        keep: List[str] = [os.path.basename(target)] + ([os.path.basename(os.path.normpath(previous))] if previous is not None else [])
+        for name in os.listdir(self.__versions_dir()):
+            if name not in keep and not name.endswith('.staging'):
+                shutil.rmtree(os.path.join(self.__versions_dir(), name), ignore_errors=True)
+
+    # removes a staging directory of a version that failed to render
+    def discard(self, staging_dir: str) -> None:
+        shutil.rmtree(staging_dir, ignore_errors=True)
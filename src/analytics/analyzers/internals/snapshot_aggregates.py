@@ -0,0 +1,179 @@
+import os
+import threading
+from typing import Dict, List, Optional
+import pandas as pd
+from pandas import DataFrame
+from sqlalchemy import Connection, Engine, create_engine, event, text
+from analyzers.internals.query_backend import QueryBackend
+from analyzers.internals.query_catalog import QUERY_CATALOG
+
+# all snapshots (crawls) contained in the rankings database
+QUERY_CATALOG.register('snapshot_aggregates.snapshots', '''
+    SELECT Id AS DataSetId, CollectedAt
+    FROM DataSets
+    ORDER BY Id ASC
+''')
+
+# the episodes of the podcasts ranked in a snapshot. Episodes are crawled after the rankings,
+# so this is used to detect snapshots whose episode-based partial aggregates have become stale.
+# only touches the Episodes.PodcastId index, not the episode rows themselves
+QUERY_CATALOG.register('snapshot_aggregates.episode_fingerprint', '''
+    SELECT COUNT(*) AS EpisodeCount, COALESCE(MAX(Episodes.Id), 0) AS MaxEpisodeId
+    FROM Episodes
+    WHERE Episodes.PodcastId IN (
+        SELECT RankedPodcasts.PodcastId
+        FROM RankedPodcasts
+        INNER JOIN Rankings ON Rankings.Id = RankedPodcasts.RankingId
+        WHERE Rankings.PodcastDataSetId = :data_set_id
+    )
+''', {'data_set_id': int}, example={'data_set_id': 1})
+
+# an aggregate that is computed separately for every snapshot (DataSet) and stored as additive
+# partial measures (sums and counts, never averages), so that the partial aggregates of all
+# snapshots can be merged by summing them up.
+# The SQL must filter on 'Rankings.PodcastDataSetId = :data_set_id' and group by the keys.
+class SnapshotAggregate:
+    __name: str
+    __keys: List[str]
+    __measures: List[str]
+    __depends_on_episodes: bool
+
+    def __init__(self, name: str, sql: str, keys: List[str], measures: List[str], depends_on_episodes: bool, dialects: Optional[Dict[str, str]] = None) -> None:
+        self.__name = name
+        self.__keys = keys
+        self.__measures = measures
+        self.__depends_on_episodes = depends_on_episodes
+        QUERY_CATALOG.register(self.query_name(), sql, {'data_set_id': int}, dialects, {'data_set_id': 1})
+
+    def name(self) -> str:
+        return self.__name
+
+    def query_name(self) -> str:
+        return self.__name + '.snapshot'
+
+    def keys(self) -> List[str]:
+        return list(self.__keys)
+
+    def measures(self) -> List[str]:
+        return list(self.__measures)
+
+    def depends_on_episodes(self) -> bool:
+        return self.__depends_on_episodes
+
+# persists the partial aggregates of every snapshot next to the rankings database (<db file>.snapshot_aggregates.db),
+# so that a run only has to aggregate the snapshots it has not seen before. Stored partials survive new releases of the
+# database (pulled to the same file), as snapshots are immutable once they have been crawled. Every database file has
+# a store of its own, so releases kept next to each other do not mix their partials.
+# Several processes may synchronize the same store: every write transaction starts with BEGIN IMMEDIATE, so the checks
+# of a synchronization and its writes see the same state, and the partials are unique per snapshot and keys
+class SnapshotAggregateStore:
+    __stores: Dict[str, 'SnapshotAggregateStore'] = {}
+    __stores_lock: threading.Lock = threading.Lock()
+
+    __engine: Engine
+    __lock: threading.Lock
+
+    def __init__(self, store_path: str) -> None:
+        self.__engine = create_engine('sqlite:///' + os.path.abspath(store_path), connect_args={'timeout': 300})
+        # transactions are started explicitly (and immediately) instead of by the driver on the first write
+        event.listen(self.__engine, 'connect', lambda dbapi_connection, _: setattr(dbapi_connection, 'isolation_level', None))
+        event.listen(self.__engine, 'begin', lambda connection: connection.exec_driver_sql('BEGIN IMMEDIATE'))
+        self.__lock = threading.Lock()
+        with self.__engine.begin() as connection:
+            connection.execute(text('''
+                CREATE TABLE IF NOT EXISTS Snapshots (
+                    Aggregate TEXT NOT NULL,
+                    DataSetId INTEGER NOT NULL,
+                    Fingerprint TEXT NOT NULL,
+                    PRIMARY KEY (Aggregate, DataSetId)
+                )
+            '''))
+
+    # returns the (shared) store of the given rankings database
+    @staticmethod
+    def for_database(db_path: str) -> 'SnapshotAggregateStore':
+        store_path: str = os.path.abspath(db_path) + '.snapshot_aggregates.db'
+        with SnapshotAggregateStore.__stores_lock:
+            store = SnapshotAggregateStore.__stores.get(store_path)
+            if store is None:
+                store = SnapshotAggregateStore(store_path)
+                SnapshotAggregateStore.__stores[store_path] = store
+            return store
+
+    # returns the merged (summed) measures of the aggregate over all snapshots in the source database,
+    # computing and storing the partial aggregates of all snapshots that have not been processed yet
+    def aggregate(self, source: QueryBackend, aggregate: SnapshotAggregate) -> DataFrame:
+        with self.__lock:
+            self.__synchronize(source, aggregate)
+            keys: str = ', '.join(aggregate.keys())
+            sums: str = ', '.join(f'SUM({measure}) AS {measure}' for measure in aggregate.measures())
+            return pd.read_sql_query(f'SELECT {keys}, {sums} FROM {self.__table(aggregate)} GROUP BY {keys}', self.__engine)
+
+    def __table(self, aggregate: SnapshotAggregate) -> str:
+        return 'Partial_' + aggregate.name()
+
+    # the partials of the snapshots missing in the store are computed before the write transaction (so that other
+    # processes are not blocked meanwhile), the transaction re-reads the stored fingerprints and only writes what is
+    # still missing then. Partials another process has stored in the meantime are not written twice
+    def __synchronize(self, source: QueryBackend, aggregate: SnapshotAggregate) -> None:
+        snapshots: DataFrame = QUERY_CATALOG.execute(source, 'snapshot_aggregates.snapshots')
+        # the fingerprint identifies the state of the source data a partial aggregate was computed from
+        fingerprints: Dict[int, str] = {int(row.DataSetId): str(row.CollectedAt) for row in snapshots.itertuples()}
+        if aggregate.depends_on_episodes() and len(fingerprints) > 0:
+            episode_fingerprints: List[DataFrame] = QUERY_CATALOG.execute_batch(source, 'snapshot_aggregates.episode_fingerprint', [{'data_set_id': data_set_id} for data_set_id in fingerprints])
+            for data_set_id, episodes in zip(list(fingerprints), episode_fingerprints):
+                fingerprints[data_set_id] += f'|{episodes.iloc[0]["EpisodeCount"]}|{episodes.iloc[0]["MaxEpisodeId"]}'
+        if source.db_version() == 'unknown':
+            # the snapshots of a database without a version may have been modified in place (see read_db_revision)
+            for data_set_id in fingerprints:
+                fingerprints[data_set_id] += f'|{source.db_revision()}'
+        with self.__engine.begin() as connection:
+            stored: Dict[int, str] = self.__stored_fingerprints(connection, aggregate)
+        missing: List[int] = [data_set_id for data_set_id in fingerprints if stored.get(data_set_id) != fingerprints[data_set_id]]
+        if len(missing) == 0 and all(data_set_id in fingerprints for data_set_id in stored):
+            return
+        partials: Dict[int, DataFrame] = dict(zip(missing, QUERY_CATALOG.execute_batch(source, aggregate.query_name(), [{'data_set_id': data_set_id} for data_set_id in missing]))) if len(missing) > 0 else {}
+        with self.__engine.begin() as connection:
+            stored = self.__stored_fingerprints(connection, aggregate)
+            # partials of snapshots that were removed from the source (or that have changed) are discarded
+            for data_set_id, fingerprint in stored.items():
+                if fingerprints.get(data_set_id) != fingerprint:
+                    self.__delete_snapshot(connection, aggregate, data_set_id)
+            for data_set_id, fingerprint in fingerprints.items():
+                if stored.get(data_set_id) == fingerprint:
+                    continue
+                partial: Optional[DataFrame] = partials.get(data_set_id)
+                if partial is None:
+                    # another process has discarded the partial since it was read above
+                    partial = QUERY_CATALOG.execute(source, aggregate.query_name(), data_set_id=data_set_id)
+                # rows of the snapshot without bookkeeping are left over from an interrupted store, never merged twice
+                self.__delete_snapshot(connection, aggregate, data_set_id)
+                partial = partial[aggregate.keys() + aggregate.measures()].copy()
+                partial.insert(0, 'DataSetId', data_set_id)
+                partial.to_sql(self.__table(aggregate), connection, if_exists='append', index=False)
+                connection.execute(text('INSERT INTO Snapshots (Aggregate, DataSetId, Fingerprint) VALUES (:aggregate, :data_set_id, :fingerprint)'), {
+                    'aggregate': aggregate.name(),
+                    'data_set_id': data_set_id,
+                    'fingerprint': fingerprint
+                })
+
+    # creates the partial table if it does not exist yet, and returns the fingerprints of the stored partials
+    def __stored_fingerprints(self, connection: Connection, aggregate: SnapshotAggregate) -> Dict[int, str]:
+        query = text('SELECT COUNT(*) FROM sqlite_master WHERE type = \'table\' AND name = :name')
+        if connection.execute(query, {'name': self.__table(aggregate)}).scalar_one() == 0:
+            # without the partial table the bookkeeping is meaningless, start from scratch in that case
+            connection.execute(text('DELETE FROM Snapshots WHERE Aggregate = :aggregate'), {'aggregate': aggregate.name()})
+            self.__create_table(aggregate, connection)
+        rows = connection.execute(text('SELECT DataSetId, Fingerprint FROM Snapshots WHERE Aggregate = :aggregate'), {'aggregate': aggregate.name()})
+        return {int(row[0]): str(row[1]) for row in rows}
+
+    def __delete_snapshot(self, connection: Connection, aggregate: SnapshotAggregate, data_set_id: int) -> None:
+        connection.execute(text(f'DELETE FROM {self.__table(aggregate)} WHERE DataSetId = :data_set_id'), {'data_set_id': data_set_id})
+        connection.execute(text('DELETE FROM Snapshots WHERE Aggregate = :aggregate AND DataSetId = :data_set_id'), {'aggregate': aggregate.name(), 'data_set_id': data_set_id})
+
+    def __create_table(self, aggregate: SnapshotAggregate, connection: Connection) -> None:
+        # keys keep their type affinity from the values, measures are numeric sums or counts
+        columns: List[str] = ['DataSetId INTEGER NOT NULL'] + [key for key in aggregate.keys()] + [f'{measure} NUMERIC NOT NULL' for measure in aggregate.measures()]
+        connection.execute(text(f'CREATE TABLE IF NOT EXISTS {self.__table(aggregate)} ({", ".join(columns)})'))
+        # one partial row per snapshot and keys
+        connection.execute(text(f'CREATE UNIQUE INDEX IF NOT EXISTS UX_{self.__table(aggregate)} ON {self.__table(aggregate)} (DataSetId, {", ".join(aggregate.keys())})'))
@@ -0,0 +1,96 @@
+import sqlite3
+from typing import List, Optional, Tuple
+from analyzers.internals.derived_tables import DerivedTables
+
+# a derived full-text index (SQLite FTS5)
+class TextIndexTable:
+    name: str
+    content_table: str
+    columns: List[str]
+    # the fts5vocab table over the terms of the index (term, doc, cnt)
+    vocabulary: str
+
+    def __init__(self, name: str, content_table: str, columns: List[str]) -> None:
+        self.name = name
+        self.content_table = content_table
+        self.columns = columns
+        self.vocabulary = name + 'Terms'
+
+# full-text indexes over the names and descriptions of the episodes (EpisodeText) and shows (PodcastText), stored in
+# the side database of the rankings database (see DerivedTables). The indexes are contentless, so the text is not
+# duplicated: a MATCH returns the row ids of the episodes (podcasts) by an index lookup instead of scanning all
+# descriptions. Every index is built when it is first used, in batches of rows ordered by id, each batch is committed
+# together with the id it has been built up to, so an interrupted build resumes where it stopped and rows appended to
+# the database later on are added without rebuilding the index. A new database version is indexed from scratch
+class TextIndex:
+    EPISODES: TextIndexTable = TextIndexTable('EpisodeText', 'Episodes', ['Name', 'Description'])
+    PODCASTS: TextIndexTable = TextIndexTable('PodcastText', 'Podcasts', ['ShowName', 'ShowDescription'])
+    TABLES: List[TextIndexTable] = [EPISODES, PODCASTS]
+    __BATCH_SIZE: int = 100_000
+
+    # builds (or completes) the index for the given database version
+    @staticmethod
+    def ensure(db_path: str, version: str, table: TextIndexTable) -> None:
+        connection: sqlite3.Connection = DerivedTables.connect(db_path)
+        try:
+            TextIndex.__ensure(connection, table, version)
+        except sqlite3.OperationalError as e:
+            raise Exception(f'Failed to build the full-text index {table.name} of \'{db_path}\': {e}')
+        finally:
+            connection.close()
+
+    @staticmethod
+    def __ensure(connection: sqlite3.Connection, table: TextIndexTable, version: str) -> None:
+        last_id: int = connection.execute(f'SELECT COALESCE(MAX(Id), 0) FROM source.{table.content_table}').fetchone()[0]
+        if DerivedTables.version(connection, table.name) == version and (DerivedTables.position(connection, table.name) or 0) >= last_id:
+            return
+        print(f'Building the full-text index {table.name} of {table.content_table} (database version {version})...')
+        while True:
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                # other processes may have built the index (or parts of it) while we were waiting for the lock
+                position: Optional[int] = DerivedTables.position(connection, table.name) if DerivedTables.version(connection, table.name) == version else None
+                if position is None:
+                    TextIndex.__create(connection, table)
+                    position = 0
+                indexed, position = TextIndex.__index_batch(connection, table, position)
+                if indexed == 0:
+                    # merges the segments written by the batches, so that lookups search a single b-tree
+                    connection.execute(f'INSERT INTO main.{table.name} ({table.name}) VALUES (\'optimize\')')
+                DerivedTables.mark(connection, table.name, version, position)
+                connection.commit()
+            except BaseException:
+                connection.rollback()
+                raise
+            if indexed == 0:
+                return
+
+    @staticmethod
+    def __create(connection: sqlite3.Connection, table: TextIndexTable) -> None:
+        connection.execute(f'DROP TABLE IF EXISTS main.{table.vocabulary}')
+        connection.execute(f'DROP TABLE IF EXISTS main.{table.name}')
+        columns: str = ', '.join(table.columns)
+        # diacritics are removed, so that e.g. 'cafe' matches 'café'. The rowid of a row is the id of its episode (podcast)
+        connection.execute(f'CREATE VIRTUAL TABLE main.{table.name} USING fts5({columns}, content=\'\', tokenize=\'unicode61 remove_diacritics 2\')')
+        connection.execute(f'CREATE VIRTUAL TABLE main.{table.vocabulary} USING fts5vocab({table.name}, \'row\')')
+
+    # indexes the next batch of rows after the given id, returns the number of rows indexed and the new position
+    @staticmethod
+    def __index_batch(connection: sqlite3.Connection, table: TextIndexTable, position: int) -> Tuple[int, int]:
+        columns: str = ', '.join(table.columns)
+        bounds = connection.execute(f'SELECT COUNT(*), MAX(Id) FROM (SELECT Id FROM source.{table.content_table} WHERE Id > ? ORDER BY Id LIMIT ?)', (position, TextIndex.__BATCH_SIZE)).fetchone()
+        if bounds[0] == 0:
+            return 0, position
+        connection.execute(f'INSERT INTO main.{table.name} (rowid, {columns}) SELECT Id, {columns} FROM source.{table.content_table} WHERE Id > ? AND Id <= ?', (position, bounds[1]))
+        return int(bounds[0]), int(bounds[1])
+
+    # all tables belonging to the indexes (the FTS5 tables, their shadow tables and the vocabularies), e.g. to skip
+    # indexes that earlier versions built in the rankings database itself. They can not be copied like ordinary tables
+    @staticmethod
+    def is_index_table(name: str) -> bool:
+        return any(name == table.name or name.startswith(table.name + '_') or name == table.vocabulary for table in TextIndex.TABLES)
+
+    # quotes a term for a MATCH expression, so that it is matched literally (as a phrase of its tokens)
+    @staticmethod
+    def quote(term: str) -> str:
+        return '"' + term.replace('"', '""') + '"'
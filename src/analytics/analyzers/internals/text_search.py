@@ -0,0 +1,132 @@
+from typing import List, Sequence
+import numpy as np
+from pandas import DataFrame
+from analyzers.internals.query_backend import DatabaseCache, QueryBackend, SqliteQueryBackend
+from analyzers.internals.query_catalog import QUERY_CATALOG
+from analyzers.internals.text_index import TextIndex
+
+QUERY_CATALOG.register('text_search.podcasts', '''
+    SELECT Id AS PodcastId, Genre
+    FROM Podcasts
+    ORDER BY Id ASC
+''')
+
+QUERY_CATALOG.register('text_search.podcast_episodes', '''
+    SELECT PodcastId, COUNT(*) AS Episodes
+    FROM EpisodeDates
+    GROUP BY PodcastId
+''')
+
+# the matching rows are looked up in the full-text index only, the descriptions themselves are never read. Matches are
+# counted per podcast in SQLite (the podcast of a matching episode is looked up by its rowid), so that only one row per
+# podcast is returned, no matter how many episodes match
+QUERY_CATALOG.register('text_search.episode_matches', f'''
+    SELECT EpisodeDates.PodcastId AS PodcastId, COUNT(*) AS Episodes
+    FROM {TextIndex.EPISODES.name}
+    INNER JOIN EpisodeDates ON EpisodeDates.EpisodeId = {TextIndex.EPISODES.name}.rowid
+    WHERE {TextIndex.EPISODES.name} MATCH :match
+    GROUP BY EpisodeDates.PodcastId
+''', {'match': str}, example={'match': 'news'}, backends=['sqlite'])
+
+QUERY_CATALOG.register('text_search.podcast_matches', f'''
+    SELECT rowid AS PodcastId
+    FROM {TextIndex.PODCASTS.name}
+    WHERE {TextIndex.PODCASTS.name} MATCH :match
+''', {'match': str}, example={'match': 'news'}, backends=['sqlite'])
+
+# the terms of the episode names and descriptions by the number of episodes containing them
+QUERY_CATALOG.register('text_search.episode_terms', f'''
+    SELECT term AS Term, doc AS Episodes
+    FROM {TextIndex.EPISODES.vocabulary}
+    WHERE length(term) >= :min_length AND term NOT GLOB '*[0-9]*'
+    ORDER BY doc DESC, term ASC
+    LIMIT :limit
+''', {'min_length': int, 'limit': int}, example={'min_length': 3, 'limit': 100}, backends=['sqlite'])
+
+# frequent words that carry no topic (English, German, Spanish, French and Portuguese)
+STOPWORDS: List[str] = [
+    'the', 'and', 'for', 'with', 'you', 'your', 'this', 'that', 'from', 'are', 'was', 'our', 'about', 'what', 'how',
+    'who', 'all', 'new', 'more', 'out', 'his', 'her', 'they', 'but', 'not', 'have', 'has', 'will', 'can', 'get',
+    'one', 'its', 'their', 'into', 'just', 'when', 'why', 'also', 'than', 'then', 'there', 'here', 'been', 'were',
+    'episode', 'episodes', 'podcast', 'podcasts', 'show', 'listen', 'today', 'week',
+    'und', 'der', 'die', 'das', 'von', 'mit', 'ist', 'ein', 'eine', 'den', 'dem', 'auf', 'sich', 'nicht', 'wir',
+    'que', 'los', 'las', 'del', 'por', 'para', 'una', 'con', 'como', 'más',
+    'les', 'des', 'pour', 'dans', 'est', 'une', 'sur', 'qui', 'avec', 'pas',
+    'com', 'uma', 'não', 'nos', 'mais', 'sobre'
+]
+
+# full-text lookups (see TextIndex) aggregated per podcast. Matches are counted per podcast by the database, so a lookup
+# costs one index search and returns one row per matching podcast, no matter how long the descriptions are.
+# The index only exists in SQLite: on other backends, the lookups run on the SQLite database the backend reads from
+class TextSearch:
+    __searches: DatabaseCache['TextSearch'] = DatabaseCache()
+
+    __backend: QueryBackend
+    # sorted
+    __podcast_ids: np.ndarray
+    __podcast_genres: np.ndarray
+    __episodes: np.ndarray
+
+    def __init__(self, backend: QueryBackend, podcasts: DataFrame, podcast_episodes: DataFrame) -> None:
+        self.__backend = backend
+        self.__podcast_ids = podcasts['PodcastId'].to_numpy(dtype=np.int64)
+        self.__podcast_genres = podcasts['Genre'].to_numpy()
+        self.__episodes = self.__counts(podcast_episodes)
+
+    # returns the (shared) search of the database the backend reads from (see DatabaseCache)
+    @staticmethod
+    def for_backend(backend: QueryBackend) -> 'TextSearch':
+        def build() -> TextSearch:
+            text_backend: QueryBackend = backend if QUERY_CATALOG.get('text_search.episode_matches').supports(backend.name()) else SqliteQueryBackend('sqlite:///' + backend.db_path())
+            return TextSearch(text_backend, QUERY_CATALOG.execute(backend, 'text_search.podcasts'), QUERY_CATALOG.execute(backend, 'text_search.podcast_episodes'))
+
+        return TextSearch.__searches.get(backend, build)
+
+    # the positions of the ids in the sorted ids, -1 for ids that are not contained (or missing, NaN)
+    @staticmethod
+    def __positions(sorted_ids: np.ndarray, ids: np.ndarray) -> np.ndarray:
+        positions: np.ndarray = np.full(len(ids), -1, dtype=np.int64)
+        if len(sorted_ids) == 0:
+            return positions
+        present: np.ndarray = ~np.isnan(ids)
+        candidates: np.ndarray = np.minimum(np.searchsorted(sorted_ids, ids[present].astype(np.int64)), len(sorted_ids) - 1)
+        found: np.ndarray = sorted_ids[candidates] == ids[present]
+        positions[np.flatnonzero(present)[found]] = candidates[found]
+        return positions
+
+    def podcast_ids(self) -> np.ndarray:
+        return self.__podcast_ids.copy()
+
+    def podcast_genres(self) -> np.ndarray:
+        return self.__podcast_genres.copy()
+
+    # the number of episodes of every podcast
+    def episodes(self) -> np.ndarray:
+        return self.__episodes.copy()
+
+    # returns a queries x podcasts matrix of the number of episodes of every podcast whose name or description
+    # matches the query (an FTS5 query expression, see TextIndex.quote for literal terms)
+    def episode_matches(self, queries: Sequence[str]) -> np.ndarray:
+        results: List[DataFrame] = QUERY_CATALOG.execute_batch(self.__backend, 'text_search.episode_matches', [{'match': query} for query in queries])
+        return np.array([self.__counts(result) for result in results], dtype=np.int64).reshape(len(queries), len(self.__podcast_ids))
+
+    # the episode counts (PodcastId, Episodes) by position of the podcast, episodes without a podcast are left out
+    def __counts(self, podcast_episodes: DataFrame) -> np.ndarray:
+        counts: np.ndarray = np.zeros(len(self.__podcast_ids), dtype=np.int64)
+        positions: np.ndarray = self.__positions(self.__podcast_ids, podcast_episodes['PodcastId'].to_numpy(dtype=np.float64))
+        counts[positions[positions >= 0]] = podcast_episodes['Episodes'].to_numpy(dtype=np.int64)[positions >= 0]
+        return counts
+
+    # returns a queries x podcasts mask of the podcasts whose show name or description matches the query
+    def podcast_matches(self, queries: Sequence[str]) -> np.ndarray:
+        results: List[DataFrame] = QUERY_CATALOG.execute_batch(self.__backend, 'text_search.podcast_matches', [{'match': query} for query in queries])
+        matches: np.ndarray = np.zeros((len(queries), len(self.__podcast_ids)), dtype=bool)
+        for row, result in enumerate(results):
+            positions: np.ndarray = self.__positions(self.__podcast_ids, result['PodcastId'].to_numpy(dtype=np.float64))
+            matches[row, positions[positions >= 0]] = True
+        return matches
+
+    # the most frequent terms of the episode names and descriptions (by the number of episodes), without stopwords
+    def top_terms(self, count: int, min_length: int = 3) -> DataFrame:
+        terms: DataFrame = QUERY_CATALOG.execute(self.__backend, 'text_search.episode_terms', min_length=min_length, limit=count + len(STOPWORDS))
+        return terms[~terms['Term'].isin(STOPWORDS)].head(count).reset_index(drop=True)
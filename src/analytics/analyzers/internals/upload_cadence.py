@@ -0,0 +1,132 @@
+from typing import List
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+from analyzers.internals.episode_columns import EpisodeColumns
+from analyzers.internals.membership_index import MembershipIndex
+from analyzers.internals.query_backend import DatabaseCache, QueryBackend
+from analyzers.internals.query_catalog import QUERY_CATALOG
+
+QUERY_CATALOG.register('upload_cadence.podcasts', '''
+    SELECT Id AS PodcastId, Genre
+    FROM Podcasts
+    ORDER BY Id ASC
+''')
+
+# the upload cadence of every podcast, from the days between its consecutive episodes (gaps):
+#   Uploads         the episodes released on a known day (release dates of month or year precision are left out)
+#   MedianGapDays   the median gap
+#   MeanGapDays     the mean gap
+#   GapCV           the coefficient of variation of the gaps (standard deviation / mean), 0 for perfectly regular
+#                   uploads, NaN if all episodes have been released on the same day
+#   LongestGapDays  the longest gap
+#   Hiatuses        the number of gaps of at least HIATUS_DAYS
+# Only podcasts with at least MIN_UPLOADS uploads are included. Built in one vectorized pass over the episode columns
+# (see EpisodeColumns): the episodes are sorted by podcast and day once, and all statistics are sums, maxima and
+# order statistics over the contiguous runs of gaps of every podcast
+class UploadCadence:
+    MEASURES: List[str] = ['MedianGapDays', 'MeanGapDays', 'GapCV', 'LongestGapDays', 'Hiatuses']
+    DIMENSIONS: List[str] = ['Genre', 'Country']
+    HIATUS_DAYS: int = 90
+    MIN_UPLOADS: int = 3
+
+    __cadences: DatabaseCache['UploadCadence'] = DatabaseCache()
+
+    # one row per podcast, sorted by PodcastId
+    __podcasts: DataFrame
+    __countries: MembershipIndex
+
+    def __init__(self, podcasts: DataFrame, countries: MembershipIndex) -> None:
+        self.__podcasts = podcasts
+        self.__countries = countries
+
+    # returns the (shared) cadences of the database the backend reads from (see DatabaseCache)
+    @staticmethod
+    def for_backend(backend: QueryBackend) -> 'UploadCadence':
+        def build() -> UploadCadence:
+            podcasts: DataFrame = UploadCadence.from_episodes(EpisodeColumns.for_backend(backend))
+            genres: DataFrame = QUERY_CATALOG.execute(backend, 'upload_cadence.podcasts')
+            podcasts.insert(1, 'Genre', podcasts['PodcastId'].map(genres.set_index('PodcastId')['Genre']).fillna('Unknown').to_numpy())
+            return UploadCadence(podcasts, MembershipIndex.for_backend(backend))
+
+        return UploadCadence.__cadences.get(backend, build)
+
+    # computes the cadence of every podcast (PodcastId, Uploads and the MEASURES) from the episode columns
+    @staticmethod
+    def from_episodes(episodes: EpisodeColumns) -> DataFrame:
+        epoch_days: np.ndarray = episodes.column('episodes.EpochDay')
+        known: np.ndarray = (episodes.column('episodes.Precision') == EpisodeColumns.PRECISIONS.index('day')) & (epoch_days != EpisodeColumns.MISSING)
+        podcast_ids: np.ndarray = episodes.column('episodes.PodcastId')[known]
+        days: np.ndarray = epoch_days[known].astype(np.int64)
+        # the one sort: by podcast, then by day
+        order: np.ndarray = np.lexsort((days, podcast_ids))
+        podcast_ids, days = podcast_ids[order], days[order]
+        # the runs of episodes of every podcast
+        first: np.ndarray = np.ones(len(podcast_ids), dtype=bool)
+        first[1:] = podcast_ids[1:] != podcast_ids[:-1]
+        starts: np.ndarray = np.flatnonzero(first)
+        uploads: np.ndarray = np.diff(np.append(starts, len(podcast_ids)))
+        codes: np.ndarray = np.cumsum(first) - 1
+        # the gaps between consecutive episodes of the same podcast, still grouped by podcast
+        same: np.ndarray = ~first[1:]
+        gaps: np.ndarray = np.diff(days)[same]
+        gap_codes: np.ndarray = codes[1:][same]
+        gap_counts: np.ndarray = np.bincount(gap_codes, minlength=len(starts))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means: np.ndarray = np.bincount(gap_codes, weights=gaps, minlength=len(starts)) / gap_counts
+            deviations: np.ndarray = np.bincount(gap_codes, weights=(gaps - means[gap_codes]) ** 2, minlength=len(starts)) / gap_counts
+            cvs: np.ndarray = np.sqrt(deviations) / means
+        # the runs of gaps of every podcast (with gaps) start at the cumulated gap counts
+        gap_starts: np.ndarray = np.concatenate([[0], np.cumsum(gap_counts)[:-1]])
+        with_gaps: np.ndarray = gap_counts > 0
+        longest: np.ndarray = np.full(len(starts), np.nan)
+        medians: np.ndarray = np.full(len(starts), np.nan)
+        if len(gaps) > 0:
+            longest[with_gaps] = np.maximum.reduceat(gaps, gap_starts[with_gaps])
+            # the gaps sorted within every podcast, the median is the middle of the run
+            sorted_gaps: np.ndarray = gaps[np.lexsort((gaps, gap_codes))]
+            counts: np.ndarray = gap_counts[with_gaps]
+            offsets: np.ndarray = gap_starts[with_gaps]
+            medians[with_gaps] = (sorted_gaps[offsets + (counts - 1) // 2] + sorted_gaps[offsets + counts // 2]) / 2
+        hiatuses: np.ndarray = np.bincount(gap_codes, weights=gaps >= UploadCadence.HIATUS_DAYS, minlength=len(starts))
+        data = DataFrame({
+            'PodcastId': podcast_ids[starts],
+            'Uploads': uploads,
+            'MedianGapDays': medians,
+            'MeanGapDays': means,
+            'GapCV': cvs,
+            'LongestGapDays': longest,
+            'Hiatuses': hiatuses.astype(np.int64)
+        })
+        return data[data['Uploads'] >= UploadCadence.MIN_UPLOADS].reset_index(drop=True)
+
+    def podcasts(self) -> DataFrame:
+        return self.__podcasts.copy()
+
+    # returns the podcasts (PodcastId, the measures) with their genre, or once for every country of the overall
+    # rankings they have been ranked in (see MembershipIndex)
+    def by(self, dimension: str) -> DataFrame:
+        if dimension not in UploadCadence.DIMENSIONS:
+            raise Exception(f'Unknown cadence dimension \'{dimension}\', expected one of {", ".join(UploadCadence.DIMENSIONS)}')
+        if dimension == 'Genre':
+            return self.__podcasts[['PodcastId', 'Genre', 'Uploads'] + UploadCadence.MEASURES]
+        labels, members = self.__countries.lookup(self.__podcasts['PodcastId'].to_numpy(), by='Country', genre='All')
+        rows, columns = np.nonzero(members)
+        data: DataFrame = self.__podcasts.iloc[rows][['PodcastId', 'Uploads'] + UploadCadence.MEASURES].reset_index(drop=True)
+        data.insert(1, 'Country', labels[columns])
+        return data
+
+    # returns the distribution of the measure over the podcasts of every value of the dimension: the number of
+    # podcasts (Count), mean, minimum, quantiles and maximum of the measure, and the share (in %) of the podcasts
+    # with at least one hiatus (HiatusShare)
+    def summary(self, measure: str, dimension: str) -> DataFrame:
+        if measure not in UploadCadence.MEASURES:
+            raise Exception(f'Unknown cadence measure \'{measure}\', expected one of {", ".join(UploadCadence.MEASURES)}')
+        data: DataFrame = self.by(dimension)
+        data = data[data[measure].notna()]
+        groups = data.groupby(dimension)[measure]
+        quantiles: DataFrame = groups.quantile([0.05, 0.25, 0.5, 0.75, 0.95]).unstack()
+        quantiles.columns = ['P05', 'Q1', 'Median', 'Q3', 'P95']
+        summary: DataFrame = pd.concat([groups.size().rename('Count'), groups.mean().rename('Mean'), groups.min().rename('Min'), quantiles, groups.max().rename('Max')], axis=1)
+        summary['HiatusShare'] = (data['Hiatuses'] > 0).groupby(data[dimension]).mean() * 100
+        return summary.reset_index()[[dimension, 'Count', 'Mean', 'Min', 'P05', 'Q1', 'Median', 'Q3', 'P95', 'Max', 'HiatusShare']]
@@ -0,0 +1,172 @@
+from typing import Dict, List, Tuple
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+from analyzers.internals.query_backend import DatabaseCache, QueryBackend
+from analyzers.internals.query_catalog import QUERY_CATALOG
+
+# the podcasts of every country, by the overall rankings they have been ranked in
+_PODCAST_COUNTRIES = '''
+    SELECT DISTINCT RankedPodcasts.PodcastId, Rankings.Country
+    FROM RankedPodcasts
+    INNER JOIN Rankings ON Rankings.Id = RankedPodcasts.RankingId
+    WHERE Rankings.Genre = 'All'
+'''
+
+# the uploads per day (EpochDay) of every genre and every country, in one grouped aggregation
+QUERY_CATALOG.register('upload_decomposition.daily_uploads', f'''
+    SELECT 'Genre' AS Dimension, Podcasts.Genre AS GroupName, EpisodeDates.EpochDay AS Day, COUNT(*) AS Uploads
+    FROM EpisodeDates
+    INNER JOIN Podcasts ON Podcasts.Id = EpisodeDates.PodcastId
+    WHERE EpisodeDates.ReleaseDatePrecision = 'day'
+        AND EpisodeDates.EpochDay IS NOT NULL
+        AND EpisodeDates.Year BETWEEN :year_lower_bound AND :year_upper_bound
+    GROUP BY Podcasts.Genre, EpisodeDates.EpochDay
+    UNION ALL
+    SELECT 'Country' AS Dimension, PodcastCountries.Country AS GroupName, EpisodeDates.EpochDay AS Day, COUNT(*) AS Uploads
+    FROM EpisodeDates
+    INNER JOIN ({_PODCAST_COUNTRIES}) AS PodcastCountries ON PodcastCountries.PodcastId = EpisodeDates.PodcastId
+    WHERE EpisodeDates.ReleaseDatePrecision = 'day'
+        AND EpisodeDates.EpochDay IS NOT NULL
+        AND EpisodeDates.Year BETWEEN :year_lower_bound AND :year_upper_bound
+    GROUP BY PodcastCountries.Country, EpisodeDates.EpochDay
+''', {'year_lower_bound': int, 'year_upper_bound': int}, example={'year_lower_bound': 2013, 'year_upper_bound': 2023})
+
+# the first release (EpochDay) of every podcast, with the genre and the countries of the podcast
+QUERY_CATALOG.register('upload_decomposition.first_releases', f'''
+    WITH FirstReleases AS (
+        SELECT PodcastId, MIN(EpochDay) AS FirstRelease
+        FROM EpisodeDates
+        WHERE PodcastId IS NOT NULL
+        GROUP BY PodcastId
+    )
+    SELECT 'Genre' AS Dimension, Podcasts.Genre AS GroupName, FirstReleases.FirstRelease
+    FROM FirstReleases
+    INNER JOIN Podcasts ON Podcasts.Id = FirstReleases.PodcastId
+    UNION ALL
+    SELECT 'Country' AS Dimension, PodcastCountries.Country AS GroupName, FirstReleases.FirstRelease
+    FROM FirstReleases
+    INNER JOIN ({_PODCAST_COUNTRIES}) AS PodcastCountries ON PodcastCountries.PodcastId = FirstReleases.PodcastId
+''')
+
+# seasonal decompositions of the monthly relative upload frequency of every genre and every country.
+# The relative uploads of a day are the uploads of the group divided by the number of podcasts of the group
+# that have released at least one episode up to and including that day; months are averaged over their days
+# with uploads (as in UploadFrequencyModel), months without uploads are 0.
+# All series are stacked into one matrix (series x months) and decomposed at once (see decompose)
+class UploadDecomposition:
+    __GROUP_STRIDE: int = 100_000_000
+    __decompositions: DatabaseCache['UploadDecomposition'] = DatabaseCache()
+
+    # Dimension and Group of every series (row)
+    __keys: DataFrame
+    __months: pd.DatetimeIndex
+    __observed: np.ndarray
+    __trend: np.ndarray
+    __seasonal: np.ndarray
+    __residual: np.ndarray
+    __trend_slopes: np.ndarray
+    __trend_intercepts: np.ndarray
+
+    def __init__(self, keys: DataFrame, months: pd.DatetimeIndex, observed: np.ndarray, period: int = 12) -> None:
+        self.__keys = keys.reset_index(drop=True)
+        self.__months = months
+        self.__observed = observed
+        self.__trend, self.__seasonal, self.__residual = UploadDecomposition.decompose(observed, period)
+        self.__trend_slopes, self.__trend_intercepts = UploadDecomposition.__regress(self.__trend)
+
+    # returns the (shared) decompositions of the database the backend reads from, per range of years (see DatabaseCache)
+    @staticmethod
+    def for_backend(backend: QueryBackend, year_lower_bound: int = 2013, year_upper_bound: int = 2023) -> 'UploadDecomposition':
+        return UploadDecomposition.__decompositions.get(backend, lambda: UploadDecomposition.build(backend, year_lower_bound, year_upper_bound), (year_lower_bound, year_upper_bound))
+
+    @staticmethod
+    def build(backend: QueryBackend, year_lower_bound: int = 2013, year_upper_bound: int = 2023) -> 'UploadDecomposition':
+        uploads: DataFrame = QUERY_CATALOG.execute(backend, 'upload_decomposition.daily_uploads', year_lower_bound=year_lower_bound, year_upper_bound=year_upper_bound)
+        first_releases: DataFrame = QUERY_CATALOG.execute(backend, 'upload_decomposition.first_releases')
+        first_releases = first_releases.dropna(subset=['FirstRelease'])
+
+        # the number of podcasts of the group released up to and including the day: one binary search over the
+        # first releases of all groups, ordered by group and then by day
+        groups: DataFrame = uploads[['Dimension', 'GroupName']].drop_duplicates().sort_values(by=['Dimension', 'GroupName']).reset_index(drop=True)
+        codes: Dict[Tuple[str, str], int] = {(dimension, group): code for code, (dimension, group) in enumerate(zip(groups['Dimension'], groups['GroupName']))}
+        release_codes: np.ndarray = np.array([codes.get(key, -1) for key in zip(first_releases['Dimension'], first_releases['GroupName'])], dtype=np.int64)
+        release_keys: np.ndarray = np.sort(UploadDecomposition.__group_day_key(release_codes, first_releases['FirstRelease'].to_numpy(dtype=np.int64)))
+        upload_codes: np.ndarray = np.array([codes[key] for key in zip(uploads['Dimension'], uploads['GroupName'])], dtype=np.int64)
+        released: np.ndarray = np.searchsorted(release_keys, UploadDecomposition.__group_day_key(upload_codes, uploads['Day'].to_numpy(dtype=np.int64)), side='right')
+        group_start: np.ndarray = np.searchsorted(release_keys, upload_codes * UploadDecomposition.__GROUP_STRIDE, side='left')
+        uploads['RelativeUploads'] = uploads['Uploads'] / (released - group_start)
+
+        # one row per group, one column per month from the lower bound to the last month with uploads
+        uploads['Month'] = pd.to_datetime(uploads['Day'], unit='D').dt.to_period('M').dt.to_timestamp()
+        monthly: DataFrame = uploads.groupby(['Dimension', 'GroupName', 'Month'])['RelativeUploads'].mean().unstack('Month')
+        months: pd.DatetimeIndex = pd.date_range(pd.Timestamp(year=year_lower_bound, month=1, day=1), uploads['Month'].max(), freq='MS')
+        monthly = monthly.reindex(index=pd.MultiIndex.from_frame(groups), columns=months, fill_value=0.0).fillna(0.0)
+        return UploadDecomposition(groups.rename(columns={'GroupName': 'Group'}), months, monthly.to_numpy(dtype=np.float64))
+
+    # a key that orders by group first and by day (since the epoch) second (days are offset to be positive)
+    @staticmethod
+    def __group_day_key(codes: np.ndarray, days: np.ndarray) -> np.ndarray:
+        return codes * UploadDecomposition.__GROUP_STRIDE + days + UploadDecomposition.__GROUP_STRIDE // 2
+
+    # the additive seasonal decomposition of every row of the matrix, equal to statsmodels' seasonal_decompose
+    # (two-sided moving average trend, seasonal component from the centered period averages of the detrended series).
+    # Returns the trend, seasonal and residual matrices; the trend is undefined (NaN) for the first and last half period
+    @staticmethod
+    def decompose(observed: np.ndarray, period: int = 12) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        series, length = observed.shape
+        if length < 2 * period:
+            raise Exception(f'Seasonal decomposition needs at least {2 * period} observations per series, got {length}')
+        # the centered moving average: period + 1 weights with half weights at both ends for even periods
+        if period % 2 == 0:
+            weights: np.ndarray = np.array([0.5] + [1.0] * (period - 1) + [0.5]) / period
+        else:
+            weights = np.full(period, 1.0 / period)
+        half: int = len(weights) // 2
+        windows: np.ndarray = np.lib.stride_tricks.sliding_window_view(observed, len(weights), axis=1)
+        trend: np.ndarray = np.full((series, length), np.nan)
+        trend[:, half:length - half] = windows @ weights
+        detrended: np.ndarray = observed - trend
+        # the average of every position within the period, centered around zero
+        padded: np.ndarray = np.full((series, -(-length // period) * period), np.nan)
+        padded[:, :length] = detrended
+        period_averages: np.ndarray = np.nanmean(padded.reshape(series, -1, period), axis=1)
+        period_averages -= period_averages.mean(axis=1, keepdims=True)
+        seasonal: np.ndarray = np.tile(period_averages, (1, -(-length // period)))[:, :length]
+        return trend, seasonal, observed - trend - seasonal
+
+    # the least squares line through the defined part of every trend (slope per month, intercept at the first month)
+    @staticmethod
+    def __regress(trend: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        defined: np.ndarray = ~np.isnan(trend)
+        x: np.ndarray = np.where(defined, np.arange(trend.shape[1])[np.newaxis, :], np.nan)
+        x_mean: np.ndarray = np.nanmean(x, axis=1, keepdims=True)
+        y_mean: np.ndarray = np.nanmean(trend, axis=1, keepdims=True)
+        slopes: np.ndarray = np.nansum((x - x_mean) * (trend - y_mean), axis=1) / np.nansum((x - x_mean) ** 2, axis=1)
+        return slopes, y_mean[:, 0] - slopes * x_mean[:, 0]
+
+    def dimensions(self) -> List[str]:
+        return sorted(self.__keys['Dimension'].unique())
+
+    # the decomposition of every series of the dimension, in long form:
+    # Group, Month, RelativeUploads (observed), Trend, Seasonal and Residual
+    def components(self, dimension: str) -> DataFrame:
+        rows: np.ndarray = np.flatnonzero(self.__keys['Dimension'].to_numpy() == dimension)
+        months: int = len(self.__months)
+        return DataFrame({
+            'Group': np.repeat(self.__keys['Group'].to_numpy()[rows], months),
+            'Month': np.tile(self.__months.to_numpy(), len(rows)),
+            'RelativeUploads': self.__observed[rows].ravel(),
+            'Trend': self.__trend[rows].ravel(),
+            'Seasonal': self.__seasonal[rows].ravel(),
+            'Residual': self.__residual[rows].ravel()
+        })
+
+    # the linear regression of the trend of every series of the dimension: Group, TrendSlope (per month) and TrendIntercept
+    def trend_regressions(self, dimension: str) -> DataFrame:
+        rows: np.ndarray = np.flatnonzero(self.__keys['Dimension'].to_numpy() == dimension)
+        return DataFrame({
+            'Group': self.__keys['Group'].to_numpy()[rows],
+            'TrendSlope': self.__trend_slopes[rows],
+            'TrendIntercept': self.__trend_intercepts[rows]
+        })
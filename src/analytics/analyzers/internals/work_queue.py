@@ -0,0 +1,249 @@
+import functools
+import os
+import socket
+import sqlite3
+import time
+import uuid
+from contextlib import closing
+from typing import Callable, Dict, List, Optional, Tuple
+from analyzers.internals.analyzer_result import AnalyzerResult
+from analyzers.internals.model_store import ModelStore
+from analyzers.internals.query_backend import QueryBackend, create_query_backend, read_db_version
+from analyzers.internals.release_trends import ReleaseTrends
+from analyzers.internals.result_sink import CapabilityMemoryReport, ResultSink
+
+# a capability to compute on a version of the rankings database, rendered in a style
+class QueueTask:
+    id: int
+    capability: str
+    # the path of the database on the storage shared by all nodes
+    db_path: str
+    db_version: str
+    theme: str
+    palette: str
+    attempts: int
+    # the worker the task is leased to
+    worker: str
+
+    def __init__(self, id: int, capability: str, db_path: str, db_version: str, theme: str, palette: str, attempts: int, worker: str) -> None:
+        self.id = id
+        self.capability = capability
+        self.db_path = db_path
+        self.db_version = db_version
+        self.theme = theme
+        self.palette = palette
+        self.attempts = attempts
+        self.worker = worker
+
+# a queue of capability tasks in a directory on storage shared by the coordinator and all workers:
+#   <directory>/queue.db                                          the tasks (SQLite)
+#   <directory>/results/<version>/<capability>.npz                 the frames (see ReleaseTrends.store)
+#   <directory>/results/<version>/<theme>-<palette>/podcast_<capability>.png   the figures
+# Tasks are unique by capability, database version and style, so publishing them again is a no-op. Workers lease a
+# task for a limited time: a task whose worker died (or whose lease expired) is handed out again, up to max_attempts
+# times. Results are written by name and atomically, so a task computed twice writes the same files
+class WorkQueue:
+    TABLE: str = 'QueueTasks'
+    __directory: str
+    __lease_seconds: float
+    __max_attempts: int
+
+    def __init__(self, directory: str, lease_seconds: float = 1800.0, max_attempts: int = 3) -> None:
+        self.__directory = os.path.abspath(directory)
+        self.__lease_seconds = lease_seconds
+        self.__max_attempts = max_attempts
+        os.makedirs(self.results_dir(), exist_ok=True)
+        with closing(self.__connect()) as connection:
+            connection.execute(f'''
+                CREATE TABLE IF NOT EXISTS {WorkQueue.TABLE} (
+                    Id INTEGER NOT NULL PRIMARY KEY,
+                    Capability TEXT NOT NULL,
+                    DbPath TEXT NOT NULL,
+                    DbVersion TEXT NOT NULL,
+                    Theme TEXT NOT NULL,
+                    Palette TEXT NOT NULL,
+                    State TEXT NOT NULL DEFAULT 'pending',
+                    Attempts INTEGER NOT NULL DEFAULT 0,
+                    Worker TEXT,
+                    LeaseUntil REAL,
+                    Error TEXT,
+                    UNIQUE (Capability, DbVersion, Theme, Palette)
+                )''')
+
+    def __connect(self) -> sqlite3.Connection:
+        # workers wait for each other's (short) transactions instead of failing
+        return sqlite3.connect(os.path.join(self.__directory, 'queue.db'), timeout=600, isolation_level=None)
+
+    def results_dir(self) -> str:
+        return os.path.join(self.__directory, 'results')
+
+    # the file the figure of a capability is rendered to
+    def figure_path(self, task: QueueTask, name: str) -> str:
+        store_dir: str = os.path.dirname(ReleaseTrends.store(self.results_dir(), task.db_version).path(task.capability))
+        return os.path.join(store_dir, f'{task.theme}-{task.palette}', 'podcast_' + name + '.png')
+
+    # publishes the capabilities of a database, returns the number of tasks that have not been published before.
+    # Failed tasks are published again (with all their attempts), done and running tasks are left as they are
+    def publish(self, capability_names: List[str], db_path: str, db_version: str, theme: str, palette: str) -> int:
+        keys: List[Tuple[str, str, str, str]] = [(name, db_version, theme, palette) for name in capability_names]
+        with closing(self.__connect()) as connection:
+            connection.execute('BEGIN IMMEDIATE')
+            before: int = connection.total_changes
+            connection.executemany(f'INSERT OR IGNORE INTO {WorkQueue.TABLE} (Capability, DbPath, DbVersion, Theme, Palette) VALUES (?, ?, ?, ?, ?)', [(name, os.path.abspath(db_path), version, theme, palette) for name, version, theme, palette in keys])
+            published: int = connection.total_changes - before
+            connection.executemany(f'UPDATE {WorkQueue.TABLE} SET State = \'pending\', Attempts = 0, Error = NULL WHERE State = \'failed\' AND Capability = ? AND DbVersion = ? AND Theme = ? AND Palette = ?', keys)
+            connection.execute('COMMIT')
+            return published
+
+    # leases the next pending task (or a task whose lease expired) to the worker, None if there is none
+    def claim(self, worker: str) -> Optional[QueueTask]:
+        with closing(self.__connect()) as connection:
+            now: float = time.time()
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                row = connection.execute(f'''
+                    SELECT Id, Capability, DbPath, DbVersion, Theme, Palette, Attempts
+                    FROM {WorkQueue.TABLE}
+                    WHERE State = 'pending' OR (State = 'running' AND LeaseUntil < ?)
+                    ORDER BY Attempts ASC, Id ASC
+                    LIMIT 1''', (now,)).fetchone()
+                if row is None:
+                    connection.execute('COMMIT')
+                    return None
+                task = QueueTask(*row[:6], attempts=row[6] + 1, worker=worker)
+                if task.attempts > self.__max_attempts:
+                    # the workers of all attempts died while computing it
+                    connection.execute(f'UPDATE {WorkQueue.TABLE} SET State = \'failed\', Error = ? WHERE Id = ?', (f'lease expired {task.attempts - 1} times', task.id))
+                    connection.execute('COMMIT')
+                    return self.claim(worker)
+                connection.execute(f'UPDATE {WorkQueue.TABLE} SET State = \'running\', Attempts = ?, Worker = ?, LeaseUntil = ? WHERE Id = ?', (task.attempts, worker, now + self.__lease_seconds, task.id))
+                connection.execute('COMMIT')
+                return task
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+
+    # marks the task as done, if the worker still holds its lease. Returns False if the lease has expired (the task is
+    # handed out again, or already has been, and is completed by the worker holding it then)
+    def complete(self, task: QueueTask) -> bool:
+        with closing(self.__connect()) as connection:
+            cursor: sqlite3.Cursor = connection.execute(f'UPDATE {WorkQueue.TABLE} SET State = \'done\', LeaseUntil = NULL, Error = NULL WHERE Id = ? AND State = \'running\' AND Worker = ? AND LeaseUntil > ?', (task.id, task.worker, time.time()))
+            return cursor.rowcount == 1
+
+    # returns the task to the queue, or fails it for good once it has used up its attempts (unless the lease expired
+    # and the task has been handed out to another worker in the meantime)
+    def fail(self, task: QueueTask, error: str) -> None:
+        state: str = 'failed' if task.attempts >= self.__max_attempts else 'pending'
+        with closing(self.__connect()) as connection:
+            connection.execute(f'UPDATE {WorkQueue.TABLE} SET State = ?, LeaseUntil = NULL, Error = ? WHERE Id = ? AND State = \'running\' AND Worker = ?', (state, error, task.id, task.worker))
+
+    # the number of tasks by state
+    def counts(self) -> Dict[str, int]:
+        with closing(self.__connect()) as connection:
+            return {state: count for state, count in connection.execute(f'SELECT State, COUNT(*) FROM {WorkQueue.TABLE} GROUP BY State')}
+
+    # the failed tasks (capability, database version, error)
+    def failures(self) -> List[Tuple[str, str, str]]:
+        with closing(self.__connect()) as connection:
+            return [tuple(row) for row in connection.execute(f'SELECT Capability, DbVersion, Error FROM {WorkQueue.TABLE} WHERE State = \'failed\' ORDER BY Id')]
+
+    # blocks until no task is pending or running, returns the final counts
+    def wait(self, poll_seconds: float = 5.0) -> Dict[str, int]:
+        while True:
+            counts: Dict[str, int] = self.counts()
+            if counts.get('pending', 0) + counts.get('running', 0) == 0:
+                return counts
+            time.sleep(poll_seconds)
+
+# a stateless worker: pulls tasks from the queue, computes them on the database given by the task and writes the
+# results to the queue's shared storage. Only the analyzers of the last database are kept
+class QueueWorker:
+    __queue: WorkQueue
+    __analyzer_types: List[type]
+    __backend_name: str
+    __name: str
+    __analyzers: Optional[Tuple[Tuple[str, str, str, str], Dict[str, Callable[[], AnalyzerResult]]]] = None
+
+    def __init__(self, queue: WorkQueue, analyzer_types: List[type], backend_name: str = 'sqlite', name: Optional[str] = None) -> None:
+        self.__queue = queue
+        self.__analyzer_types = analyzer_types
+        self.__backend_name = backend_name
+        self.__name = name if name is not None else f'{socket.gethostname()}:{os.getpid()}'
+
+    # with wait, the worker polls for new tasks when the queue is empty instead of returning.
+    # Returns the number of tasks the worker has completed
+    def run(self, wait: bool = False, poll_seconds: float = 5.0) -> int:
+        completed: int = 0
+        while True:
+            task: Optional[QueueTask] = self.__queue.claim(self.__name)
+            if task is None:
+                if not wait:
+                    return completed
+                time.sleep(poll_seconds)
+                continue
+            print(f'[{self.__name}] Computing {task.capability} of database version {task.db_version} (attempt {task.attempts})...')
+            try:
+                self.__execute(task)
+            except Exception as e:
+                print(f'[{self.__name}] {task.capability} of database version {task.db_version} failed: {e}')
+                self.__queue.fail(task, str(e))
+                continue
+            if not self.__queue.complete(task):
+                print(f'[{self.__name}] The lease of {task.capability} of database version {task.db_version} has expired, it is left to the next worker')
+                continue
+            completed += 1
+
+    def __capabilities(self, task: QueueTask) -> Dict[str, Callable[[], AnalyzerResult]]:
+        key: Tuple[str, str, str, str] = (task.db_path, task.db_version, task.theme, task.palette)
+        if self.__analyzers is None or self.__analyzers[0] != key:
+            # the database may have been replaced by another version since the task has been published
+            if read_db_version(task.db_path) != task.db_version:
+                raise Exception(f'\'{task.db_path}\' is not database version {task.db_version} (found {read_db_version(task.db_path)})')
+            self.__analyzers = None
+            connection_string: str = 'sqlite:///' + task.db_path
+            backend: QueryBackend = create_query_backend(self.__backend_name, connection_string)
+            capabilities: Dict[str, Callable[[], AnalyzerResult]] = {}
+            for analyzer_type in self.__analyzer_types:
+                for capability in analyzer_type(connection_string, task.theme, task.palette, backend).capabilities():
+                    capabilities[capability.__name__] = capability
+            self.__analyzers = (key, capabilities)
+        return self.__analyzers[1]
+
+    def __execute(self, task: QueueTask) -> None:
+        capabilities: Dict[str, Callable[[], AnalyzerResult]] = self.__capabilities(task)
+        if task.capability not in capabilities:
+            raise Exception(f'Unknown capability \'{task.capability}\'')
+        store: ModelStore = ReleaseTrends.store(self.__queue.results_dir(), task.db_version)
+        capability: Callable[[], AnalyzerResult] = capabilities[task.capability]
+
+        # the frame is stored along the way, the figures are written by the sink
+        def compute() -> AnalyzerResult:
+            result: AnalyzerResult = capability()
+            store.save(task.capability, task.db_version, ModelStore.frame_to_state(result.get_data_frame(), 'data'))
+            return result
+
+        # the figures are rendered to temporary files first, and only moved into place once all of them have been
+        # rendered, so that readers of the shared storage (and workers computing the task concurrently after a lease
+        # expired) never see a partially written figure
+        temporary_paths: Dict[str, str] = {}
+
+        def temporary_path(name: str) -> str:
+            target_path: str = self.__queue.figure_path(task, name)
+            # matplotlib picks the image format from the extension
+            temporary_paths[target_path] = f'{os.path.splitext(target_path)[0]}.{uuid.uuid4().hex}.tmp.png'
+            return temporary_paths[target_path]
+
+        os.makedirs(os.path.dirname(self.__queue.figure_path(task, task.capability)), exist_ok=True)
+        sink = ResultSink(temporary_path)
+        try:
+            report: CapabilityMemoryReport = sink.persist(functools.update_wrapper(compute, capability))
+            if report.status == 'aborted':
+                raise Exception('ran out of memory')
+            for target_path, rendered_path in temporary_paths.items():
+                # results without a plot write no figure
+                if os.path.exists(rendered_path):
+                    os.replace(rendered_path, target_path)
+        finally:
+            for rendered_path in temporary_paths.values():
+                if os.path.exists(rendered_path):
+                    os.remove(rendered_path)
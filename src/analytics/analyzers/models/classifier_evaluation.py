@@ -0,0 +1,135 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+from analyzers.models.duration_genre_classifier_model import DurationGenreClassifierModel
+from analyzers.internals.query_backend import QueryBackend
+from analyzers.internals.query_catalog import QUERY_CATALOG
+
+# the podcasts the classifier is evaluated on (podcasts of unknown genre cannot be scored)
+QUERY_CATALOG.register('classifier_evaluation.podcasts', '''
+    SELECT
+        PodcastId,
+        Genre,
+        COUNT(*) AS EpisodeCount,
+        AVG(Episodes.DurationMs) AS AvgDurationMs
+    FROM Episodes
+    INNER JOIN Podcasts ON Episodes.PodcastId = Podcasts.Id
+    WHERE Podcasts.Genre <> 'Unknown'
+    GROUP BY PodcastId, Genre
+    ORDER BY PodcastId ASC
+''')
+
+# trains the classifier on the training podcasts and classifies the test podcasts.
+# Runs in a worker process, returns the predicted genres, their confidences and the seconds spent classifying
+def _evaluate_fold(training: DataFrame, test: DataFrame) -> Tuple[np.ndarray, np.ndarray, float]:
+    classifier: DurationGenreClassifierModel = DurationGenreClassifierModel.from_podcasts(training)
+    start: float = time.perf_counter()
+    genres, confidences = classifier.classify_many(test['AvgDurationMs'].to_numpy(), test['EpisodeCount'].to_numpy())
+    return genres, confidences, time.perf_counter() - start
+
+# k-fold cross-validation of the DurationGenreClassifierModel. The podcasts are split into folds stratified by genre,
+# the classifier is trained on all other folds and tested on each fold, with the folds evaluated in parallel processes
+class ClassifierEvaluation:
+    __predictions: DataFrame
+    __folds: int
+    __classification_seconds: float
+    __wall_seconds: float
+
+    def __init__(self, predictions: DataFrame, folds: int, classification_seconds: float, wall_seconds: float) -> None:
+        self.__predictions = predictions
+        self.__folds = folds
+        self.__classification_seconds = classification_seconds
+        self.__wall_seconds = wall_seconds
+
+    # workers defaults to one process per fold (at most the number of CPUs); with a single worker, the folds run in-process
+    @staticmethod
+    def run(backend: QueryBackend, folds: int = 5, seed: int = 0, workers: Optional[int] = None) -> 'ClassifierEvaluation':
+        if folds < 2:
+            raise Exception('The cross-validation needs at least 2 folds')
+        start: float = time.perf_counter()
+        podcasts: DataFrame = QUERY_CATALOG.execute(backend, 'classifier_evaluation.podcasts')
+        assignment: np.ndarray = ClassifierEvaluation.__assign_folds(podcasts['Genre'].to_numpy(), folds, seed)
+        splits: List[Tuple[DataFrame, DataFrame]] = [(podcasts[assignment != fold], podcasts[assignment == fold]) for fold in range(folds)]
+        if workers is None:
+            workers = min(folds, os.cpu_count() or 1)
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(_evaluate_fold, *zip(*splits)))
+        else:
+            results = [_evaluate_fold(training, test) for training, test in splits]
+        predictions: List[DataFrame] = []
+        for fold, ((_, test), (genres, confidences, _)) in enumerate(zip(splits, results)):
+            predictions.append(DataFrame({
+                'PodcastId': test['PodcastId'].to_numpy(),
+                'Fold': fold,
+                'Genre': test['Genre'].to_numpy(),
+                'PredictedGenre': genres,
+                'Confidence': confidences
+            }))
+        prediction_frame: DataFrame = pd.concat(predictions, ignore_index=True).sort_values(by='PodcastId', kind='mergesort').reset_index(drop=True)
+        return ClassifierEvaluation(prediction_frame, folds, sum(result[2] for result in results), time.perf_counter() - start)
+
+    # deals the (seeded) shuffled podcasts of every genre to the folds in turn, so every fold has the same genre mix
+    @staticmethod
+    def __assign_folds(genres: np.ndarray, folds: int, seed: int) -> np.ndarray:
+        rng: np.random.Generator = np.random.default_rng(seed)
+        assignment: np.ndarray = np.empty(len(genres), dtype=np.int64)
+        position: int = 0
+        for genre in np.unique(genres):
+            members: np.ndarray = rng.permutation(np.flatnonzero(genres == genre))
+            assignment[members] = (position + np.arange(len(members))) % folds
+            position += len(members)
+        return assignment
+
+    # one row per test podcast: PodcastId, Fold, Genre, PredictedGenre, Confidence
+    def predictions(self) -> DataFrame:
+        return self.__predictions
+
+    def accuracy(self) -> float:
+        if len(self.__predictions) == 0:
+            return np.nan
+        return float((self.__predictions['Genre'] == self.__predictions['PredictedGenre']).mean())
+
+    # actual genres (rows) by predicted genres (columns)
+    def confusion_matrix(self) -> DataFrame:
+        genres: List[str] = sorted(set(self.__predictions['Genre']) | set(self.__predictions['PredictedGenre']))
+        matrix: DataFrame = pd.crosstab(self.__predictions['Genre'], self.__predictions['PredictedGenre'])
+        return matrix.reindex(index=genres, columns=genres, fill_value=0)
+
+    # precision, recall and F1 score by genre (genres that are never predicted have a precision of 0)
+    def genre_scores(self) -> DataFrame:
+        matrix: DataFrame = self.confusion_matrix()
+        true_positives: np.ndarray = np.diag(matrix.to_numpy()).astype(np.float64)
+        predicted: np.ndarray = matrix.sum(axis=0).to_numpy(dtype=np.float64)
+        actual: np.ndarray = matrix.sum(axis=1).to_numpy(dtype=np.float64)
+        precision: np.ndarray = np.divide(true_positives, predicted, out=np.zeros_like(true_positives), where=predicted > 0)
+        recall: np.ndarray = np.divide(true_positives, actual, out=np.zeros_like(true_positives), where=actual > 0)
+        f1: np.ndarray = np.divide(2 * precision * recall, precision + recall, out=np.zeros_like(true_positives), where=precision + recall > 0)
+        return DataFrame({
+            'Genre': matrix.index,
+            'Support': actual.astype(np.int64),
+            'Precision': precision,
+            'Recall': recall,
+            'F1': f1
+        })
+
+    # podcasts classified per second of classification (summed over all folds), excluding training and query time
+    def throughput(self) -> float:
+        return len(self.__predictions) / self.__classification_seconds if self.__classification_seconds > 0 else np.inf
+
+    # podcasts evaluated per second of the whole evaluation, including the query, training and worker startup
+    def end_to_end_throughput(self) -> float:
+        return len(self.__predictions) / self.__wall_seconds if self.__wall_seconds > 0 else np.inf
+
+    def print_report(self) -> None:
+        print(f'Classifier evaluation ({self.__folds}-fold cross-validation, {len(self.__predictions)} podcasts):')
+        print(f'Accuracy: {self.accuracy():.2%}')
+        print(f'Throughput: {self.throughput():,.0f} podcasts/s (end to end: {self.end_to_end_throughput():,.0f} podcasts/s)')
+        print('Scores by genre:')
+        print(self.genre_scores().to_string(index=False, float_format=lambda x: f'{x:.4f}'))
+        print('Confusion matrix (actual genre by predicted genre):')
+        print(self.confusion_matrix().to_string())
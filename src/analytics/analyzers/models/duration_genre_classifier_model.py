@@ -1,23 +1,64 @@
-from typing import Callable, List, Tuple, cast
+from typing import Callable, Dict, List, Optional, Tuple, cast
 from matplotlib.dates import YearLocator
 from matplotlib.figure import Figure
 from matplotlib.legend import Legend
 from matplotlib.ticker import MultipleLocator
 import numpy as np
 from pandas import DataFrame
-from sqlalchemy import Engine, create_engine
 from analyzers.internals.analyzer_result import AnalyzerResult
 from analyzers.podcast_analyzer import PodcastAnalyzer
 from analyzers.internals.analyzer_result import AnalyzerResultModel
+from analyzers.internals.model_store import ModelStore
+from analyzers.internals.query_backend import QueryBackend, SqliteQueryBackend, read_db_version
+from analyzers.internals.query_catalog import QUERY_CATALOG
 import pandas as pd
 from pandas import DataFrame
-import matplotlib.pyplot as plt
+from analyzers.internals.figures import create_figure
 import seaborn as sns
+from sqlalchemy import make_url
+
+# the per-genre model data, shared by the duration analyzer and initialize_from_database
+QUERY_CATALOG.register('duration_vs_episode_count_by_genre', '''
+    SELECT
+        Genre,
+        AVG(EpisodeCountPerPodcast) AS AvgEpisodes,
+        SUM(EpisodeCountPerPodcast * AvgDurationMsPerPodcast) / SUM(EpisodeCountPerPodcast) AS WeightedAvgDurationMs
+    FROM (
+        SELECT PodcastId, Genre, COUNT(*) AS EpisodeCountPerPodcast, AVG(Episodes.DurationMs) AS AvgDurationMsPerPodcast
+        FROM Episodes
+        INNER JOIN Podcasts ON Episodes.PodcastId = Podcasts.Id
+        WHERE Podcasts.Genre <> 'Unknown'
+        GROUP BY PodcastId, Genre
+    )
+    GROUP BY Genre;
+''')
 
 class DurationGenreClassifierModel(AnalyzerResultModel):
-    def __init__(self, analyzer: PodcastAnalyzer, data_frame: DataFrame) -> None:
-        super().__init__(data_frame, analyzer._theme, analyzer._palette, lambda result: cast(DurationGenreClassifierModel, result).__render())
+    # the name of the persisted model in the model store
+    MODEL_NAME: str = 'duration_genre_classifier'
+
+    # fitted state: the genre centroids, normalized by the maximum duration and number of episodes
+    __genres: np.ndarray
+    __max_duration: float
+    __max_episodes: float
+    __normalized_durations: np.ndarray
+    __normalized_episodes: np.ndarray
+
+    # without an analyzer (e.g. when trained for an evaluation), the model is rendered with the default style
+    def __init__(self, analyzer: Optional[PodcastAnalyzer], data_frame: DataFrame) -> None:
+        theme: str = analyzer._theme if analyzer is not None else 'darkgrid'
+        palette: str = analyzer._palette if analyzer is not None else 'viridis'
+        super().__init__(data_frame, theme, palette, lambda result: cast(DurationGenreClassifierModel, result).__render())
         self._set_model_visualizations([])
+        self.__fit(float(data_frame['WeightedAvgDurationMs'].max()), float(data_frame['AvgEpisodes'].max()))
+
+    def __fit(self, max_duration: float, max_episodes: float) -> None:
+        data: DataFrame = self.get_data_frame()
+        self.__genres = data['Genre'].to_numpy()
+        self.__max_duration = max_duration
+        self.__max_episodes = max_episodes
+        self.__normalized_durations = data['WeightedAvgDurationMs'].to_numpy(dtype=np.float64) / max_duration
+        self.__normalized_episodes = data['AvgEpisodes'].to_numpy(dtype=np.float64) / max_episodes
 
     # return a formatted time string from a number of milliseconds
     def __format_time(self, millis: float, _):
@@ -27,10 +68,7 @@ class DurationGenreClassifierModel(AnalyzerResultModel):
     def __render(self) -> Figure:
         data: DataFrame = self.get_data_frame()
 
-        # Set the style of seaborn
-        sns.set_theme(style=self._theme)
-
-        fig, ax = plt.subplots()
+        fig, ax = create_figure()
         # Create a scatter plot
         sns.scatterplot(
             x="WeightedAvgDurationMs",  # X-axis: Average Duration of Episodes
@@ -71,25 +109,61 @@ class DurationGenreClassifierModel(AnalyzerResultModel):
         fig.tight_layout()
         return fig
     
+    # loads the model fitted on the current version of the database from the model store next to it,
+    # or fits it (and stores it for the next process) if there is none. The database is only opened to fit the model
     @staticmethod
-    def initialize_from_database(connection_string: str) -> 'DurationGenreClassifierModel':
-        engine: Engine = create_engine(connection_string)
-        data: DataFrame = pd.read_sql_query('''
-            SELECT 
-            Genre, 
-            AVG(EpisodeCountPerPodcast) AS AvgEpisodes,
-            SUM(EpisodeCountPerPodcast * AvgDurationMsPerPodcast) / SUM(EpisodeCountPerPodcast) AS WeightedAvgDurationMs
-        FROM (
-            SELECT PodcastId, Genre, COUNT(*) AS EpisodeCountPerPodcast, AVG(Episodes.DurationMs) AS AvgDurationMsPerPodcast
-            FROM Episodes
-            INNER JOIN Podcasts ON Episodes.PodcastId = Podcasts.Id
-            WHERE Podcasts.Genre <> 'Unknown'
-            GROUP BY PodcastId
-        )
-        GROUP BY Genre;
-        ''', engine)
-        self = DurationGenreClassifierModel(DurationGenreClassifierModel.__dummy_analyzer(connection_string), data)
+    def initialize_from_database(connection_string: str, backend: Optional[QueryBackend] = None) -> 'DurationGenreClassifierModel':
+        db_path: str = backend.db_path() if backend is not None else str(make_url(connection_string).database)
+        version: str = read_db_version(db_path)
+        store: ModelStore = ModelStore.for_database(db_path)
+        model: Optional[DurationGenreClassifierModel] = DurationGenreClassifierModel.load(store, version)
+        if model is not None:
+            return model
+        owned_backend: Optional[QueryBackend] = SqliteQueryBackend(connection_string) if backend is None else None
+        try:
+            fit_backend: QueryBackend = backend if backend is not None else cast(QueryBackend, owned_backend)
+            data: DataFrame = QUERY_CATALOG.execute(fit_backend, 'duration_vs_episode_count_by_genre')
+            self = DurationGenreClassifierModel(DurationGenreClassifierModel.__dummy_analyzer(connection_string, fit_backend), data)
+        finally:
+            if owned_backend is not None:
+                owned_backend.dispose()
+        if version != 'unknown':
+            self.save(store, version)
         return self
+
+    # returns the fitted state of the model (see ModelStore)
+    def state(self) -> Dict[str, np.ndarray]:
+        state: Dict[str, np.ndarray] = ModelStore.frame_to_state(self.get_data_frame(), 'centroids')
+        state['max_duration_ms'] = np.array(self.__max_duration)
+        state['max_episodes'] = np.array(self.__max_episodes)
+        return state
+
+    @staticmethod
+    def from_state(state: Dict[str, np.ndarray], analyzer: Optional[PodcastAnalyzer] = None) -> 'DurationGenreClassifierModel':
+        model = DurationGenreClassifierModel(analyzer, ModelStore.frame_from_state(state, 'centroids'))
+        model.__fit(float(state['max_duration_ms']), float(state['max_episodes']))
+        return model
+
+    def save(self, store: ModelStore, version: str) -> None:
+        store.save(DurationGenreClassifierModel.MODEL_NAME, version, self.state())
+
+    # loads the stored model without touching the database. Returns None if there is no model (fitted on the given version)
+    @staticmethod
+    def load(store: ModelStore, version: Optional[str] = None, analyzer: Optional[PodcastAnalyzer] = None) -> Optional['DurationGenreClassifierModel']:
+        state: Optional[Dict[str, np.ndarray]] = store.load(DurationGenreClassifierModel.MODEL_NAME, version)
+        return DurationGenreClassifierModel.from_state(state, analyzer) if state is not None else None
+
+    # trains the model on podcasts with the columns Genre, EpisodeCount and AvgDurationMs
+    # (the same aggregation as the duration_vs_episode_count_by_genre query)
+    @staticmethod
+    def from_podcasts(podcasts: DataFrame, analyzer: Optional[PodcastAnalyzer] = None) -> 'DurationGenreClassifierModel':
+        podcasts = podcasts[podcasts['Genre'] != 'Unknown'].assign(TotalDurationMs=podcasts['EpisodeCount'] * podcasts['AvgDurationMs'])
+        data: DataFrame = podcasts.groupby('Genre', as_index=False).agg(
+            AvgEpisodes=('EpisodeCount', 'mean'),
+            TotalDurationMs=('TotalDurationMs', 'sum'),
+            TotalEpisodes=('EpisodeCount', 'sum'))
+        data['WeightedAvgDurationMs'] = data['TotalDurationMs'] / data['TotalEpisodes']
+        return DurationGenreClassifierModel(analyzer, data[['Genre', 'AvgEpisodes', 'WeightedAvgDurationMs']])
     
     def calculate_confidence(self, closest_distance: float, second_closest_distance: float, temperature: float = 1.0):
         """
@@ -113,33 +187,30 @@ class DurationGenreClassifierModel(AnalyzerResultModel):
         return confidence
     
     def classify(self, duration_ms: float, episodes: int) -> Tuple[str, float]:
-        data = self.get_data_frame().copy()
-
-        # normalize the data by dividing by the maximum value in each column
-        max_duration = data['WeightedAvgDurationMs'].max()
-        max_episodes = data['AvgEpisodes'].max()
+        genres, confidences = self.classify_many(np.array([duration_ms]), np.array([episodes]))
+        return cast(str, genres[0]), float(confidences[0])
 
-        data['WeightedAvgDurationMs'] = data['WeightedAvgDurationMs'] / max_duration
-        data['AvgEpisodes'] = data['AvgEpisodes'] / max_episodes
+    # classifies all podcasts at once, returns their genres and confidences
+    def classify_many(self, duration_ms: np.ndarray, episodes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        # distances of every podcast (rows) to every genre (columns), normalized like the genre centroids
+        distances: np.ndarray = np.sqrt(
+            (self.__normalized_durations[np.newaxis, :] - np.asarray(duration_ms, dtype=np.float64)[:, np.newaxis] / self.__max_duration) ** 2
+            + (self.__normalized_episodes[np.newaxis, :] - np.asarray(episodes, dtype=np.float64)[:, np.newaxis] / self.__max_episodes) ** 2)
+        closest: np.ndarray = np.argmin(distances, axis=1)
+        closest_genres: np.ndarray = self.__genres[closest]
 
-        unknown_podcast = {
-            'WeightedAvgDurationMs': duration_ms / max_duration,
-            'AvgEpisodes': episodes / max_episodes
-        }
+        # distances to the closest and to the second closest genre
+        if distances.shape[1] > 1:
+            nearest: np.ndarray = np.partition(distances, 1, axis=1)
+            closest_distance, second_closest_distance = nearest[:, 0], nearest[:, 1]
+        else:
+            closest_distance, second_closest_distance = distances[:, 0], np.full(len(distances), np.inf)
 
-        distances = np.sqrt((data['WeightedAvgDurationMs'] - unknown_podcast['WeightedAvgDurationMs']) ** 2 + (data['AvgEpisodes'] - unknown_podcast['AvgEpisodes']) ** 2)
-        closest_genre: str = cast(str, data.loc[distances.idxmin(), 'Genre'])
-        
-        # distance to closest genre
-        closest_distance = distances.min()
-        # distance to second closest genre (by removing the closest genre from the distances array)
-        second_closest_distance = np.delete(distances, distances.idxmin()).min()
-        
-        confidence = self.calculate_confidence(closest_distance, second_closest_distance)
+        confidences = self.calculate_confidence(closest_distance, second_closest_distance)
 
-        return closest_genre, confidence
+        return closest_genres, confidences
 
 
     class __dummy_analyzer(PodcastAnalyzer):
-        def __init__(self, connection_string: str) -> None:
-            super().__init__(connection_string, '', '')
\ No newline at end of file
+        def __init__(self, connection_string: str, backend: Optional[QueryBackend] = None) -> None:
+            super().__init__(connection_string, '', '', backend)
\ No newline at end of file
@@ -1,4 +1,4 @@
-from typing import Callable, List, Tuple, cast
+from typing import Callable, Dict, List, Optional, Tuple, cast
 from matplotlib.dates import YearLocator
 from matplotlib.figure import Figure
 from matplotlib.ticker import MultipleLocator
@@ -6,30 +6,90 @@ from pandas import DataFrame
 from analyzers.internals.analyzer_result import AnalyzerResult
 from analyzers.podcast_analyzer import PodcastAnalyzer
 from analyzers.internals.analyzer_result import AnalyzerResultModel
+from analyzers.internals.model_store import ModelStore
 import numpy as np
 import pandas as pd
 from pandas import DataFrame
-import matplotlib.pyplot as plt
+from matplotlib.artist import setp
+from analyzers.internals.figures import create_figure
 import seaborn as sns
 from statsmodels.tsa.seasonal import seasonal_decompose, DecomposeResult
 from scipy.stats import linregress
 
 class UploadFrequencyModel(AnalyzerResultModel):
-    def __init__(self, analyzer: PodcastAnalyzer, data_frame: DataFrame) -> None:
-        super().__init__(data_frame, analyzer._theme, analyzer._palette, lambda result: cast(UploadFrequencyModel, result).__render())
+    # the name of the persisted model in the model store
+    MODEL_NAME: str = 'upload_frequency'
+
+    # fitted state: the seasonal decomposition of the monthly relative uploads and the linear regression of its trend
+    __trend: np.ndarray
+    __seasonal: np.ndarray
+    __residual: np.ndarray
+    __trend_slope: float
+    __trend_intercept: float
+
+    # the model is fitted on construction, unless the fitted state is given (see from_state)
+    def __init__(self, analyzer: Optional[PodcastAnalyzer], data_frame: DataFrame, state: Optional[Dict[str, np.ndarray]] = None) -> None:
+        theme: str = analyzer._theme if analyzer is not None else 'darkgrid'
+        palette: str = analyzer._palette if analyzer is not None else 'viridis'
+        super().__init__(data_frame, theme, palette, lambda result: cast(UploadFrequencyModel, result).__render())
         self._set_model_visualizations([
             self.upload_model_relative_frequency_vs_month,
             self.upload_model_seasonal,
             self.upload_model_trend,
             self.upload_model_trend_days_per_upload
         ])
+        if state is None:
+            self.__fit()
+        else:
+            self.__trend = state['trend']
+            self.__seasonal = state['seasonal']
+            self.__residual = state['residual']
+            self.__trend_slope = float(state['trend_slope'])
+            self.__trend_intercept = float(state['trend_intercept'])
+
+    def __fit(self) -> None:
+        decomposition: DecomposeResult = self._decompose()
+        self.__trend = np.asarray(decomposition.trend, dtype=np.float64)
+        self.__seasonal = np.asarray(decomposition.seasonal, dtype=np.float64)
+        self.__residual = np.asarray(decomposition.resid, dtype=np.float64)
+        # the trend is undefined for the first and last half period
+        defined: np.ndarray = ~np.isnan(self.__trend)
+        regression = linregress(x=np.arange(len(self.__trend))[defined], y=self.__trend[defined])
+        self.__trend_slope = float(regression.slope)
+        self.__trend_intercept = float(regression.intercept)
+
+    # returns the fitted state of the model (see ModelStore)
+    def state(self) -> Dict[str, np.ndarray]:
+        state: Dict[str, np.ndarray] = ModelStore.frame_to_state(self.get_data_frame(), 'data')
+        state['trend'] = self.__trend
+        state['seasonal'] = self.__seasonal
+        state['residual'] = self.__residual
+        state['trend_slope'] = np.array(self.__trend_slope)
+        state['trend_intercept'] = np.array(self.__trend_intercept)
+        return state
+
+    @staticmethod
+    def from_state(state: Dict[str, np.ndarray], analyzer: Optional[PodcastAnalyzer] = None) -> 'UploadFrequencyModel':
+        return UploadFrequencyModel(analyzer, ModelStore.frame_from_state(state, 'data'), state)
+
+    # models fitted on different parameters (e.g. year bounds) are stored under different names
+    def save(self, store: ModelStore, version: str, name: str = MODEL_NAME) -> None:
+        store.save(name, version, self.state())
+
+    # loads the stored model without touching the database. Returns None if there is no model (fitted on the given version)
+    @staticmethod
+    def load(store: ModelStore, version: Optional[str] = None, analyzer: Optional[PodcastAnalyzer] = None, name: str = MODEL_NAME) -> Optional['UploadFrequencyModel']:
+        state: Optional[Dict[str, np.ndarray]] = store.load(name, version)
+        return UploadFrequencyModel.from_state(state, analyzer) if state is not None else None
+
+    # the slope (per month) and intercept of the linear regression of the season-adjusted trend
+    def trend_regression(self) -> Tuple[float, float]:
+        return self.__trend_slope, self.__trend_intercept
 
     def __render(self) -> Figure:
         data: DataFrame = self.get_data_frame()
-        # Set the style of seaborn
-        sns.set_theme(style=self._theme)
 
-        fig, ax = plt.subplots() 
+        fig, ax = create_figure() 
         sns.lineplot(data=data, x='Date', y='RelativeUploads', hue='Year', palette=self._palette + '_r', ax=ax)
         ax.set_title('Relative Uploads per Day (Uploads per Podcast per Day)')
         ax.set_xlabel('Year')
@@ -69,8 +129,7 @@ class UploadFrequencyModel(AnalyzerResultModel):
     def upload_model_relative_frequency_vs_month(self, _: AnalyzerResult) -> Figure:
         data: DataFrame = self._group_by_month_and_year()
 
-        sns.set_theme(style=self._theme)
-        fig, ax = plt.subplots()
+        fig, ax = create_figure()
 
         sns.lineplot(data=data, x='Month', y='RelativeUploads', hue='Year', palette=self._palette + '_r', ax=ax)
         ax.set_title('Relative Uploads per Day (Uploads per Podcast per Day)')
@@ -79,7 +138,7 @@ class UploadFrequencyModel(AnalyzerResultModel):
         ax.xaxis.set_major_locator(MultipleLocator(1))
         ax.xaxis.set_major_formatter(self._format_month)
         # rotate x-axis labels by 45 degrees
-        plt.setp(ax.get_xticklabels(), rotation=45, ha='right', rotation_mode='anchor')
+        setp(ax.get_xticklabels(), rotation=45, ha='right', rotation_mode='anchor')
         fig.tight_layout()
         return fig
     
@@ -96,10 +155,8 @@ class UploadFrequencyModel(AnalyzerResultModel):
         return seasonal_decompose(time_series, period=12)
     
     def upload_model_seasonal(self, _: AnalyzerResult) -> Figure:
-        decomposition: DecomposeResult = self._decompose()
-        seasonal: List[float] = decomposition.seasonal[:12]
-        sns.set_theme(style=self._theme)
-        fig, ax = plt.subplots()
+        seasonal: np.ndarray = self.__seasonal[:12]
+        fig, ax = create_figure()
         sns.lineplot(data=seasonal, ax=ax)
         ax.set_title('Seasonal Upload Components')
         ax.set_xlabel('Month')
@@ -107,30 +164,25 @@ class UploadFrequencyModel(AnalyzerResultModel):
         ax.xaxis.set_major_locator(MultipleLocator(1))
         ax.xaxis.set_major_formatter(lambda x, _: self._format_month(x + 1))
         # rotate x-axis labels by 45 degrees
-        plt.setp(ax.get_xticklabels(), rotation=45, ha='right', rotation_mode='anchor')
+        setp(ax.get_xticklabels(), rotation=45, ha='right', rotation_mode='anchor')
         fig.tight_layout()
         return fig
     
     # returns the trend of the upload frequency model in uploads per day
     def upload_model_trend(self, _: AnalyzerResult) -> Figure:
-        decomposition: DecomposeResult = self._decompose()
-        trend: List[float] = decomposition.trend
+        trend: np.ndarray = self.__trend
 
         min_year: int = int(self.get_data_frame()['Year'].min())
 
-        sns.set_theme(style=self._theme)
-        fig, ax = plt.subplots()
+        fig, ax = create_figure()
         sns.regplot(x=np.arange(len(trend)), y=trend, ax=ax)
         ax.set_title('Season-Adjusted Relative Upload Trend')
         ax.set_xlabel('Year')
         ax.set_ylabel('Uploads per Day')
         ax.xaxis.set_major_locator(MultipleLocator(12))
         ax.xaxis.set_major_formatter(lambda x, _: str(min_year + int(x) // 12))
-        #calculate slope and intercept of regression equation
-        slope, intercept, r, p, sterr = linregress(
-            x=ax.get_lines()[0].get_xdata(),
-            y=ax.get_lines()[0].get_ydata())
         # model equation
+        slope, intercept = self.trend_regression()
         equation: str = f'y = {slope}x + {intercept}'
         # add equation to plot
         ax.text(0.05, 0.95, equation, transform=ax.transAxes)
@@ -141,14 +193,12 @@ class UploadFrequencyModel(AnalyzerResultModel):
     
     # returns the trend of the upload frequency model in days per upload
     def upload_model_trend_days_per_upload(self, _: AnalyzerResult) -> Figure:
-        decomposition: DecomposeResult = self._decompose()
-        trend: List[float] = decomposition.trend
-        inverse_trend: List[float] = [1 / x for x in trend]
+        trend: np.ndarray = self.__trend
+        inverse_trend: np.ndarray = 1 / trend
 
         min_year: int = int(self.get_data_frame()['Year'].min())
 
-        sns.set_theme(style=self._theme)
-        fig, ax = plt.subplots()
+        fig, ax = create_figure()
         # set x axis to include predicted values for the next 18 months
         ax.set_xlim(left=0, right=len(trend) + 18)
         sns.regplot(x=np.arange(len(trend)), y=inverse_trend, truncate=False, ax=ax)
@@ -1,20 +1,113 @@
-from typing import Callable, List
+from typing import Any, Callable, Dict, List, Optional
+from matplotlib.axes import Axes
+from matplotlib.figure import Figure
 import numpy as np
 import pandas as pd
-from sqlalchemy import Engine, create_engine
+from pandas import DataFrame
+from analyzers.internals.figures import create_figure
+import seaborn as sns
 
+from analyzers.internals.aggregate_cube import AggregateCube
 from analyzers.internals.analyzer_result import AnalyzerResult
+from analyzers.internals.bootstrap import CellBootstrap
+from analyzers.internals.preview_sample import PreviewEstimate
+from analyzers.internals.query_backend import QueryBackend, SqliteQueryBackend
+from analyzers.internals.query_catalog import QUERY_CATALOG
+from analyzers.internals.snapshot_aggregates import SnapshotAggregate, SnapshotAggregateStore
+
+# the countries with rankings, and whether they have an overall ('All') ranking and genre-specific rankings
+QUERY_CATALOG.register('ranking_countries', '''
+    SELECT
+        Country,
+        MAX(CASE WHEN Genre = 'All' THEN 1 ELSE 0 END) AS HasOverallRanking,
+        MAX(CASE WHEN Genre <> 'All' THEN 1 ELSE 0 END) AS HasGenreRankings
+    FROM Rankings
+    GROUP BY Country
+''')
 
 class PodcastAnalyzer:
-    _engine: Engine
+    _backend: QueryBackend
+    _db_path: str
     _theme: str
     _palette: str
 
-    def __init__(self, connection_string: str, theme: str, palette: str) -> None:
-        self._engine = create_engine(connection_string)
+    # the backend defaults to SQLite. Backends can be shared between analyzers (see PodcastAnalytics)
+    def __init__(self, connection_string: str, theme: str, palette: str, backend: Optional[QueryBackend] = None) -> None:
+        self._backend = backend if backend is not None else SqliteQueryBackend(connection_string)
+        self._db_path = self._backend.db_path()
         self._theme = theme
         self._palette = palette
 
+    # executes a query registered in the query catalog with the given bind parameters
+    def _query(self, name: str, **parameters: Any) -> DataFrame:
+        return QUERY_CATALOG.execute(self._backend, name, **parameters)
+
+    # returns the measures of a snapshot aggregate merged over all snapshots, only aggregating new snapshots
+    def _aggregate(self, aggregate: SnapshotAggregate) -> DataFrame:
+        return SnapshotAggregateStore.for_database(self._db_path).aggregate(self._backend, aggregate)
+
+    # rolls the genre x country x ranking genre cube up to the given axes (see AggregateCube.roll_up)
+    def _roll_up(self, by: List[str], measures: List[str], where: Optional[Dict[str, Callable[[Any], bool]]] = None) -> DataFrame:
+        return AggregateCube.for_backend(self._backend).roll_up(by, measures, where)
+
+    # returns the confidence intervals (<prefix>Lower, <prefix>Upper) of the averages of every cell (keys): the ratios
+    # of the numerator and denominator sums of the podcasts in the cell, resampled podcast by podcast (see CellBootstrap)
+    def _ratio_intervals(self, units: DataFrame, keys: List[str], numerator: str, denominator: str, prefix: str) -> DataFrame:
+        return CellBootstrap.ratio_intervals(units, keys, numerator, denominator, prefix)
+
+    # returns the annotations of a pivoted heatmap of the data: the formatted value and, if the data has them, the
+    # confidence interval of the value (<values>Lower, <values>Upper) below it. format_bound formats the bounds of the
+    # intervals (defaults to format_value), e.g. more compactly than the values
+    def _interval_annotations(self, data: DataFrame, pivot_data: DataFrame, values: str, format_value: Callable[[float], str], format_bound: Optional[Callable[[float], str]] = None) -> np.ndarray:
+        annotations: np.ndarray = pivot_data.applymap(lambda value: '' if pd.isna(value) else format_value(value)).to_numpy(dtype=object)
+        if values + 'Lower' not in data.columns:
+            return annotations
+        bounds: List[np.ndarray] = [data.pivot(index=pivot_data.index.name, columns=pivot_data.columns.name, values=values + bound).reindex(index=pivot_data.index, columns=pivot_data.columns).to_numpy(dtype=np.float64) for bound in ('Lower', 'Upper')]
+        intervals: np.ndarray = np.vectorize(lambda lower, upper: CellBootstrap.format_interval(lower, upper, format_bound if format_bound is not None else format_value), otypes=[object])(*bounds)
+        return np.where(intervals == '', annotations, annotations + '\n' + intervals)
+
+    # draws the confidence intervals (<values>Lower, <values>Upper) of the bars of a bar plot of the data (one bar
+    # per row, in the order of the data) as error bars, if the data has them
+    def _interval_error_bars(self, ax: Axes, data: DataFrame, values: str) -> None:
+        if values + 'Lower' not in data.columns:
+            return
+        errors: np.ndarray = np.array([data[values] - data[values + 'Lower'], data[values + 'Upper'] - data[values]], dtype=np.float64)
+        ax.errorbar(np.arange(len(data)), data[values], yerr=np.nan_to_num(np.clip(errors, 0, None)), fmt='none', ecolor='black', elinewidth=1, capsize=3)
+
+    # renders one horizontal box per row of the summary. Whiskers extend to 1.5 IQR, clipped to the observed range
+    def _render_box_plot(self, data: DataFrame, dimension: str, title: str, label: str, formatter: Optional[Callable] = None) -> Figure:
+        statistics: List[Dict[str, Any]] = [{
+            'label': row[dimension],
+            'mean': row['Mean'],
+            'med': row['Median'],
+            'q1': row['Q1'],
+            'q3': row['Q3'],
+            'whislo': max(row['Min'], row['Q1'] - 1.5 * (row['Q3'] - row['Q1'])),
+            'whishi': min(row['Max'], row['Q3'] + 1.5 * (row['Q3'] - row['Q1'])),
+            'fliers': []
+        } for _, row in data.iterrows()]
+
+        fig, ax = create_figure(figsize=(8, max(4, len(statistics) * 0.35)))
+        boxes = ax.bxp(statistics, vert=False, showmeans=True, showfliers=False, patch_artist=True)
+        colors = sns.color_palette(self._palette, len(statistics))
+        for box, color in zip(boxes['boxes'], colors):
+            box.set_facecolor(color)
+        ax.set_xlabel(label)
+        ax.set_ylabel(dimension)
+        ax.set_title(title)
+        if formatter is not None:
+            ax.xaxis.set_major_formatter(formatter)
+        fig.tight_layout()
+        return fig
+
+    # returns the countries that have genre-specific rankings (and optionally also an overall ranking)
+    def _genre_ranking_countries(self, require_overall_ranking: bool = False) -> List[str]:
+        countries: DataFrame = self._query('ranking_countries')
+        mask = countries['HasGenreRankings'] == 1
+        if require_overall_ranking:
+            mask &= countries['HasOverallRanking'] == 1
+        return countries.loc[mask, 'Country'].tolist()
+
     # return a formatted time string from a number of milliseconds
     def _format_time(self, millis: float, _):
         formatted_time = pd.to_datetime(millis, unit='ms').strftime('%H:%M:%S')
@@ -32,4 +125,9 @@ class PodcastAnalyzer:
             return '{:.1f}'.format(x)
     
     def capabilities(self) -> List[Callable[[], AnalyzerResult]]:
-        return []
\ No newline at end of file
+        return []
+
+    # how the results of the capabilities are estimated in preview mode (by capability name, see PreviewEstimate).
+    # Capabilities without an entry are identified by their non-numeric columns and contain no totals
+    def preview_estimates(self) -> Dict[str, PreviewEstimate]:
+        return {}
\ No newline at end of file
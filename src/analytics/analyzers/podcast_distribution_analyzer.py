@@ -0,0 +1,96 @@
+from typing import Callable, Dict, List, Optional
+from matplotlib.figure import Figure
+from matplotlib.ticker import FuncFormatter, MultipleLocator
+import pandas as pd
+from pandas import DataFrame
+from analyzers.podcast_analyzer import PodcastAnalyzer
+from analyzers.internals.analyzer_result import AnalyzerResult
+from analyzers.internals.episode_sketches import EpisodeSketches
+from analyzers.internals.preview_sample import PreviewEstimate
+from analyzers.internals.query_backend import QueryBackend
+
+# analyzes the distributions of episode durations, episode counts and first releases by genre and region.
+# The statistics are estimated from quantile sketches (see EpisodeSketches), so memory stays bounded
+# regardless of the number of episodes.
+# The density plots of the other analyzers (episode_count_distribution*, episode_time_distribution*) stay exact: their
+# queries group by the value in the database and return one row per distinct episode count (release month), so their
+# size is bounded by the values rather than the episodes, and preview mode scales their frequencies, which quantiles
+# cannot provide. Averages (e.g. duration_by_genre) are exact from sums and counts and need no sketch either
+class PodcastDistributionAnalyzer(PodcastAnalyzer):
+    def __init__(self, connection_string: str, theme: str, palette: str, backend: Optional[QueryBackend] = None) -> None:
+        super().__init__(connection_string, theme, palette, backend)
+
+    def capabilities(self) -> List[Callable[[], AnalyzerResult]]:
+        return [
+            self.duration_quantiles_by_genre,
+            self.duration_quantiles_by_region,
+            self.episode_count_quantiles_by_genre,
+            self.episode_count_quantiles_by_region,
+            self.first_release_quantiles_by_genre
+        ]
+
+    def preview_estimates(self) -> Dict[str, PreviewEstimate]:
+        return {
+            'duration_quantiles_by_genre': PreviewEstimate(totals=['Count']),
+            'duration_quantiles_by_region': PreviewEstimate(totals=['Count']),
+            'episode_count_quantiles_by_genre': PreviewEstimate(totals=['Count']),
+            'episode_count_quantiles_by_region': PreviewEstimate(totals=['Count']),
+            'first_release_quantiles_by_genre': PreviewEstimate(totals=['Count'])
+        }
+
+    # returns the summary of the measure by the dimension, ordered by median (genre 'Unknown' is excluded)
+    def __summary(self, measure: str, dimension: str) -> DataFrame:
+        data: DataFrame = EpisodeSketches.for_backend(self._backend).summary(measure, dimension)
+        if dimension == 'Genre':
+            data = data[data['Genre'] != 'Unknown']
+        return data.sort_values(by='Median', kind='mergesort').reset_index(drop=True)
+
+    # returns the quartiles of the episode durations by podcast genre
+    def duration_quantiles_by_genre(self) -> AnalyzerResult:
+        data: DataFrame = self.__summary('DurationMs', 'Genre')
+
+        def render(result: AnalyzerResult) -> Figure:
+            fig = self._render_box_plot(result.get_data_frame(), 'Genre', 'Episode Duration by Genre', 'Episode Duration', FuncFormatter(self._format_time))
+            fig.axes[0].xaxis.set_major_locator(MultipleLocator(1800000))
+            return fig
+
+        return AnalyzerResult(data, render, self._theme)
+
+    # returns the quartiles of the episode durations of the podcasts in the overall rankings by country
+    def duration_quantiles_by_region(self) -> AnalyzerResult:
+        data: DataFrame = self.__summary('DurationMs', 'Country')
+
+        def render(result: AnalyzerResult) -> Figure:
+            fig = self._render_box_plot(result.get_data_frame(), 'Country', 'Episode Duration of Ranked Podcasts by Region', 'Episode Duration', FuncFormatter(self._format_time))
+            fig.axes[0].xaxis.set_major_locator(MultipleLocator(1800000))
+            return fig
+
+        return AnalyzerResult(data, render, self._theme)
+
+    # returns the quartiles of the podcast episode counts by podcast genre
+    def episode_count_quantiles_by_genre(self) -> AnalyzerResult:
+        data: DataFrame = self.__summary('EpisodeCount', 'Genre')
+
+        def render(result: AnalyzerResult) -> Figure:
+            return self._render_box_plot(result.get_data_frame(), 'Genre', 'Podcast Episode Count by Genre', 'Episode Count')
+
+        return AnalyzerResult(data, render, self._theme)
+
+    # returns the quartiles of the episode counts of the podcasts in the overall rankings by country
+    def episode_count_quantiles_by_region(self) -> AnalyzerResult:
+        data: DataFrame = self.__summary('EpisodeCount', 'Country')
+
+        def render(result: AnalyzerResult) -> Figure:
+            return self._render_box_plot(result.get_data_frame(), 'Country', 'Episode Count of Ranked Podcasts by Region', 'Episode Count')
+
+        return AnalyzerResult(data, render, self._theme)
+
+    # returns the quartiles of the release dates of the first podcast episodes by podcast genre (in days since 1970-01-01)
+    def first_release_quantiles_by_genre(self) -> AnalyzerResult:
+        data: DataFrame = self.__summary('FirstRelease', 'Genre')
+
+        def render(result: AnalyzerResult) -> Figure:
+            to_year = FuncFormatter(lambda days, _: (pd.Timestamp('1970-01-01') + pd.Timedelta(days=days)).strftime('%Y'))
+            return self._render_box_plot(result.get_data_frame(), 'Genre', 'Release of the First Episode by Genre', 'First Release', to_year)
+
+        return AnalyzerResult(data, render, self._theme)
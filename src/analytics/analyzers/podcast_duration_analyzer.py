@@ -1,22 +1,108 @@
-from typing import Callable, List, Optional
+from typing import Callable, Dict, List, Optional
 from matplotlib.figure import Figure
 from matplotlib.legend import Legend
 from matplotlib.ticker import MultipleLocator
 import numpy as np
 import pandas as pd
 from pandas import DataFrame
-import matplotlib.pyplot as plt
+from analyzers.internals.figures import create_cluster_grid, create_figure
 import matplotlib as mpl
 import seaborn as sns
 from analyzers.models.duration_genre_classifier_model import DurationGenreClassifierModel
 from analyzers.podcast_analyzer import PodcastAnalyzer
 
 from analyzers.internals.analyzer_result import AnalyzerResult
+from analyzers.internals.bootstrap import CellBootstrap
+from analyzers.internals.preview_sample import PreviewEstimate
+from analyzers.internals.query_backend import QueryBackend
+from analyzers.internals.query_catalog import QUERY_CATALOG
+from analyzers.internals.rank_matrix import RankMatrix
+from analyzers.internals.snapshot_aggregates import SnapshotAggregate
+
+# the average episode duration of every podcast. The ranks are taken from the RankMatrix
+QUERY_CATALOG.register('duration_by_rank', '''
+    SELECT
+        Podcasts.Id,
+        Podcasts.ShowName AS PodcastName,
+        AVG(Episodes.DurationMs) AS AvgDurationMs
+    FROM Podcasts
+    INNER JOIN Episodes ON Podcasts.Id = Episodes.PodcastId
+    GROUP BY Podcasts.Id, Podcasts.ShowName
+''')
+
+# duration sums and episode counts of the podcasts in the overall ('All') rankings by rank and country.
+# Aggregated per snapshot, so that only new snapshots have to be aggregated
+DURATIONS_BY_RANK_AND_REGION = SnapshotAggregate('durations_by_rank_and_region', '''
+    SELECT
+        RankedPodcasts.Rank AS Rank,
+        Rankings.Country AS Country,
+        SUM(Episodes.DurationMs) AS DurationSum,
+        COUNT(Episodes.DurationMs) AS DurationCount
+    FROM RankedPodcasts
+    INNER JOIN Episodes ON RankedPodcasts.PodcastId = Episodes.PodcastId
+    INNER JOIN Rankings ON RankedPodcasts.RankingId = Rankings.Id
+    WHERE Rankings.Genre = 'All' AND Rankings.PodcastDataSetId = :data_set_id
+    GROUP BY RankedPodcasts.Rank, Rankings.Country
+''', keys=['Rank', 'Country'], measures=['DurationSum', 'DurationCount'], depends_on_episodes=True)
+
+QUERY_CATALOG.register('duration_by_genre', '''
+    SELECT
+        AVG(Episodes.DurationMs) AS AvgDurationMs,
+        Podcasts.Genre AS Genre
+    FROM Episodes
+    INNER JOIN Podcasts ON Episodes.PodcastId = Podcasts.Id
+    WHERE Podcasts.Genre <> 'Unknown'
+    GROUP BY Podcasts.Genre
+    ORDER BY AvgDurationMs DESC
+''')
+
+QUERY_CATALOG.register('duration_vs_episode_count_by_genre_scatter', '''
+    SELECT
+        Genre,
+        COUNT(*) AS EpisodeCount,
+        AVG(Episodes.DurationMs) AS AvgDurationMs
+    FROM Episodes
+    INNER JOIN Podcasts ON Episodes.PodcastId = Podcasts.Id
+    WHERE Podcasts.Genre <> 'Unknown'
+    GROUP BY PodcastId, Genre
+''')
+
+# 'duration_vs_episode_count_by_genre' is registered by the DurationGenreClassifierModel
+
+# '{integer_division}' is '/' in SQLite, but a float division in DuckDB
+_DURATION_VS_RANK_BY_GENRE = '''
+    SELECT
+        Genre,
+        AVG(Rank) AS AvgRank,
+        SUM(EpisodeCountPerPodcast * AvgDurationMsPerPodcast) / SUM(EpisodeCountPerPodcast) AS WeightedAvgDurationMs
+    FROM (
+        SELECT
+            Podcasts.Genre, COUNT(*) {integer_division} RankingsCount AS EpisodeCountPerPodcast,
+            AVG(Rank) AS Rank,
+            AVG(Episodes.DurationMs) as AvgDurationMsPerPodcast
+        FROM Episodes
+        INNER JOIN RankedPodcasts ON Episodes.PodcastId = RankedPodcasts.PodcastId
+        INNER JOIN Rankings ON RankedPodcasts.RankingId = Rankings.Id
+        INNER JOIN Podcasts ON Episodes.PodcastId = Podcasts.Id
+        INNER JOIN (
+            SELECT PodcastId, COUNT(*) AS RankingsCount
+            FROM RankedPodcasts
+            GROUP BY PodcastId
+        ) AS RankingsPerPodcast ON RankingsPerPodcast.PodcastId = Episodes.PodcastId
+        WHERE Podcasts.Genre <> 'Unknown'
+        GROUP BY Episodes.PodcastId, Podcasts.Genre, RankingsCount
+    )
+    GROUP BY Genre;
+'''
+
+QUERY_CATALOG.register('duration_vs_rank_by_genre', _DURATION_VS_RANK_BY_GENRE.format(integer_division='/'), dialects={
+    'duckdb': _DURATION_VS_RANK_BY_GENRE.format(integer_division='//')
+})
 
 # analyzes the average durations of podcasts in the rankings
 class PodcastDurationAnalyzer(PodcastAnalyzer):
-    def __init__(self, connection_string: str, theme: str, palette: str) -> None:
-        super().__init__(connection_string, theme, palette)
+    def __init__(self, connection_string: str, theme: str, palette: str, backend: Optional[QueryBackend] = None) -> None:
+        super().__init__(connection_string, theme, palette, backend)
     
     def capabilities(self) -> List[Callable[[], AnalyzerResult]]:
         return [
@@ -29,52 +115,37 @@ class PodcastDurationAnalyzer(PodcastAnalyzer):
             self.duration_by_rank,
             self.duration_vs_episode_count_by_genre_scatter
         ]
+
+    def preview_estimates(self) -> Dict[str, PreviewEstimate]:
+        return {
+            'duration_by_rank_cluster': PreviewEstimate(keys=['RankCluster']),
+            # per podcast values, the sample only decides which podcasts are included
+            'duration_by_rank': PreviewEstimate(keys=['Id', 'AvgDurationMs', 'AvgRank', 'CountryCount']),
+            'duration_vs_episode_count_by_genre_scatter': PreviewEstimate(keys=['EpisodeCount', 'AvgDurationMs'])
+        }
     
     # returns the average duration of podcasts in the rankings by average rank over all rankings
-    # we are only interested in the rankings that contain "All" genres (i.e. the overall rankings)
+    # we are only interested in the rankings that contain 'All' genres (i.e. the overall rankings)
     # If a podcast is not in a country-specifc top 200 ranking, it is assigned a rank of 201
     def duration_by_rank(self) -> AnalyzerResult:
-        data: DataFrame = pd.read_sql_query(f'''
-        SELECT 
-            Podcasts.Id,
-            Podcasts.ShowName AS PodcastName,
-            AllTheDurations.AvgDurationMs AS AvgDurationMs,
-            AVG(AllTheRanks.Rank) AS AvgRank,
-            AllTheCountryCounts.CountryCount AS CountryCount
-        FROM Podcasts
-        INNER JOIN (SELECT COUNT(*) AS CountryCount, RankedPodcasts.PodcastId as PodcastId
-            FROM RankedPodcasts
-            INNER JOIN Rankings on Rankings.Id = RankedPodcasts.RankingId
-            INNER JOIN Podcasts on Podcasts.Id = RankedPodcasts.PodcastId
-            WHERE Rankings.Genre = 'All'
-            GROUP BY RankedPodcasts.PodcastId) 
-        AS AllTheCountryCounts ON Podcasts.Id = AllTheCountryCounts.PodcastId
-        INNER JOIN (SELECT Podcasts.Id as PodcastId, AVG(Episodes.DurationMs) AS AvgDurationMs
-            FROM Podcasts
-            INNER JOIN Episodes ON Podcasts.Id = Episodes.PodcastId
-            GROUP BY PodcastId)
-        AS AllTheDurations ON Podcasts.Id = AllTheDurations.PodcastId
-        INNER JOIN (SELECT Podcasts.Id as PodcastId, 200 * (SELECT COUNT(*) FROM Rankings WHERE Genre = 'All') as Rank
-            FROM Podcasts
-            CROSS JOIN Rankings
-            LEFT JOIN RankedPodcasts ON Rankings.Id = RankedPodcasts.RankingId AND RankedPodcasts.PodcastId = Podcasts.Id
-            WHERE COALESCE(Rankings.Genre, 'All') = 'All' AND RankedPodcasts.PodcastId IS NULL
-            UNION ALL
-            SELECT Podcasts.Id as PodcastId, RankedPodcasts.Rank as Rank
-            FROM Podcasts
-            INNER JOIN RankedPodcasts on RankedPodcasts.PodcastId = Podcasts.Id
-            INNER JOIN Rankings on Rankings.Id = RankedPodcasts.RankingId) 
-        AS AllTheRanks ON Podcasts.Id = AllTheRanks.PodcastId
-        GROUP BY Podcasts.Id
-        ORDER BY AvgRank ASC;
-        ''', self._engine)
+        matrix: RankMatrix = RankMatrix.for_backend(self._backend)
+        overall_rankings: np.ndarray = matrix.ranking_mask(genre='All')
+        # the average includes the ranks in all rankings, every missing overall ranking counts as
+        # 200 * <number of overall rankings> (this is how the original cross join query filled the gaps)
+        ranks: DataFrame = DataFrame({
+            'Id': matrix.podcast_ids(),
+            'AvgRank': matrix.average_ranks(matrix.ranking_mask(), overall_rankings, 200 * int(overall_rankings.sum())),
+            'CountryCount': matrix.rank_sums(overall_rankings)[1].astype(int)
+        })
+        # only podcasts that are ranked in at least one overall ranking
+        ranks = ranks[ranks['CountryCount'] > 0]
+        data: DataFrame = self._query('duration_by_rank').merge(ranks, on='Id', how='inner')
+        data = data[['Id', 'PodcastName', 'AvgDurationMs', 'AvgRank', 'CountryCount']].sort_values(by='AvgRank', kind='mergesort').reset_index(drop=True)
 
         def render(result: AnalyzerResult) -> Figure:
             data: DataFrame = result.get_data_frame()
-            # Set the style of seaborn
-            sns.set_theme(style=self._theme)
 
-            fig, ax = plt.subplots()
+            fig, ax = create_figure()
             # Create a scatter plot
             sns.scatterplot(
                 x="AvgRank",  # X-axis: Average Rank
@@ -100,30 +171,22 @@ class PodcastDurationAnalyzer(PodcastAnalyzer):
             fig.tight_layout()
             return fig
 
-        return AnalyzerResult(data, render)
+        return AnalyzerResult(data, render, self._theme)
 
     # returns the average duration of podcasts in the rankings clustered grouped by clusters of 10 ranks
     # e.g. if there are 200 podcasts in the rankings, the first 10 podcasts are in cluster 0, the next 10 are in cluster 1, etc.
-    # we are only interested in the rankings that contain "All" genres
+    # we are only interested in the rankings that contain 'All' genres
     def duration_by_rank_cluster(self, cluster_size: int = 10) -> AnalyzerResult:
-        data: DataFrame = pd.read_sql_query(f'''
-            SELECT 
-                AVG(DurationMs) as AvgDurationMs,
-                -- CEILING(Rank / {cluster_size}), including upperbound as RankCluster
-                (cast((Rank - 1)/{cluster_size} as int) + ((Rank - 1)/{cluster_size} > cast((Rank - 1)/{cluster_size} as int))) + 1 as RankCluster
-            FROM RankedPodcasts
-            INNER JOIN Episodes ON RankedPodcasts.PodcastId = Episodes.PodcastId
-            INNER JOIN Rankings ON RankedPodcasts.RankingId = Rankings.Id
-            WHERE Rankings.Genre = 'All'
-            GROUP BY RankCluster
-        ''', self._engine)
+        durations: DataFrame = self._aggregate(DURATIONS_BY_RANK_AND_REGION)
+        # CEILING(Rank / cluster_size), including upperbound as RankCluster
+        durations['RankCluster'] = (durations['Rank'] - 1) // cluster_size + 1
+        durations = durations.groupby('RankCluster', as_index=False)[['DurationSum', 'DurationCount']].sum()
+        data: DataFrame = DataFrame({'AvgDurationMs': durations['DurationSum'] / durations['DurationCount'], 'RankCluster': durations['RankCluster']})
 
         def render(result: AnalyzerResult) -> Figure:
             data: DataFrame = result.get_data_frame()
-            # Set the style of seaborn
-            sns.set_theme(style=self._theme)
 
-            fig, ax = plt.subplots()
+            fig, ax = create_figure()
             # Create a bar plot
             sns.barplot(data=data, x='RankCluster', y='AvgDurationMs', palette=self._palette, ax=ax)
             ax.set_xlabel(f'Rank Cluster (Grouped by {cluster_size} Ranks)')
@@ -134,28 +197,19 @@ class PodcastDurationAnalyzer(PodcastAnalyzer):
             fig.tight_layout()
             return fig
 
-        return AnalyzerResult(data, render)
+        return AnalyzerResult(data, render, self._theme)
     
     # returns the average duration of podcasts in the rankings grouped by region
     def duration_by_region(self) -> AnalyzerResult:
-        data = pd.read_sql_query('''
-            SELECT
-                AVG(DurationMs) AS AvgDurationMs,
-                Country
-            FROM RankedPodcasts
-            INNER JOIN Episodes ON RankedPodcasts.PodcastId = Episodes.PodcastId
-            INNER JOIN Rankings ON RankedPodcasts.RankingId = Rankings.Id
-            WHERE Rankings.Genre = 'All'
-            GROUP BY Country
-            ORDER BY AvgDurationMs DESC
-        ''', self._engine)
+        durations: DataFrame = self._aggregate(DURATIONS_BY_RANK_AND_REGION)
+        durations = durations.groupby('Country', as_index=False)[['DurationSum', 'DurationCount']].sum()
+        data: DataFrame = DataFrame({'AvgDurationMs': durations['DurationSum'] / durations['DurationCount'], 'Country': durations['Country']})
+        data = data.sort_values(by='AvgDurationMs', ascending=False, kind='mergesort').reset_index(drop=True)
 
         def render(result: AnalyzerResult) -> Figure:
             data: DataFrame = result.get_data_frame()
-            # Set the style of seaborn
-            sns.set_theme(style=self._theme)
 
-            fig, ax = plt.subplots()
+            fig, ax = create_figure()
             # Create a bar plot
             sns.barplot(data=data, x='Country', y='AvgDurationMs', palette=self._palette, ax=ax)
             ax.set_xlabel('Country')
@@ -166,29 +220,22 @@ class PodcastDurationAnalyzer(PodcastAnalyzer):
             fig.tight_layout()
             return fig
         
-        return AnalyzerResult(data, render)
+        return AnalyzerResult(data, render, self._theme)
     
     # returns the average duration of podcasts in the rankings grouped by Podcasts.genre (if genre is not "Unknown")
     def duration_by_genre(self) -> AnalyzerResult:
-        data: DataFrame = pd.read_sql_query('''
-            SELECT
-                AVG(Episodes.DurationMs) AS AvgDurationMs,
-                Podcasts.Genre AS Genre
-            FROM Episodes
-            INNER JOIN Podcasts ON Episodes.PodcastId = Podcasts.Id
-            WHERE Podcasts.Genre <> 'Unknown'
-            GROUP BY Podcasts.Genre
-            ORDER BY AvgDurationMs DESC
-        ''', self._engine)
+        data: DataFrame = self._query('duration_by_genre')
+        units: DataFrame = self._query('bootstrap.podcast_durations')
+        units = units[units['Genre'] != 'Unknown']
+        data = data.merge(self._ratio_intervals(units, ['Genre'], 'DurationSum', 'DurationCount', 'AvgDurationMs'), on='Genre', how='left')
         
         def render(result: AnalyzerResult) -> Figure:
             data: DataFrame = result.get_data_frame()
-            # Set the style of seaborn
-            sns.set_theme(style=self._theme)
 
-            fig, ax = plt.subplots()
+            fig, ax = create_figure()
             # Create a bar plot
             sns.barplot(data=data, x='Genre', y='AvgDurationMs', palette=self._palette, ax=ax)
+            self._interval_error_bars(ax, data, 'AvgDurationMs')
             ax.set_xlabel('Genre')
             ax.set_ylabel('Average Podcast Duration')
             ax.set_title('Average Podcast Duration Clustered by Genre')
@@ -198,29 +245,21 @@ class PodcastDurationAnalyzer(PodcastAnalyzer):
             fig.tight_layout()
             return fig
         
-        return AnalyzerResult(data, render)
+        return AnalyzerResult(data, render, self._theme)
     
     # returns the average duration of podcasts in the rankings grouped by Podcasts.genre (if genre is not "Unknown")
     # and then clustered by region. Only include countries that have rankings for all genres
     def duration_by_genre_and_region(self) -> AnalyzerResult:
-        data: DataFrame = pd.read_sql_query('''
-            SELECT
-                AVG(Episodes.DurationMs) AS AvgDurationMs,
-                Podcasts.Genre AS Genre,
-                Rankings.Country AS Country
-            FROM Episodes
-            INNER JOIN Podcasts ON Episodes.PodcastId = Podcasts.Id
-            INNER JOIN RankedPodcasts ON Episodes.PodcastId = RankedPodcasts.PodcastId
-            INNER JOIN Rankings ON RankedPodcasts.RankingId = Rankings.Id
-            WHERE Podcasts.Genre <> 'Unknown' 
-                AND Rankings.Country IN (
-                    SELECT Country FROM (
-                        SELECT Country, COUNT(*) AS Count FROM Rankings WHERE Genre <> 'All' GROUP BY Country
-                    )
-                )
-            GROUP BY Podcasts.Genre, Rankings.Country
-            ORDER BY AvgDurationMs DESC
-        ''', self._engine)
+        # duration sums and counts of the episodes of the podcasts in any ranking (see AggregateCube)
+        durations: DataFrame = self._roll_up(['Genre', 'Country'], ['DurationSum', 'DurationCount', 'EpisodeCount'], where={'Genre': lambda genre: genre != 'Unknown'})
+        durations = durations[(durations['EpisodeCount'] > 0) & durations['Country'].isin(self._genre_ranking_countries())]
+        data: DataFrame = DataFrame({'AvgDurationMs': durations['DurationSum'] / durations['DurationCount'], 'Genre': durations['Genre'], 'Country': durations['Country']})
+        # every podcast counts with its episodes once per entry in the rankings of the country
+        units: DataFrame = CellBootstrap.ranked_podcasts(self._backend)
+        units = units[units['Genre'] != 'Unknown'].assign(DurationSum=lambda units: units['Entries'] * units['DurationSum'], DurationCount=lambda units: units['Entries'] * units['DurationCount'])
+        units = units.groupby(['PodcastId', 'Genre', 'Country'], as_index=False)[['DurationSum', 'DurationCount']].sum()
+        data = data.merge(self._ratio_intervals(units, ['Genre', 'Country'], 'DurationSum', 'DurationCount', 'AvgDurationMs'), on=['Genre', 'Country'], how='left')
+        data = data.sort_values(by='AvgDurationMs', ascending=False, kind='mergesort').reset_index(drop=True)
 
         def render(result: AnalyzerResult) -> Figure:
             data: DataFrame = result.get_data_frame()
@@ -228,13 +267,13 @@ class PodcastDurationAnalyzer(PodcastAnalyzer):
             # Pivot the data to create a pivot table with Genre and Country as indices
             pivot_data: DataFrame = data.pivot_table(index='Genre', columns='Country', values='AvgDurationMs')
 
-            # Set the style of seaborn
-            sns.set_theme(style=self._theme)
-
             # Calculate the absolute minimum and maximum values of AvgDurationMs
             abs_min = pivot_data[pivot_data >= 0].min().min()
             abs_max = pivot_data.max().max()
 
+            # the intervals are annotated in minutes, as two further times would not fit into the cells
+            has_intervals: bool = 'AvgDurationMsLower' in data.columns and bool(data['AvgDurationMsLower'].notna().any())
+
             # Legend for the colorbar
             cbar_kws = {
                 'label': 'Avg Podcast Duration',
@@ -243,16 +282,18 @@ class PodcastDurationAnalyzer(PodcastAnalyzer):
             }
 
             # Create a clustermap with the data
-            cluster_grid = sns.clustermap(
+            cluster_grid = create_cluster_grid(
                 data=pivot_data, 
                 cmap=self._palette + '_r', 
-                annot=True, 
+                annot=self._interval_annotations(data, pivot_data, 'AvgDurationMs', lambda millis: self._format_time(millis, None), lambda millis: f'{millis / 60000:.1f}'), 
                 vmin=abs_min, 
                 vmax=abs_max, 
                 cbar_kws=cbar_kws,
-                annot_kws={'alpha': 0.75})
+                fmt='',
+                figsize=(12, 14) if has_intervals else (10, 10),
+                annot_kws={'alpha': 0.75, 'fontsize': 9} if has_intervals else {'alpha': 0.75})
             
-            cluster_grid.ax_heatmap.set_title('Relation of Podcast Duration, Genre, and Region')
+            cluster_grid.ax_heatmap.set_title('Relation of Podcast Duration, Genre, and Region' + ('\n(confidence intervals in minutes)' if has_intervals else ''))
             cluster_grid.ax_heatmap.set_xlabel('Country')
             cluster_grid.ax_heatmap.set_ylabel('Genre')
 
@@ -260,33 +301,18 @@ class PodcastDurationAnalyzer(PodcastAnalyzer):
             cluster_grid.ax_row_dendrogram.set_visible(False)
             cluster_grid.ax_col_dendrogram.set_visible(False)
 
-            for t in cluster_grid.ax_heatmap.texts: 
-                t.set_text(self._format_time(float(t.get_text()), None))
-
             return cluster_grid.fig
         
-        return AnalyzerResult(data, render)
+        return AnalyzerResult(data, render, self._theme)
     
     # returns the average duration and average number of episodes of the podcasts in the rankings grouped by Podcasts.genre (if genre is not "Unknown")
     def duration_vs_episode_count_by_genre_scatter(self) -> AnalyzerResult:
-        data: DataFrame = pd.read_sql_query('''
-            SELECT 
-                Genre,
-                COUNT(*) AS EpisodeCount, 
-                AVG(Episodes.DurationMs) AS AvgDurationMs
-            FROM Episodes
-            INNER JOIN Podcasts ON Episodes.PodcastId = Podcasts.Id
-            WHERE Podcasts.Genre <> 'Unknown'
-            GROUP BY PodcastId
-        ''', self._engine)
+        data: DataFrame = self._query('duration_vs_episode_count_by_genre_scatter')
 
         def render(result: AnalyzerResult) -> Figure:
             data: DataFrame = result.get_data_frame()
 
-            # Set the style of seaborn
-            sns.set_theme(style=self._theme)
-
-            fig, ax = plt.subplots()
+            fig, ax = create_figure()
             # Create a scatter plot
             sns.scatterplot(
                 x="AvgDurationMs",  # X-axis: Average Duration of Episodes
@@ -312,61 +338,22 @@ class PodcastDurationAnalyzer(PodcastAnalyzer):
             fig.tight_layout()
             return fig
         
-        return AnalyzerResult(data, render)
+        return AnalyzerResult(data, render, self._theme)
     
     # returns the average duration and average number of episodes of the podcasts in the rankings grouped by Podcasts.genre (if genre is not "Unknown")
     def duration_vs_episode_count_by_genre(self) -> AnalyzerResult:
-        data: DataFrame = pd.read_sql_query('''
-            SELECT 
-                Genre, 
-                AVG(EpisodeCountPerPodcast) AS AvgEpisodes,
-                SUM(EpisodeCountPerPodcast * AvgDurationMsPerPodcast) / SUM(EpisodeCountPerPodcast) AS WeightedAvgDurationMs
-            FROM (
-                SELECT PodcastId, Genre, COUNT(*) AS EpisodeCountPerPodcast, AVG(Episodes.DurationMs) AS AvgDurationMsPerPodcast
-                FROM Episodes
-                INNER JOIN Podcasts ON Episodes.PodcastId = Podcasts.Id
-                WHERE Podcasts.Genre <> 'Unknown'
-                GROUP BY PodcastId
-            )
-            GROUP BY Genre;
-        ''', self._engine)
+        data: DataFrame = self._query('duration_vs_episode_count_by_genre')
         
         return DurationGenreClassifierModel(self, data)
 
     # returns the average duration and average rank of the podcasts in all the rankings grouped by Podcasts.genre (if genre is not "Unknown")
     def duration_vs_rank_by_genre(self) -> AnalyzerResult:
-        data: DataFrame = pd.read_sql_query('''
-            SELECT 
-                Genre, 
-                AVG(Rank) AS AvgRank,
-                SUM(EpisodeCountPerPodcast * AvgDurationMsPerPodcast) / SUM(EpisodeCountPerPodcast) AS WeightedAvgDurationMs
-            FROM (
-                SELECT 
-                    Podcasts.Genre, COUNT(*) / RankingsCount AS EpisodeCountPerPodcast, 
-                    AVG(Rank) AS Rank, 
-                    AVG(Episodes.DurationMs) as AvgDurationMsPerPodcast
-                FROM Episodes
-                INNER JOIN RankedPodcasts ON Episodes.PodcastId = RankedPodcasts.PodcastId
-                INNER JOIN Rankings ON RankedPodcasts.RankingId = Rankings.Id
-                INNER JOIN Podcasts ON Episodes.PodcastId = Podcasts.Id
-                INNER JOIN (
-                    SELECT PodcastId, COUNT(*) AS RankingsCount
-                    FROM RankedPodcasts
-                    GROUP BY PodcastId
-                ) AS RankingsPerPodcast ON RankingsPerPodcast.PodcastId = Episodes.PodcastId
-                WHERE Podcasts.Genre <> 'Unknown'
-                GROUP BY Episodes.PodcastId
-            )
-            GROUP BY Genre;
-        ''', self._engine)
+        data: DataFrame = self._query('duration_vs_rank_by_genre')
         
         def render(result: AnalyzerResult) -> Figure:
             data: DataFrame = result.get_data_frame()
 
-            # Set the style of seaborn
-            sns.set_theme(style=self._theme)
-
-            fig, ax = plt.subplots()
+            fig, ax = create_figure()
             # Create a scatter plot
             sns.scatterplot(
                 x="WeightedAvgDurationMs",  # X-axis: Average Duration of Episodes
@@ -407,4 +394,4 @@ class PodcastDurationAnalyzer(PodcastAnalyzer):
             fig.tight_layout()
             return fig
         
-        return AnalyzerResult(data, render)
\ No newline at end of file
+        return AnalyzerResult(data, render, self._theme)
\ No newline at end of file
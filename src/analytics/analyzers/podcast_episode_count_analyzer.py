@@ -1,16 +1,55 @@
-from typing import Callable, List
+from typing import Callable, Dict, List, Optional
 from matplotlib.figure import Figure
 import numpy as np
 import pandas as pd
 from pandas import DataFrame
-import matplotlib.pyplot as plt
+from analyzers.internals.figures import create_cluster_grid, create_figure
 import seaborn as sns
 from analyzers.podcast_analyzer import PodcastAnalyzer
 from analyzers.internals.analyzer_result import AnalyzerResult
+from analyzers.internals.bootstrap import CellBootstrap
+from analyzers.internals.preview_sample import PreviewEstimate
+from analyzers.internals.query_backend import QueryBackend
+from analyzers.internals.query_catalog import QUERY_CATALOG
+
+QUERY_CATALOG.register('episode_count_distribution', '''
+    SELECT
+        COUNT(*) AS Frequency,
+        EpisodeCount
+    FROM (
+        SELECT
+            Podcasts.Id AS PodcastId,
+            COUNT(Episodes.Id) AS EpisodeCount
+        FROM Podcasts
+        INNER JOIN Episodes ON Episodes.PodcastId = Podcasts.Id
+        GROUP BY Podcasts.Id
+    )
+    GROUP BY EpisodeCount
+    ORDER BY EpisodeCount;
+''')
+
+QUERY_CATALOG.register('episode_count_distribution_genre_all', '''
+            SELECT
+                COUNT(*) AS Frequency,
+                EpisodeCount
+            FROM (
+                SELECT
+                    Podcasts.Id AS PodcastId,
+                    COUNT(Episodes.Id) AS EpisodeCount
+                FROM Podcasts
+                INNER JOIN Episodes ON Episodes.PodcastId = Podcasts.Id
+    			INNER JOIN RankedPodcasts on RankedPodcasts.PodcastId = Podcasts.Id
+                INNER JOIN Rankings on Rankings.Id = RankedPodcasts.RankingId
+                where Rankings.Genre = 'All'
+                GROUP BY Podcasts.Id
+            )
+            GROUP BY EpisodeCount
+            ORDER BY EpisodeCount;
+''')
 
 class PodcastEpisodeCountAnalyzer(PodcastAnalyzer):
-    def __init__(self, connection_string: str, theme: str, palette: str) -> None:
-        super().__init__(connection_string, theme, palette)
+    def __init__(self, connection_string: str, theme: str, palette: str, backend: Optional[QueryBackend] = None) -> None:
+        super().__init__(connection_string, theme, palette, backend)
     
     def capabilities(self) -> List[Callable[[], AnalyzerResult]]:
         return [
@@ -18,28 +57,28 @@ class PodcastEpisodeCountAnalyzer(PodcastAnalyzer):
             self.episode_count_distribution,
             self.episode_count_distribution_genre_all
         ]
+
+    def preview_estimates(self) -> Dict[str, PreviewEstimate]:
+        return {
+            'episode_count_distribution': PreviewEstimate(keys=['EpisodeCount'], totals=['Frequency']),
+            'episode_count_distribution_genre_all': PreviewEstimate(keys=['EpisodeCount'], totals=['Frequency'])
+        }
     
     # returns the average podcast episode count of the top 200 genres by region
     # Podcasts with Genre = 'Unknown' are excluded in the analysis
     def episode_count_by_genre_and_region(self) -> AnalyzerResult:
-        data: DataFrame = pd.read_sql_query(f'''
-        SELECT 
-            subquery.genre as Genre, 
-            subquery.country as Country, 
-            (NumEpisodes/NumPublishers) as AvgNumEpisodes
-        from (
-            select 
-                rankings.genre, 
-                rankings.country, 
-                COUNT(Distinct Podcasts.Id) as NumPublishers, 
-                COUNT(Episodes.Id) as NumEpisodes from RankedPodcasts
-            inner join podcasts on Podcasts.Id = RankedPodcasts.PodcastId
-            inner join rankings on Rankings.Id = RankedPodcasts.RankingId
-            inner join Episodes on Episodes.PodcastId = Podcasts.Id
-            where rankings.Genre != 'All'
-            group by rankings.genre, rankings.Country) as subquery
-        order by AvgNumEpisodes DESC
-        ''', self._engine)
+        # the episodes (counted once per ranking entry) and the distinct podcasts with episodes of every genre ranking
+        counts: DataFrame = self._roll_up(['RankingGenre', 'Country'], ['EpisodeCount', 'Podcasts'], where={'RankingGenre': lambda genre: genre != 'All'})
+        counts = counts[counts['Podcasts'] > 0]
+        # the average is truncated to whole episodes
+        data: DataFrame = DataFrame({'Genre': counts['RankingGenre'], 'Country': counts['Country'], 'AvgNumEpisodes': counts['EpisodeCount'] // counts['Podcasts']})
+        # every podcast with episodes counts with its episodes once per entry in the genre ranking of the country.
+        # The interval is the one of the exact (not truncated) average
+        units: DataFrame = CellBootstrap.ranked_podcasts(self._backend)
+        units = units[(units['RankingGenre'] != 'All') & (units['EpisodeCount'] > 0)].assign(EpisodeCount=lambda units: units['Entries'] * units['EpisodeCount'], Podcasts=1)
+        intervals: DataFrame = self._ratio_intervals(units, ['RankingGenre', 'Country'], 'EpisodeCount', 'Podcasts', 'AvgNumEpisodes')
+        data = data.merge(intervals.rename(columns={'RankingGenre': 'Genre'}), on=['Genre', 'Country'], how='left')
+        data = data.sort_values(by='AvgNumEpisodes', ascending=False, kind='mergesort').reset_index(drop=True)
         
         # another clustermap:
         def render(result: AnalyzerResult) -> Figure:
@@ -48,9 +87,6 @@ class PodcastEpisodeCountAnalyzer(PodcastAnalyzer):
             # Pivot the data to create a pivot table with Genre and Country as indices
             pivot_data: DataFrame = data.pivot_table(index='Genre', columns='Country', values='AvgNumEpisodes')
 
-            # Set the style of seaborn
-            sns.set_theme(style=self._theme)
-
             # Calculate the absolute minimum and maximum values of AvgRank
             abs_min = pivot_data[pivot_data >= 0].min().min()
             abs_max = pivot_data.max().max()
@@ -62,7 +98,7 @@ class PodcastEpisodeCountAnalyzer(PodcastAnalyzer):
             }
 
             # Create a clustermap with the data
-            cluster_grid = sns.clustermap(data=pivot_data, cmap=self._palette + '_r', annot=True, vmin=abs_min, vmax=abs_max, cbar_kws=cbar_kws, fmt='g')
+            cluster_grid = create_cluster_grid(data=pivot_data, cmap=self._palette + '_r', annot=self._interval_annotations(data, pivot_data, 'AvgNumEpisodes', lambda value: f'{value:.0f}'), vmin=abs_min, vmax=abs_max, cbar_kws=cbar_kws, fmt='')
             cluster_grid.ax_heatmap.set_xlabel('Country')
             cluster_grid.ax_heatmap.set_ylabel('Genre')
             cluster_grid.ax_heatmap.set_title('Average Podcast Episode Count of Top 200 Genres by Region')
@@ -73,32 +109,16 @@ class PodcastEpisodeCountAnalyzer(PodcastAnalyzer):
 
             return cluster_grid.fig
         
-        return AnalyzerResult(data, render)
+        return AnalyzerResult(data, render, self._theme)
     
     # returns a distribution of the average podcast episode count
     def episode_count_distribution(self) -> AnalyzerResult:
-        data = pd.read_sql_query('''
-        SELECT 
-            COUNT(*) AS Frequency,
-            EpisodeCount
-        FROM (
-            SELECT
-                Podcasts.Id AS PodcastId,
-                COUNT(Episodes.Id) AS EpisodeCount
-            FROM Podcasts
-            INNER JOIN Episodes ON Episodes.PodcastId = Podcasts.Id
-            GROUP BY Podcasts.Id
-        )
-        GROUP BY EpisodeCount
-        ORDER BY EpisodeCount;
-        ''', self._engine)
+        data = self._query('episode_count_distribution')
 
         def render(result: AnalyzerResult) -> Figure:
             data: DataFrame = result.get_data_frame()
-            # Set the style of seaborn
-            sns.set_theme(style=self._theme)
 
-            fig, ax = plt.subplots()
+            fig, ax = create_figure()
             # Create a bar plot
             sns.kdeplot(data=data, x='EpisodeCount', ax=ax)
             ax.set_xlabel('Episode Count')
@@ -113,35 +133,16 @@ class PodcastEpisodeCountAnalyzer(PodcastAnalyzer):
             fig.tight_layout()
             return fig
         
-        return AnalyzerResult(data, render)
+        return AnalyzerResult(data, render, self._theme)
     
         # returns a distribution of the average podcast episode count
     def episode_count_distribution_genre_all(self) -> AnalyzerResult:
-        data = pd.read_sql_query('''
-        SELECT 
-            COUNT(*) AS Frequency,
-            EpisodeCount
-        FROM (
-            SELECT
-                Podcasts.Id AS PodcastId,
-                COUNT(Episodes.Id) AS EpisodeCount
-            FROM Podcasts
-            INNER JOIN Episodes ON Episodes.PodcastId = Podcasts.Id
-			INNER JOIN RankedPodcasts on RankedPodcasts.PodcastId = Podcasts.Id
-            INNER JOIN Rankings on Rankings.Id = RankedPodcasts.RankingId
-            where Rankings.Genre = "All"
-            GROUP BY Podcasts.Id
-        )
-        GROUP BY EpisodeCount
-        ORDER BY EpisodeCount;
-        ''', self._engine)
+        data = self._query('episode_count_distribution_genre_all')
 
         def render(result: AnalyzerResult) -> Figure:
             data: DataFrame = result.get_data_frame()
-            # Set the style of seaborn
-            sns.set_theme(style=self._theme)
 
-            fig, ax = plt.subplots()
+            fig, ax = create_figure()
             # Create a bar plot
             sns.kdeplot(data=data, x='EpisodeCount', ax=ax)
             ax.set_xlabel('Episode Count')
@@ -156,4 +157,4 @@ class PodcastEpisodeCountAnalyzer(PodcastAnalyzer):
             fig.tight_layout()
             return fig
         
-        return AnalyzerResult(data, render)
\ No newline at end of file
+        return AnalyzerResult(data, render, self._theme)
\ No newline at end of file
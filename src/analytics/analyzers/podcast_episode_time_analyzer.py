@@ -1,18 +1,54 @@
-from typing import Callable, List
+from typing import Callable, Dict, List, Optional
 from matplotlib.dates import YearLocator
 from matplotlib.figure import Figure
 from matplotlib.ticker import MultipleLocator
 import numpy as np
 import pandas as pd
 from pandas import DataFrame
-import matplotlib.pyplot as plt
+from analyzers.internals.figures import create_cluster_grid, create_figure
 import seaborn as sns
 from analyzers.podcast_analyzer import PodcastAnalyzer
 from analyzers.internals.analyzer_result import AnalyzerResult
+from analyzers.internals.preview_sample import PreviewEstimate
+from analyzers.internals.query_backend import QueryBackend
+from analyzers.internals.query_catalog import QUERY_CATALOG
+
+# the queries work on the date parts derived once per database version (EpisodeDates): days are counted as
+# differences of EpochDay, first release months are the smallest MonthIndex (Year * 12 + Month - 1) of a podcast
+QUERY_CATALOG.register('episode_time_by_genre_and_region.newest_day', '''
+    select max(EpochDay) as NewestDay
+    from EpisodeDates
+''')
+
+QUERY_CATALOG.register('episode_time_distribution', '''
+    SELECT FirstReleaseMonth AS Date, COUNT(*) AS Uploads
+    FROM (
+        SELECT
+            MIN(MonthIndex) AS FirstReleaseMonth
+        FROM EpisodeDates
+        GROUP BY PodcastId)
+    GROUP BY Date
+    ORDER BY Date ASC
+''')
+
+QUERY_CATALOG.register('episode_time_distribution_genre_all', '''
+    SELECT FirstReleaseMonth AS Date, COUNT(*) AS Uploads
+    FROM (
+        SELECT
+            MIN(MonthIndex) AS FirstReleaseMonth
+        FROM EpisodeDates
+        inner join Podcasts on EpisodeDates.PodcastId = Podcasts.Id
+        inner join RankedPodcasts on RankedPodcasts.PodcastId = Podcasts.Id
+        inner join Rankings on Rankings.Id = RankedPodcasts.RankingId
+        where Rankings.Genre = 'All'
+        GROUP BY EpisodeDates.PodcastId)
+    GROUP BY Date
+    ORDER BY Date ASC
+''')
 
 class PodcastEpisodeTimeAnalyzer(PodcastAnalyzer):
-    def __init__(self, connection_string: str, theme: str, palette: str) -> None:
-        super().__init__(connection_string, theme, palette)
+    def __init__(self, connection_string: str, theme: str, palette: str, backend: Optional[QueryBackend] = None) -> None:
+        super().__init__(connection_string, theme, palette, backend)
     
     def capabilities(self) -> List[Callable[[], AnalyzerResult]]:
         return [
@@ -20,32 +56,33 @@ class PodcastEpisodeTimeAnalyzer(PodcastAnalyzer):
             self.episode_time_distribution,
             self.episode_time_distribution_genre_all
         ]
+
+    def preview_estimates(self) -> Dict[str, PreviewEstimate]:
+        return {
+            'episode_time_distribution': PreviewEstimate(keys=['Date'], totals=['Uploads']),
+            'episode_time_distribution_genre_all': PreviewEstimate(keys=['Date'], totals=['Uploads'])
+        }
     
+    # converts month indexes (Year * 12 + Month - 1) to the first day of the month
+    @staticmethod
+    def __month_start(month_index: pd.Series) -> pd.Series:
+        return pd.to_datetime(DataFrame({'year': month_index // 12, 'month': month_index % 12 + 1, 'day': 1}))
+
     # returns the average time passed in Months since the release of the first episode in the top 200 genres by region
     # Podcasts with Genre = 'Unknown' are excluded in the analysis
     def episode_time_by_genre_and_region(self) -> AnalyzerResult:
-        newestDateData: DataFrame = pd.read_sql_query(f'''
-        select max(ReleaseDate)
-        from Episodes
-        ''', self._engine)
-
-        newestDate = newestDateData.iloc[0].values[0]
-
-        data: DataFrame = pd.read_sql_query(f'''
-        select 
-            round(avg(TimePassed)/365, 2) as AvgTimePassed, 
-            subquery.Genre, 
-            subquery.Country, 
-            subquery.Rank
-        from (
-            select CAST((JULIANDAY('{newestDate}') - JULIANDAY(Episodes.ReleaseDate)) as INT) as TimePassed, Rankings.Genre, Rankings.Country, RankedPodcasts.Rank from Episodes
-            inner join Podcasts on Podcasts.Id = Episodes.PodcastId
-            inner join RankedPodcasts on RankedPodcasts.PodcastId = Podcasts.Id
-            inner join Rankings on Rankings.Id = RankedPodcasts.RankingId
-            where Rankings.Genre != 'All') as subquery
-        group by subquery.Genre, subquery.Country
-        order by AvgTimePassed DESC
-        ''', self._engine)
+        newestDayData: DataFrame = self._query('episode_time_by_genre_and_region.newest_day')
+
+        newestDay: int = int(newestDayData.iloc[0].values[0])
+
+        # the release days of the episodes (counted once per ranking entry) of every genre ranking (see AggregateCube).
+        # The rank is not used by the analysis, but kept in the result (as the best rank of the group)
+        days: DataFrame = self._roll_up(['RankingGenre', 'Country'], ['EpochDaySum', 'EpochDayCount', 'EpisodeCount', 'MinRank'], where={'RankingGenre': lambda genre: genre != 'All'})
+        days = days[days['EpisodeCount'] > 0]
+        # the days passed are summed up exactly before averaging
+        time_passed: pd.Series = (newestDay * days['EpochDayCount'] - days['EpochDaySum']) / days['EpochDayCount'].where(days['EpochDayCount'] > 0)
+        data: DataFrame = DataFrame({'AvgTimePassed': (time_passed / 365).round(2), 'Genre': days['RankingGenre'], 'Country': days['Country'], 'Rank': days['MinRank'].astype(np.int64)})
+        data = data.sort_values(by='AvgTimePassed', ascending=False, kind='mergesort').reset_index(drop=True)
         
         # another clustermap:
         def render(result: AnalyzerResult) -> Figure:
@@ -54,9 +91,6 @@ class PodcastEpisodeTimeAnalyzer(PodcastAnalyzer):
             # Pivot the data to create a pivot table with Genre and Country as indices
             pivot_data: DataFrame = data.pivot_table(index='Genre', columns='Country', values='AvgTimePassed')
 
-            # Set the style of seaborn
-            sns.set_theme(style=self._theme)
-
             # Calculate the absolute minimum and maximum values of AvgRank
             abs_min = pivot_data[pivot_data >= 0].min().min()
             abs_max = pivot_data.max().max()
@@ -68,7 +102,7 @@ class PodcastEpisodeTimeAnalyzer(PodcastAnalyzer):
             }
 
             # Create a clustermap with the data
-            cluster_grid = sns.clustermap(data=pivot_data, cmap=self._palette + '_r', annot=True, vmin=abs_min, vmax=abs_max, cbar_kws=cbar_kws, fmt='g')
+            cluster_grid = create_cluster_grid(data=pivot_data, cmap=self._palette + '_r', annot=True, vmin=abs_min, vmax=abs_max, cbar_kws=cbar_kws, fmt='g')
             cluster_grid.ax_heatmap.set_xlabel('Country')
             cluster_grid.ax_heatmap.set_ylabel('Genre')
             cluster_grid.ax_heatmap.set_title('Average Time passed since First Podcast Episode in the Top 200 Genres by Region')
@@ -79,22 +113,13 @@ class PodcastEpisodeTimeAnalyzer(PodcastAnalyzer):
 
             return cluster_grid.fig
         
-        return AnalyzerResult(data, render)
+        return AnalyzerResult(data, render, self._theme)
     
     # returns a distribution of the release months of the number of first podcast episodes released every month
     def episode_time_distribution(self) -> AnalyzerResult:
-        data: DataFrame = pd.read_sql_query(f'''
-            SELECT FirstReleaseMonth AS Date, COUNT(*) AS Uploads 
-            FROM (
-                SELECT 
-                    strftime('%Y-%m', MIN(ReleaseDate)) AS FirstReleaseMonth
-                FROM Episodes
-                GROUP BY PodcastId)
-            GROUP BY Date
-            ORDER BY Date ASC
-        ''', self._engine)
-
-        data['Date'] = pd.to_datetime(data['Date'], format='%Y-%m')
+        data: DataFrame = self._query('episode_time_distribution')
+
+        data['Date'] = PodcastEpisodeTimeAnalyzer.__month_start(data['Date'])
 
         # calculate the time passed since the the latest entry in the data and all other entries
         # (How much time has passed since the first podcast episode was released and 'now' (the latest entry in the data))
@@ -102,10 +127,8 @@ class PodcastEpisodeTimeAnalyzer(PodcastAnalyzer):
 
         def render(result: AnalyzerResult) -> Figure:
             data: DataFrame = result.get_data_frame()
-            # Set the style of seaborn
-            sns.set_theme(style=self._theme)
 
-            fig, ax = plt.subplots()
+            fig, ax = create_figure()
             # Create a bar plot
             sns.kdeplot(data=data, x='Date', ax=ax)
             ax.set_xlabel('Years Passed since First Release')
@@ -120,26 +143,13 @@ class PodcastEpisodeTimeAnalyzer(PodcastAnalyzer):
             fig.tight_layout()
             return fig
         
-        return AnalyzerResult(data, render)
+        return AnalyzerResult(data, render, self._theme)
     
     # returns a distribution of the release months of the number of first podcast episodes released every month
     def episode_time_distribution_genre_all(self) -> AnalyzerResult:
-        data: DataFrame = pd.read_sql_query(f'''
-        SELECT FirstReleaseMonth AS Date, COUNT(*) AS Uploads 
-        FROM (
-            SELECT 
-                strftime('%Y-%m', MIN(ReleaseDate)) AS FirstReleaseMonth
-            FROM Episodes
-            inner join Podcasts on Episodes.PodcastId = Podcasts.Id
-            inner join RankedPodcasts on RankedPodcasts.PodcastId = Podcasts.Id
-            inner join Rankings on Rankings.Id = RankedPodcasts.RankingId
-            where Rankings.Genre = "All"
-            GROUP BY Episodes.PodcastId)
-        GROUP BY Date
-        ORDER BY Date ASC
-        ''', self._engine)
-
-        data['Date'] = pd.to_datetime(data['Date'], format='%Y-%m')
+        data: DataFrame = self._query('episode_time_distribution_genre_all')
+
+        data['Date'] = PodcastEpisodeTimeAnalyzer.__month_start(data['Date'])
 
         # calculate the time passed since the the latest entry in the data and all other entries
         # (How much time has passed since the first podcast episode was released and 'now' (the latest entry in the data))
@@ -147,10 +157,8 @@ class PodcastEpisodeTimeAnalyzer(PodcastAnalyzer):
 
         def render(result: AnalyzerResult) -> Figure:
             data: DataFrame = result.get_data_frame()
-            # Set the style of seaborn
-            sns.set_theme(style=self._theme)
 
-            fig, ax = plt.subplots()
+            fig, ax = create_figure()
             # Create a bar plot
             sns.kdeplot(data=data, x='Date', ax=ax)
             ax.set_xlabel('Years Passed')
@@ -165,4 +173,4 @@ class PodcastEpisodeTimeAnalyzer(PodcastAnalyzer):
             fig.tight_layout()
             return fig
         
-        return AnalyzerResult(data, render)
\ No newline at end of file
+        return AnalyzerResult(data, render, self._theme)
\ No newline at end of file
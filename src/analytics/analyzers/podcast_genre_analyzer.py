@@ -1,17 +1,26 @@
-from typing import Callable, List
+from typing import Callable, Dict, List, Optional
 from matplotlib import colors
 from matplotlib.figure import Figure
 import numpy as np
 import pandas as pd
 from pandas import DataFrame
-import matplotlib.pyplot as plt
+from analyzers.internals.figures import create_cluster_grid, create_figure
 import seaborn as sns
 from analyzers.podcast_analyzer import PodcastAnalyzer
 from analyzers.internals.analyzer_result import AnalyzerResult
+from analyzers.internals.bootstrap import CellBootstrap
+from analyzers.internals.preview_sample import PreviewEstimate
+from analyzers.internals.query_backend import QueryBackend
+from analyzers.internals.query_catalog import QUERY_CATALOG
+
+QUERY_CATALOG.register('podcast_genres', '''
+    SELECT DISTINCT Genre
+    FROM Podcasts
+''')
 
 class PodcastGenreAnalyzer(PodcastAnalyzer):
-    def __init__(self, connection_string: str, theme: str, palette: str) -> None:
-        super().__init__(connection_string, theme, palette)
+    def __init__(self, connection_string: str, theme: str, palette: str, backend: Optional[QueryBackend] = None) -> None:
+        super().__init__(connection_string, theme, palette, backend)
     
     def capabilities(self) -> List[Callable[[], AnalyzerResult]]:
         return [
@@ -20,31 +29,63 @@ class PodcastGenreAnalyzer(PodcastAnalyzer):
             self.genre_vs_presence_by_region,
             self.genre_vs_populatity_by_region
         ]
+
+    def preview_estimates(self) -> Dict[str, PreviewEstimate]:
+        return {
+            'genre_vs_presence_by_region': PreviewEstimate(totals=['NumPodcasts']),
+            'genre_vs_populatity_by_region': PreviewEstimate(totals=['NumPodcasts'])
+        }
     
+    # rank sums and entry counts of the podcasts in the overall ('All') rankings by podcast genre and country
+    def __overall_ranks(self) -> DataFrame:
+        return self._roll_up(['Genre', 'Country'], ['RankSum', 'Entries'], where={'RankingGenre': lambda genre: genre == 'All'})
+
+    # the ranked podcasts (except genre 'Unknown') of the overall rankings by country, the units of the rank intervals
+    def __overall_ranked_podcasts(self) -> DataFrame:
+        units: DataFrame = CellBootstrap.ranked_podcasts(self._backend)
+        return units[(units['RankingGenre'] == 'All') & (units['Genre'] != 'Unknown')]
+
+    # returns all combinations of the given podcast genres and countries
+    def __genre_country_cells(self, genres: List[str], countries: List[str]) -> DataFrame:
+        return pd.MultiIndex.from_product([genres, countries], names=['Genre', 'Country']).to_frame(index=False)
+
+    # returns the average rank of each genre (except 'Unknown') in the overall rankings of every country with genre rankings.
+    # genre-country pairs without any ranked podcasts are assigned a rank of 201
+    def __rank_by_region(self) -> DataFrame:
+        genres: List[str] = [genre for genre in self._query('podcast_genres')['Genre'] if genre != 'Unknown']
+        cells: DataFrame = self.__genre_country_cells(genres, self._genre_ranking_countries())
+        data: DataFrame = cells.merge(self.__overall_ranks(), on=['Genre', 'Country'], how='left')
+        data['AvgRank'] = (data['RankSum'] / data['Entries']).fillna(201)
+        # pairs without ranked podcasts have no interval
+        data = data.merge(self._ratio_intervals(self.__overall_ranked_podcasts(), ['Genre', 'Country'], 'RankSum', 'Entries', 'AvgRank'), on=['Genre', 'Country'], how='left')
+        return data[['Genre', 'Country', 'AvgRank', 'AvgRankLower', 'AvgRankUpper']].sort_values(by='AvgRank', kind='mergesort').reset_index(drop=True)
+
+    # returns the number of ranked podcasts of each genre in the overall rankings of every country with genre rankings.
+    # genre-country pairs without any ranked podcasts are assigned missing_count podcasts
+    def __presence_by_region(self, missing_count: int) -> DataFrame:
+        genres: List[str] = self._query('podcast_genres')['Genre'].tolist()
+        cells: DataFrame = self.__genre_country_cells(genres, self._genre_ranking_countries(require_overall_ranking=True))
+        data: DataFrame = cells.merge(self.__overall_ranks(), on=['Genre', 'Country'], how='left')
+        data['NumPodcasts'] = data['Entries'].fillna(missing_count).astype(int)
+        return data[['Genre', 'Country', 'NumPodcasts']].sort_values(by='NumPodcasts', ascending=False, kind='mergesort').reset_index(drop=True)
+
     # returns the average rank of each genre over all 'total' rankings (Genre = 'All') over all regions
     # Podcasts with Genre = 'Unknown' are excluded from the analysis
     def genre_vs_rank(self) -> AnalyzerResult:
-        data: DataFrame = pd.read_sql_query(f'''
-            SELECT Genre, Avg(Rank) AS AvgRank
-            FROM (
-                SELECT Podcasts.Genre, RankedPodcasts.Rank
-                FROM RankedPodcasts
-                JOIN Podcasts ON RankedPodcasts.PodcastId = Podcasts.Id
-                JOIN Rankings ON RankedPodcasts.RankingId = Rankings.Id
-                WHERE Podcasts.Genre <> 'Unknown' AND Rankings.Genre = 'All'
-            )
-            GROUP BY Genre
-            ORDER BY AvgRank ASC
-            ''', self._engine)
+        ranks: DataFrame = self._roll_up(['Genre'], ['RankSum', 'Entries'], where={'Genre': lambda genre: genre != 'Unknown', 'RankingGenre': lambda genre: genre == 'All'})
+        data: DataFrame = DataFrame({'Genre': ranks['Genre'], 'AvgRank': ranks['RankSum'] / ranks['Entries']})
+        # every podcast counts with all of its entries in the overall rankings of all countries
+        units: DataFrame = self.__overall_ranked_podcasts().groupby(['PodcastId', 'Genre'], as_index=False)[['RankSum', 'Entries']].sum()
+        data = data.merge(self._ratio_intervals(units, ['Genre'], 'RankSum', 'Entries', 'AvgRank'), on='Genre', how='left')
+        data = data.sort_values(by='AvgRank', kind='mergesort').reset_index(drop=True)
         
         def render(result: AnalyzerResult) -> Figure:
             data: DataFrame = result.get_data_frame()
-            # Set the style of seaborn
-            sns.set_theme(style=self._theme)
 
-            fig, ax = plt.subplots()
+            fig, ax = create_figure()
             # Create a bar plot
             sns.barplot(data=data, x='Genre', y='AvgRank', palette=self._palette + '_r', ax=ax)
+            self._interval_error_bars(ax, data, 'AvgRank')
             ax.set_xlabel('Genre')
             ax.set_ylabel('Average Rank')
             ax.set_title('Average Rank of Podcasts by Genre')
@@ -52,33 +93,12 @@ class PodcastGenreAnalyzer(PodcastAnalyzer):
             fig.tight_layout()
             return fig
         
-        return AnalyzerResult(data, render)
+        return AnalyzerResult(data, render, self._theme)
     
     # returns the average rank of each genre over all 'total' rankings (Genre = 'All') clustered by region
     # Podcasts with Genre = 'Unknown' are excluded from the analysis. Only regions with genre rankings are included
     def genre_vs_rank_by_region(self) -> AnalyzerResult:
-        data = pd.read_sql_query(f'''
-        SELECT subquery.Genre, subquery.Country, COALESCE(AvgRank, 201) AS AvgRank
-        FROM (
-            SELECT DISTINCT Podcasts.Genre, Rankings.Country
-            FROM Podcasts, Rankings
-            WHERE Podcasts.Genre <> 'Unknown' AND Rankings.Genre <> 'All'
-        ) AS subquery
-        LEFT JOIN (
-            SELECT Podcasts.Genre, Country, AVG(Rank) AS AvgRank
-            FROM RankedPodcasts 
-            INNER JOIN Rankings ON Rankings.Id = RankedPodcasts.RankingId
-            INNER JOIN Podcasts ON Podcasts.Id = RankedPodcasts.PodcastId
-            WHERE Rankings.Genre = "All"
-            AND Podcasts.Genre <> 'Unknown' 
-            AND Rankings.Country IN (
-                SELECT DISTINCT Country FROM Rankings WHERE Genre <> 'All'
-            )
-            GROUP BY Podcasts.Genre, Country
-        ) AS existing_query
-        ON subquery.Genre = existing_query.Genre AND subquery.Country = existing_query.Country
-        ORDER BY AvgRank ASC
-        ''', self._engine)
+        data: DataFrame = self.__rank_by_region()
         
         def render(result: AnalyzerResult) -> Figure:
             data: DataFrame = result.get_data_frame()
@@ -86,9 +106,6 @@ class PodcastGenreAnalyzer(PodcastAnalyzer):
             # Pivot the data to create a pivot table with Genre and Country as indices
             pivot_data: DataFrame = data.pivot_table(index='Genre', columns='Country', values='AvgRank')
 
-            # Set the style of seaborn
-            sns.set_theme(style=self._theme)
-
             # Calculate the absolute minimum and maximum values of AvgRank
             abs_min = pivot_data[pivot_data >= 0].min().min()
             abs_max = pivot_data.max().max()
@@ -100,14 +117,14 @@ class PodcastGenreAnalyzer(PodcastAnalyzer):
             }
 
             # Create a clustermap with the data
-            cluster_grid = sns.clustermap(
+            cluster_grid = create_cluster_grid(
                 data=pivot_data, 
                 cmap=self._palette + '_r', 
-                annot=True, 
+                annot=self._interval_annotations(data, pivot_data, 'AvgRank', self._format_float), 
                 vmin=abs_min, 
                 vmax=abs_max, 
                 cbar_kws=cbar_kws, 
-                fmt='.1f',
+                fmt='',
                 annot_kws={'alpha': 0.75})
             cluster_grid.ax_heatmap.set_xlabel('Country')
             cluster_grid.ax_heatmap.set_ylabel('Genre')
@@ -117,40 +134,14 @@ class PodcastGenreAnalyzer(PodcastAnalyzer):
             cluster_grid.ax_row_dendrogram.set_visible(False)
             cluster_grid.ax_col_dendrogram.set_visible(False)
 
-            for t in cluster_grid.ax_heatmap.texts: 
-                t.set_text(self._format_float(float(t.get_text())))
-
             return cluster_grid.fig
         
-        return AnalyzerResult(data, render)
+        return AnalyzerResult(data, render, self._theme)
     
     # returns the percentage of podcast genres in the top 200 podcasts by region
     # Podcasts with Genre = 'Unknown' are included in the analysis
     def genre_vs_presence_by_region(self) -> AnalyzerResult:
-        data: DataFrame = pd.read_sql_query(f'''
-        SELECT subquery.Genre, subquery.Country, COALESCE(NumPodcasts, 0) AS NumPodcasts
-        FROM (
-            SELECT DISTINCT Podcasts.Genre, Rankings.Country
-            FROM Podcasts, Rankings
-            WHERE Rankings.Genre = 'All'
-            AND Rankings.Country IN (
-                SELECT DISTINCT Country FROM Rankings WHERE Genre <> 'All'
-            )
-        ) AS subquery
-        LEFT JOIN (
-            SELECT Podcasts.Genre, Country, COUNT(*) AS NumPodcasts
-            FROM RankedPodcasts 
-            INNER JOIN Rankings ON Rankings.Id = RankedPodcasts.RankingId
-            INNER JOIN Podcasts ON Podcasts.Id = RankedPodcasts.PodcastId
-            WHERE Rankings.Genre = "All"
-            AND Rankings.Country IN (
-                SELECT DISTINCT Country FROM Rankings WHERE Genre <> 'All'
-            )
-            GROUP BY Podcasts.Genre, Country
-        ) AS existing_query
-        ON subquery.Genre = existing_query.Genre AND subquery.Country = existing_query.Country
-        ORDER BY NumPodcasts DESC
-        ''', self._engine)
+        data: DataFrame = self.__presence_by_region(missing_count=0)
         
         # another clustermap:
         def render(result: AnalyzerResult) -> Figure:
@@ -159,9 +150,6 @@ class PodcastGenreAnalyzer(PodcastAnalyzer):
             # Pivot the data to create a pivot table with Genre and Country as indices
             pivot_data: DataFrame = data.pivot_table(index='Genre', columns='Country', values='NumPodcasts')
 
-            # Set the style of seaborn
-            sns.set_theme(style=self._theme)
-
             # Calculate the absolute minimum and maximum values of AvgRank
             abs_min = pivot_data[pivot_data >= 0].min().min()
             abs_max = pivot_data.max().max()
@@ -173,7 +161,7 @@ class PodcastGenreAnalyzer(PodcastAnalyzer):
             }
 
             # Create a clustermap with the data
-            cluster_grid = sns.clustermap(data=pivot_data, cmap=self._palette + '_r', annot=True, vmin=abs_min, vmax=abs_max, cbar_kws=cbar_kws)
+            cluster_grid = create_cluster_grid(data=pivot_data, cmap=self._palette + '_r', annot=True, vmin=abs_min, vmax=abs_max, cbar_kws=cbar_kws)
             cluster_grid.ax_heatmap.set_xlabel('Country')
             cluster_grid.ax_heatmap.set_ylabel('Genre')
             cluster_grid.ax_heatmap.set_title('Presence of Podcast Genres in Top 200 by Region')
@@ -184,59 +172,15 @@ class PodcastGenreAnalyzer(PodcastAnalyzer):
 
             return cluster_grid.fig
         
-        return AnalyzerResult(data, render)
+        return AnalyzerResult(data, render, self._theme)
     
     # returns the average rank of each genre over all 'total' rankings (Genre = 'All') clustered by region
     # Podcasts with Genre = 'Unknown' are excluded from the analysis. Only regions with genre rankings are included.
     # The average rank is then weighted by the number of podcasts in each genre in each region.
     def genre_vs_populatity_by_region(self) -> AnalyzerResult:
-        genre_vs_rank_data: DataFrame = pd.read_sql_query(f'''
-        SELECT subquery.Genre, subquery.Country, COALESCE(AvgRank, 201) AS AvgRank
-        FROM (
-            SELECT DISTINCT Podcasts.Genre, Rankings.Country
-            FROM Podcasts, Rankings
-            WHERE Podcasts.Genre <> 'Unknown' AND Rankings.Genre <> 'All'
-        ) AS subquery
-        LEFT JOIN (
-            SELECT Podcasts.Genre, Country, AVG(Rank) AS AvgRank
-            FROM RankedPodcasts 
-            INNER JOIN Rankings ON Rankings.Id = RankedPodcasts.RankingId
-            INNER JOIN Podcasts ON Podcasts.Id = RankedPodcasts.PodcastId
-            WHERE Rankings.Genre = "All"
-            AND Podcasts.Genre <> 'Unknown' 
-            AND Rankings.Country IN (
-                SELECT DISTINCT Country FROM Rankings WHERE Genre <> 'All'
-            )
-            GROUP BY Podcasts.Genre, Country
-        ) AS existing_query
-        ON subquery.Genre = existing_query.Genre AND subquery.Country = existing_query.Country
-        ORDER BY AvgRank ASC
-        ''', self._engine)
-
-        genre_vs_presence_data: DataFrame = pd.read_sql_query(f'''
-        SELECT subquery.Genre, subquery.Country, COALESCE(NumPodcasts, 1) AS NumPodcasts
-        FROM (
-            SELECT DISTINCT Podcasts.Genre, Rankings.Country
-            FROM Podcasts, Rankings
-            WHERE Rankings.Genre = 'All'
-            AND Rankings.Country IN (
-                SELECT DISTINCT Country FROM Rankings WHERE Genre <> 'All'
-            )
-        ) AS subquery
-        LEFT JOIN (
-            SELECT Podcasts.Genre, Country, COUNT(*) AS NumPodcasts
-            FROM RankedPodcasts 
-            INNER JOIN Rankings ON Rankings.Id = RankedPodcasts.RankingId
-            INNER JOIN Podcasts ON Podcasts.Id = RankedPodcasts.PodcastId
-            WHERE Rankings.Genre = "All"
-            AND Rankings.Country IN (
-                SELECT DISTINCT Country FROM Rankings WHERE Genre <> 'All'
-            )
-            GROUP BY Podcasts.Genre, Country
-        ) AS existing_query
-        ON subquery.Genre = existing_query.Genre AND subquery.Country = existing_query.Country
-        ORDER BY NumPodcasts DESC
-        ''', self._engine)
+        genre_vs_rank_data: DataFrame = self.__rank_by_region()
+
+        genre_vs_presence_data: DataFrame = self.__presence_by_region(missing_count=1)
 
         # remove 'Unknown' genre from the data
         genre_vs_rank_data: DataFrame = genre_vs_rank_data[genre_vs_rank_data['Genre'] != 'Unknown']
@@ -254,9 +198,6 @@ class PodcastGenreAnalyzer(PodcastAnalyzer):
             # Pivot the data to create a pivot table with Genre and Country as indices
             pivot_data: DataFrame = data.pivot_table(index='Genre', columns='Country', values='WeightedAvgRank')
 
-            # Set the style of seaborn
-            sns.set_theme(style=self._theme)
-
             # Calculate the absolute minimum and maximum values of AvgRank
             abs_min = pivot_data[pivot_data >= 0].min().min()
             abs_max = pivot_data.max().max()
@@ -267,7 +208,7 @@ class PodcastGenreAnalyzer(PodcastAnalyzer):
             }
 
             # Create a clustermap with the data
-            cluster_grid = sns.clustermap(
+            cluster_grid = create_cluster_grid(
                 data=pivot_data, 
                 cmap=self._palette + '_r', 
                 annot=True, 
@@ -290,4 +231,4 @@ class PodcastGenreAnalyzer(PodcastAnalyzer):
 
             return cluster_grid.fig
 
-        return AnalyzerResult(data, render)
\ No newline at end of file
+        return AnalyzerResult(data, render, self._theme)
\ No newline at end of file
@@ -0,0 +1,134 @@
+from typing import Callable, Dict, List, Optional
+from matplotlib.figure import Figure
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+from analyzers.internals.figures import create_figure
+import seaborn as sns
+from analyzers.podcast_analyzer import PodcastAnalyzer
+from analyzers.internals.analyzer_result import AnalyzerResult
+from analyzers.internals.membership_index import MembershipIndex
+from analyzers.internals.preview_sample import PreviewEstimate
+from analyzers.internals.query_backend import QueryBackend
+from analyzers.internals.text_index import TextIndex
+from analyzers.internals.text_search import TextSearch
+
+# the topics, as FTS5 query expressions over the names and descriptions ('*' matches any suffix)
+TOPICS: Dict[str, str] = {
+    'True Crime': 'crime OR murder* OR killer* OR detective* OR investigat*',
+    'Politics': 'politic* OR election* OR government OR president OR democracy',
+    'Health': 'health* OR fitness OR nutrition OR yoga OR wellness OR mental',
+    'Money': 'money OR financ* OR invest* OR stock* OR crypto*',
+    'Technology': 'technolog* OR tech OR ai OR startup* OR software',
+    'Sports': 'sport* OR football OR soccer OR basketball OR nba OR nfl',
+    'Science': 'science* OR scientist* OR space OR physics OR biology',
+    'Religion': 'god OR faith OR church OR bible OR prayer',
+    'Comedy': 'comedy OR comedian* OR funny OR jokes',
+    'History': 'history OR historical OR ancient OR empire*',
+    'Music': 'music* OR song* OR album* OR band'
+}
+
+# ranks the prevalence of keywords and topics in the names and descriptions of the episodes (and shows) by genre
+# and region. The lookups run on the full-text index of the rankings database (see TextIndex and TextSearch)
+class PodcastKeywordAnalyzer(PodcastAnalyzer):
+    def __init__(self, connection_string: str, theme: str, palette: str, backend: Optional[QueryBackend] = None) -> None:
+        super().__init__(connection_string, theme, palette, backend)
+
+    def capabilities(self) -> List[Callable[[], AnalyzerResult]]:
+        return [
+            self.keyword_prevalence_by_genre,
+            self.topic_prevalence_by_genre,
+            self.topic_prevalence_by_region,
+            self.show_topic_prevalence_by_genre
+        ]
+
+    def preview_estimates(self) -> Dict[str, PreviewEstimate]:
+        return {
+            'keyword_prevalence_by_genre': PreviewEstimate(totals=['Matches', 'Episodes']),
+            'topic_prevalence_by_genre': PreviewEstimate(totals=['Matches', 'Episodes']),
+            'topic_prevalence_by_region': PreviewEstimate(totals=['Matches', 'Episodes', 'Podcasts']),
+            'show_topic_prevalence_by_genre': PreviewEstimate(totals=['Matches', 'Podcasts'])
+        }
+
+    # returns the share (in %) of the episodes of every genre matching the query of every term:
+    # <column> (the term), Genre, Matches, Episodes, Prevalence. Genre 'Unknown' is excluded
+    def __episode_prevalence_by_genre(self, search: TextSearch, terms: List[str], queries: List[str], column: str) -> DataFrame:
+        matches: np.ndarray = search.episode_matches(queries)
+        genres: np.ndarray = search.podcast_genres()
+        known: np.ndarray = genres != 'Unknown'
+        frames: List[DataFrame] = []
+        for term, term_matches in zip(terms, matches):
+            frames.append(DataFrame({'Genre': genres[known], 'Matches': term_matches[known], 'Episodes': search.episodes()[known]}).groupby('Genre', as_index=False).sum().assign(**{column: term}))
+        data: DataFrame = DataFrame(columns=[column, 'Genre', 'Matches', 'Episodes']) if len(frames) == 0 else pd.concat(frames, ignore_index=True)[[column, 'Genre', 'Matches', 'Episodes']]
+        data = data[data['Episodes'] > 0].reset_index(drop=True)
+        data['Prevalence'] = data['Matches'] / data['Episodes'] * 100
+        return data
+
+    def __render_heatmap(self, data: DataFrame, index: str, columns: str, title: str, label: str) -> Figure:
+        pivot_data: DataFrame = data.pivot_table(index=index, columns=columns, values='Prevalence')
+
+        fig, ax = create_figure(figsize=(12, 8))
+        sns.heatmap(data=pivot_data, cmap=self._palette, annot=True, fmt='.1f', cbar_kws={'label': label}, ax=ax)
+        ax.set_title(title)
+        ax.set_xlabel(columns)
+        ax.set_ylabel(index)
+        fig.tight_layout()
+        return fig
+
+    # the prevalence of the most frequent terms of all episode names and descriptions by genre
+    def keyword_prevalence_by_genre(self, keywords: int = 20) -> AnalyzerResult:
+        search: TextSearch = TextSearch.for_backend(self._backend)
+        terms: List[str] = search.top_terms(keywords)['Term'].tolist()
+        data: DataFrame = self.__episode_prevalence_by_genre(search, terms, [TextIndex.quote(term) for term in terms], 'Keyword')
+
+        def render(result: AnalyzerResult) -> Figure:
+            return self.__render_heatmap(result.get_data_frame(), 'Genre', 'Keyword', 'Share of Episodes mentioning the most frequent Keywords by Genre', 'Episodes in %')
+
+        return AnalyzerResult(data, render, self._theme)
+
+    # the prevalence of the topics (see TOPICS) in the episode names and descriptions by genre
+    def topic_prevalence_by_genre(self) -> AnalyzerResult:
+        search: TextSearch = TextSearch.for_backend(self._backend)
+        data: DataFrame = self.__episode_prevalence_by_genre(search, list(TOPICS.keys()), list(TOPICS.values()), 'Topic')
+
+        def render(result: AnalyzerResult) -> Figure:
+            return self.__render_heatmap(result.get_data_frame(), 'Genre', 'Topic', 'Share of Episodes about a Topic by Genre', 'Episodes in %')
+
+        return AnalyzerResult(data, render, self._theme)
+
+    # the prevalence of the topics in the episode names and descriptions of the podcasts ranked in a country.
+    # Every podcast counts once per country (see MembershipIndex)
+    def topic_prevalence_by_region(self) -> AnalyzerResult:
+        search: TextSearch = TextSearch.for_backend(self._backend)
+        index: MembershipIndex = MembershipIndex.for_backend(self._backend)
+        matches: np.ndarray = search.episode_matches(list(TOPICS.values()))
+        frames: List[DataFrame] = []
+        for topic, topic_matches in zip(TOPICS.keys(), matches):
+            by_podcast = DataFrame({'PodcastId': search.podcast_ids(), 'Matches': topic_matches, 'Episodes': search.episodes()})
+            frames.append(index.scatter(by_podcast, ['Matches', 'Episodes'], by='Country').assign(Topic=topic))
+        data: DataFrame = pd.concat(frames, ignore_index=True)[['Topic', 'Country', 'Matches', 'Episodes', 'Podcasts']]
+        data = data[data['Episodes'] > 0].astype({'Matches': np.int64, 'Episodes': np.int64}).reset_index(drop=True)
+        data['Prevalence'] = data['Matches'] / data['Episodes'] * 100
+
+        def render(result: AnalyzerResult) -> Figure:
+            return self.__render_heatmap(result.get_data_frame(), 'Country', 'Topic', 'Share of Episodes about a Topic by Country', 'Episodes in %')
+
+        return AnalyzerResult(data, render, self._theme)
+
+    # the share (in %) of the shows of every genre whose name or description is about the topic.
+    # Genre 'Unknown' is excluded
+    def show_topic_prevalence_by_genre(self) -> AnalyzerResult:
+        search: TextSearch = TextSearch.for_backend(self._backend)
+        matches: np.ndarray = search.podcast_matches(list(TOPICS.values()))
+        genres: np.ndarray = search.podcast_genres()
+        known: np.ndarray = genres != 'Unknown'
+        frames: List[DataFrame] = []
+        for topic, topic_matches in zip(TOPICS.keys(), matches):
+            frames.append(DataFrame({'Genre': genres[known], 'Matches': topic_matches[known].astype(np.int64), 'Podcasts': 1}).groupby('Genre', as_index=False).sum().assign(Topic=topic))
+        data: DataFrame = pd.concat(frames, ignore_index=True)[['Topic', 'Genre', 'Matches', 'Podcasts']]
+        data['Prevalence'] = data['Matches'] / data['Podcasts'] * 100
+
+        def render(result: AnalyzerResult) -> Figure:
+            return self.__render_heatmap(result.get_data_frame(), 'Genre', 'Topic', 'Share of Shows about a Topic by Genre', 'Shows in %')
+
+        return AnalyzerResult(data, render, self._theme)
@@ -1,58 +1,120 @@
-from typing import Callable, List
+from typing import Callable, Dict, List, Optional
 from matplotlib.dates import YearLocator
 from matplotlib.figure import Figure
+from matplotlib.ticker import FuncFormatter
+from matplotlib.legend import Legend
 import numpy as np
 import pandas as pd
 from pandas import DataFrame
-import matplotlib.pyplot as plt
+from analyzers.internals.figures import create_cluster_grid, create_figure
 import seaborn as sns
 from analyzers.models.upload_frequency_model import UploadFrequencyModel
 from analyzers.internals.binary_search_wrapper import BinarySearchWrapper
+from analyzers.internals.membership_index import MembershipIndex
+from analyzers.internals.model_store import ModelStore
+from analyzers.internals.upload_cadence import UploadCadence
+from analyzers.internals.upload_decomposition import UploadDecomposition
 from analyzers.podcast_analyzer import PodcastAnalyzer
 from analyzers.internals.analyzer_result import AnalyzerResult
+from analyzers.internals.preview_sample import PreviewEstimate
+from analyzers.internals.query_backend import QueryBackend
+from analyzers.internals.query_catalog import QUERY_CATALOG
+
+# the queries group on the date parts derived once per database version (EpisodeDates), not on ReleaseDate itself
+QUERY_CATALOG.register('upload_frequency_by_day_of_week', '''
+    SELECT
+        COUNT(*) AS Uploads,
+        CAST(Weekday AS TEXT) AS DayOfWeek,
+        CASE Weekday
+            WHEN 0 THEN 'Sun'
+            WHEN 1 THEN 'Mon'
+            WHEN 2 THEN 'Tue'
+            WHEN 3 THEN 'Wed'
+            WHEN 4 THEN 'Thu'
+            WHEN 5 THEN 'Fri'
+            WHEN 6 THEN 'Sat'
+        END AS DayOfWeekName
+    FROM EpisodeDates
+    WHERE ReleaseDatePrecision = 'day'
+    GROUP BY Weekday
+    ORDER BY Weekday ASC
+''')
+
+QUERY_CATALOG.register('upload_absolute_frequency', '''
+    SELECT
+        COUNT(*) AS Uploads,
+        EpochDay AS Date
+    FROM EpisodeDates
+    WHERE ReleaseDatePrecision = 'day'
+        AND EpochDay IS NOT NULL
+        AND Year BETWEEN :year_lower_bound AND :year_upper_bound
+    GROUP BY EpochDay
+    ORDER BY EpochDay ASC
+''', {'year_lower_bound': int, 'year_upper_bound': int}, example={'year_lower_bound': 2013, 'year_upper_bound': 2023})
+
+# the uploads of every podcast by day of week. The shares by country are computed from the MembershipIndex
+QUERY_CATALOG.register('upload_frequency_by_day_of_week_by_region.podcast_uploads', '''
+    SELECT PodcastId, Weekday, COUNT(*) AS Uploads
+    FROM EpisodeDates
+    WHERE ReleaseDatePrecision = 'day' AND PodcastId IS NOT NULL
+    GROUP BY PodcastId, Weekday
+''')
+
+_DAY_OF_WEEK_NAMES: List[str] = ['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']
+
+QUERY_CATALOG.register('upload_relative_frequency', '''
+    SELECT
+        COUNT(*) AS Uploads,
+        EpochDay AS Date,
+        EpochDay * 86400 AS DateEpoch
+    FROM EpisodeDates
+    WHERE ReleaseDatePrecision = 'day'
+        AND EpochDay IS NOT NULL
+        AND Year BETWEEN :year_lower_bound AND :year_upper_bound
+    GROUP BY EpochDay
+    ORDER BY EpochDay ASC
+''', {'year_lower_bound': int, 'year_upper_bound': int}, example={'year_lower_bound': 2013, 'year_upper_bound': 2023})
+
+QUERY_CATALOG.register('upload_relative_frequency.first_releases', '''
+    SELECT MIN(EpochDay) * 86400 AS FirstReleaseEpoch
+    FROM EpisodeDates
+    GROUP BY PodcastId
+    ORDER BY FirstReleaseEpoch ASC
+''')
 
 class PodcastUploadAnalyzer(PodcastAnalyzer):
-    def __init__(self, connection_string: str, theme: str, palette: str) -> None:
-        super().__init__(connection_string, theme, palette)
+    def __init__(self, connection_string: str, theme: str, palette: str, backend: Optional[QueryBackend] = None) -> None:
+        super().__init__(connection_string, theme, palette, backend)
     
     def capabilities(self) -> List[Callable[[], AnalyzerResult]]:
         return [
             self.upload_absolute_frequency,
             self.upload_frequency_by_day_of_week,
             self.upload_frequency_by_day_of_week_by_region,
-            self.upload_relative_frequency
+            self.upload_relative_frequency,
+            self.upload_trend_by_genre,
+            self.upload_trend_by_region,
+            self.upload_seasonality_by_genre,
+            self.upload_cadence_by_genre,
+            self.upload_cadence_by_region
         ]
+
+    def preview_estimates(self) -> Dict[str, PreviewEstimate]:
+        return {
+            'upload_absolute_frequency': PreviewEstimate(totals=['Uploads']),
+            'upload_frequency_by_day_of_week': PreviewEstimate(totals=['Uploads']),
+            'upload_relative_frequency': PreviewEstimate(keys=['DateEpoch'], totals=['Uploads', 'PodcastCount']),
+            'upload_cadence_by_genre': PreviewEstimate(totals=['Count']),
+            'upload_cadence_by_region': PreviewEstimate(totals=['Count'])
+        }
     
     def upload_frequency_by_day_of_week(self) -> AnalyzerResult:
-        data: DataFrame = pd.read_sql_query('''
-            SELECT
-                COUNT(*) AS Uploads,
-                DayOfWeek AS DayOfWeek,
-                CASE DayOfWeek
-                    WHEN '0' THEN 'Sun'
-                    WHEN '1' THEN 'Mon'
-                    WHEN '2' THEN 'Tue'
-                    WHEN '3' THEN 'Wed'
-                    WHEN '4' THEN 'Thu'
-                    WHEN '5' THEN 'Fri'
-                    WHEN '6' THEN 'Sat'
-                END AS DayOfWeekName
-            FROM Episodes
-            INNER JOIN (
-                SELECT Id as EpisodeId, strftime('%w', ReleaseDate) AS DayOfWeek
-                FROM Episodes
-            ) AS DayOfWeek ON Episodes.Id = DayOfWeek.EpisodeId
-            WHERE ReleaseDatePrecision = 'day'
-            GROUP BY DayOfWeek
-            ORDER BY DayOfWeek ASC
-        ''', self._engine)
+        data: DataFrame = self._query('upload_frequency_by_day_of_week')
 
         def render(result: AnalyzerResult) -> Figure:
             data: DataFrame = result.get_data_frame()
-            # Set the style of seaborn
-            sns.set_theme(style=self._theme)
 
-            fig, ax = plt.subplots() 
+            fig, ax = create_figure() 
             sns.barplot(data=data, x='DayOfWeekName', y='Uploads', palette=self._palette + '_r', ax=ax)
             ax.set_title('Uploads per Day of Week')
             ax.set_xlabel('Day of Week')
@@ -60,33 +122,22 @@ class PodcastUploadAnalyzer(PodcastAnalyzer):
             fig.tight_layout()
             return fig
         
-        return AnalyzerResult(data, render)
+        return AnalyzerResult(data, render, self._theme)
     
     # plots the number of uploads per day over time between the given years
     def upload_absolute_frequency(self, year_lower_bound: int = 2013, year_upper_bound: int = 2023) -> AnalyzerResult:
-        data: DataFrame = pd.read_sql_query(f'''
-            SELECT
-                COUNT(*) AS Uploads,
-                ReleaseDate AS Date
-            FROM Episodes
-            WHERE ReleaseDatePrecision = 'day'
-                AND ReleaseDate >= '{year_lower_bound}-01-01'
-                AND ReleaseDate <= '{year_upper_bound}-12-31'
-            GROUP BY ReleaseDate
-            ORDER BY ReleaseDate ASC
-        ''', self._engine)
-
-        data['Date'] = pd.to_datetime(data['Date'])
+        data: DataFrame = self._query('upload_absolute_frequency', year_lower_bound=year_lower_bound, year_upper_bound=year_upper_bound)
+
+        # the days since the epoch are converted without parsing
+        data['Date'] = pd.to_datetime(data['Date'], unit='D')
         
         # Create a categorical column based on the year of the Date column
         data['Year'] = data['Date'].dt.year.astype(str)
 
         def render(result: AnalyzerResult) -> Figure:
             data: DataFrame = result.get_data_frame()
-            # Set the style of seaborn
-            sns.set_theme(style=self._theme)
 
-            fig, ax = plt.subplots() 
+            fig, ax = create_figure() 
             sns.lineplot(data=data, x='Date', y='Uploads', hue='Year', palette=self._palette + '_r', ax=ax)
             ax.set_title('Uploads per Day')
             ax.set_xlabel('Year')
@@ -95,49 +146,26 @@ class PodcastUploadAnalyzer(PodcastAnalyzer):
             fig.tight_layout()
             return fig
         
-        return AnalyzerResult(data, render)
+        return AnalyzerResult(data, render, self._theme)
     
+    # returns the share (in %) of the uploads of the podcasts ranked in a country on every day of week.
+    # Every podcast counts once per country, no matter in how many rankings of the country it has been ranked
     def upload_frequency_by_day_of_week_by_region(self) -> AnalyzerResult:
-        data: DataFrame = pd.read_sql_query('''
-            WITH UploadsPerCountryPerDay AS (
-                SELECT COUNT(DISTINCT e.Id) as Uploads,
-                    r.Country,
-                    DayOfWeek AS DayOfWeek,
-                    CASE DayOfWeek
-                        WHEN '0' THEN 'Sunday'
-                        WHEN '1' THEN 'Monday'
-                        WHEN '2' THEN 'Tuesday'
-                        WHEN '3' THEN 'Wednesday'
-                        WHEN '4' THEN 'Thursday'
-                        WHEN '5' THEN 'Friday'
-                        WHEN '6' THEN 'Saturday'
-                    END AS DayOfWeekName
-                FROM Episodes e
-                INNER JOIN (
-                    SELECT Id as EpisodeId, strftime('%w', e2.ReleaseDate) AS DayOfWeek
-                    FROM Episodes e2
-                ) AS DayOfWeek ON e.Id = DayOfWeek.EpisodeId
-                INNER JOIN Podcasts p ON p.Id = e.PodcastId
-                INNER JOIN RankedPodcasts rp ON rp.PodcastId = p.Id
-                INNER JOIN Rankings r ON r.Id = rp.RankingId
-                WHERE e.ReleaseDatePrecision = 'day'
-                GROUP BY Country, DayOfWeek), 
-            UploadsPerCountry AS (
-                SELECT COUNT(DISTINCT e.Id) as Uploads,
-                    r.Country
-                FROM Episodes e
-                INNER JOIN Podcasts p ON p.Id = e.PodcastId
-                INNER JOIN RankedPodcasts rp ON rp.PodcastId = p.Id
-                INNER JOIN Rankings r ON r.Id = rp.RankingId
-                WHERE e.ReleaseDatePrecision = 'day'
-                GROUP BY Country)
-            SELECT 
-                CAST(ucd.Uploads AS FLOAT) / uc.Uploads * 100 AS Uploads,
-                ucd.Country,
-                ucd.DayOfWeekName
-            FROM UploadsPerCountryPerDay ucd
-            INNER JOIN UploadsPerCountry uc ON ucd.Country = uc.Country;
-        ''', self._engine)
+        podcast_uploads: DataFrame = self._query('upload_frequency_by_day_of_week_by_region.podcast_uploads')
+        # one column per day of week ('-1' for release dates without a day of week, which only count to the total)
+        podcast_uploads['Weekday'] = podcast_uploads['Weekday'].fillna(-1).astype(np.int64).astype(str)
+        by_podcast: DataFrame = podcast_uploads.pivot_table(index='PodcastId', columns='Weekday', values='Uploads', aggfunc='sum', fill_value=0).reset_index()
+        days: List[str] = [str(day) for day in range(7) if str(day) in by_podcast.columns]
+        measures: List[str] = [column for column in by_podcast.columns if column != 'PodcastId']
+        by_country: DataFrame = MembershipIndex.for_backend(self._backend).scatter(by_podcast, measures, by='Country')
+        total: pd.Series = by_country.set_index('Country')[measures].sum(axis=1)
+        data: DataFrame = by_country.melt(id_vars=['Country'], value_vars=days, var_name='Day', value_name='DayUploads')
+        data = data[data['DayUploads'] > 0]
+        data = DataFrame({
+            'Uploads': data['DayUploads'].to_numpy() / data['Country'].map(total).to_numpy() * 100,
+            'Country': data['Country'].to_numpy(),
+            'DayOfWeekName': [_DAY_OF_WEEK_NAMES[int(day)] for day in data['Day']]
+        })
 
         def render(result: AnalyzerResult) -> Figure:
             data: DataFrame = result.get_data_frame()
@@ -147,9 +175,6 @@ class PodcastUploadAnalyzer(PodcastAnalyzer):
             # Reindex the columns to be in the correct order
             pivot_data = pivot_data.reindex(['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday'], axis='columns')
 
-            # Set the style of seaborn
-            sns.set_theme(style=self._theme)
-
             # Calculate the absolute minimum and maximum values of AvgRank
             abs_min = pivot_data[pivot_data >= 0].min().min()
             abs_max = pivot_data.max().max()
@@ -161,7 +186,7 @@ class PodcastUploadAnalyzer(PodcastAnalyzer):
             }
 
             # Create a clustermap with the data
-            cluster_grid = sns.clustermap(
+            cluster_grid = create_cluster_grid(
                 data=pivot_data, 
                 cmap=self._palette + '_r', 
                 annot=True, 
@@ -190,34 +215,26 @@ class PodcastUploadAnalyzer(PodcastAnalyzer):
 
             return cluster_grid.fig
         
-        return AnalyzerResult(data, render)
+        return AnalyzerResult(data, render, self._theme)
     
     # plots the relative number of uploads per day over time between the given years
     # relative number of uploads is defined as the number of uploads on a given day divided by the number of 
     # podcasts that have released at least one episode up to and including that day
+    # the fitted model is stored per database version and loaded instead of being recomputed
     def upload_relative_frequency(self, year_lower_bound: int = 2013, year_upper_bound: int = 2023) -> AnalyzerResult:
+        store: ModelStore = ModelStore.for_database(self._db_path)
+        model_name: str = f'{UploadFrequencyModel.MODEL_NAME}-{year_lower_bound}-{year_upper_bound}'
+        version: str = self._backend.db_version()
+        model: Optional[UploadFrequencyModel] = UploadFrequencyModel.load(store, version, self, model_name)
+        if model is not None:
+            return model
+
         # get absolute frequency data with unix timestamps for each date
-        data: DataFrame = pd.read_sql_query(f'''
-            SELECT
-                COUNT(*) AS Uploads,
-                ReleaseDate AS Date,
-                CAST(strftime('%s', ReleaseDate) AS INT) AS DateEpoch
-            FROM Episodes
-            WHERE ReleaseDatePrecision = 'day'
-                AND ReleaseDate >= '{year_lower_bound}-01-01'
-                AND ReleaseDate <= '{year_upper_bound}-12-31'
-            GROUP BY ReleaseDate
-            ORDER BY ReleaseDate ASC
-        ''', self._engine)
+        data: DataFrame = self._query('upload_relative_frequency', year_lower_bound=year_lower_bound, year_upper_bound=year_upper_bound)
 
         # get the first release date for each podcast as a unix timestamp
         # ordered ascending by the first release date
-        first_releases: DataFrame = pd.read_sql_query(f'''
-            SELECT CAST(strftime('%s', MIN(ReleaseDate)) AS INT) AS FirstReleaseEpoch
-            FROM Episodes
-            GROUP BY PodcastId
-            ORDER BY FirstReleaseEpoch ASC
-        ''', self._engine)
+        first_releases: DataFrame = self._query('upload_relative_frequency.first_releases')
         
         # extract the first release dates as a list
         ordered_first_releases: List[int] = first_releases['FirstReleaseEpoch'].tolist()
@@ -230,9 +247,135 @@ class PodcastUploadAnalyzer(PodcastAnalyzer):
         data['RelativeUploads'] = data['Uploads'] / data['PodcastCount']
 
         # prepare visualization data
-        data['Date'] = pd.to_datetime(data['Date'])
+        data['Date'] = pd.to_datetime(data['Date'], unit='D')
         
         # Create a categorical column based on the year of the Date column
         data['Year'] = data['Date'].dt.year.astype(str)
         
-        return UploadFrequencyModel(self, data)
\ No newline at end of file
+        model = UploadFrequencyModel(self, data)
+        if version != 'unknown':
+            model.save(store, version, model_name)
+        return model
+
+    # returns the season-adjusted trend of the relative uploads per day of every genre (genre 'Unknown' is excluded),
+    # with the slope and intercept of the linear regression of the trend
+    def upload_trend_by_genre(self, year_lower_bound: int = 2013, year_upper_bound: int = 2023) -> AnalyzerResult:
+        data: DataFrame = self.__decomposition_with_regressions('Genre', year_lower_bound, year_upper_bound)
+        data = data[data['Group'] != 'Unknown'].rename(columns={'Group': 'Genre'}).reset_index(drop=True)
+
+        def render(result: AnalyzerResult) -> Figure:
+            data: DataFrame = result.get_data_frame()
+
+            fig, ax = create_figure(figsize=(10, 6))
+            sns.lineplot(data=data.dropna(subset=['Trend']), x='Month', y='Trend', hue='Genre', palette=self._palette, ax=ax)
+            ax.set_title('Season-Adjusted Relative Upload Trend by Genre')
+            ax.set_xlabel('Year')
+            ax.set_ylabel('Uploads per Podcast per Day')
+            ax.xaxis.set_major_locator(YearLocator(base=1))
+            # separate legend from plot (move it to the right)
+            legend: Legend | None = ax.get_legend()
+            if legend is not None:
+                legend.remove()
+                ax.legend(bbox_to_anchor=(1.05, 1), loc='upper left', fontsize=8)
+            fig.tight_layout()
+            return fig
+
+        return AnalyzerResult(data, render, self._theme)
+
+    # returns the season-adjusted trend of the relative uploads per day of the podcasts ranked in every country,
+    # with the slope and intercept of the linear regression of the trend
+    def upload_trend_by_region(self, year_lower_bound: int = 2013, year_upper_bound: int = 2023) -> AnalyzerResult:
+        data: DataFrame = self.__decomposition_with_regressions('Country', year_lower_bound, year_upper_bound)
+        data = data.rename(columns={'Group': 'Country'})
+
+        def render(result: AnalyzerResult) -> Figure:
+            data: DataFrame = result.get_data_frame().dropna(subset=['Trend'])
+            # countries ordered by the slope of their trend (steepest decline first)
+            order: List[str] = data.groupby('Country')['TrendSlope'].first().sort_values().index.tolist()
+            pivot_data: DataFrame = data.pivot_table(index='Country', columns='Month', values='Trend').reindex(order)
+            pivot_data.columns = [month.strftime('%Y-%m') for month in pivot_data.columns]
+
+            fig, ax = create_figure(figsize=(12, max(4, len(order) * 0.3)))
+            sns.heatmap(pivot_data, cmap=self._palette, cbar_kws={'label': 'Uploads per Podcast per Day'}, ax=ax)
+            ax.set_title('Season-Adjusted Relative Upload Trend by Region')
+            ax.set_xlabel('Month')
+            ax.set_ylabel('Country')
+            # label every january only
+            januaries: List[int] = [i for i, month in enumerate(pivot_data.columns) if month.endswith('-01')]
+            ax.set_xticks([i + 0.5 for i in januaries])
+            ax.set_xticklabels([pivot_data.columns[i][:4] for i in januaries], rotation=0)
+            fig.tight_layout()
+            return fig
+
+        return AnalyzerResult(data, render, self._theme)
+
+    # returns the seasonal component of the relative uploads per day of every genre by month (genre 'Unknown' is excluded)
+    def upload_seasonality_by_genre(self, year_lower_bound: int = 2013, year_upper_bound: int = 2023) -> AnalyzerResult:
+        components: DataFrame = UploadDecomposition.for_backend(self._backend, year_lower_bound, year_upper_bound).components('Genre')
+        components = components[components['Group'] != 'Unknown']
+        # the seasonal component repeats every year
+        components = components.assign(MonthOfYear=components['Month'].dt.month)
+        data: DataFrame = components.groupby(['Group', 'MonthOfYear'], as_index=False)['Seasonal'].first().rename(columns={'Group': 'Genre'})
+
+        def render(result: AnalyzerResult) -> Figure:
+            data: DataFrame = result.get_data_frame()
+            pivot_data: DataFrame = data.pivot_table(index='Genre', columns='MonthOfYear', values='Seasonal')
+            pivot_data.columns = [pd.to_datetime(str(month), format='%m').strftime('%b') for month in pivot_data.columns]
+            limit: float = float(np.nanmax(np.abs(pivot_data.to_numpy()))) if pivot_data.size > 0 else 1.0
+
+            fig, ax = create_figure(figsize=(10, 6))
+            sns.heatmap(pivot_data, cmap='vlag', center=0, vmin=-limit, vmax=limit, cbar_kws={'label': 'Seasonal Uploads per Podcast per Day'}, ax=ax)
+            ax.set_title('Seasonal Upload Components by Genre')
+            ax.set_xlabel('Month')
+            ax.set_ylabel('Genre')
+            fig.tight_layout()
+            return fig
+
+        return AnalyzerResult(data, render, self._theme)
+
+    # the decomposition of every series of the dimension, with the regression of its trend
+    # returns the distribution of the median days between the uploads of the podcasts by the dimension (see
+    # UploadCadence), with the median regularity (MedianGapCV) and the share of podcasts with a hiatus, ordered by median
+    def __cadence_summary(self, dimension: str) -> DataFrame:
+        cadence: UploadCadence = UploadCadence.for_backend(self._backend)
+        data: DataFrame = cadence.summary('MedianGapDays', dimension)
+        regularity: DataFrame = cadence.summary('GapCV', dimension)[[dimension, 'Median']].rename(columns={'Median': 'MedianGapCV'})
+        data = data.merge(regularity, on=dimension, how='left')
+        if dimension == 'Genre':
+            data = data[data['Genre'] != 'Unknown']
+        return data.sort_values(by='Median', kind='mergesort').reset_index(drop=True)
+
+    def __render_cadence(self, data: DataFrame, dimension: str, title: str) -> Figure:
+        # the share of podcasts with a hiatus is shown next to every label
+        data = data.assign(**{dimension: [f'{label} ({share:.0f}% hiatus)' for label, share in zip(data[dimension], data['HiatusShare'])]})
+        fig: Figure = self._render_box_plot(data, dimension, title, 'Median Days between Uploads')
+        # cadences range from daily to yearly uploads, ticked at the usual upload schedules
+        ax = fig.axes[0]
+        ax.set_xscale('symlog', linthresh=1)
+        ax.set_xticks([0, 1, 3.5, 7, 14, 30, 90, 365])
+        ax.set_xlim(left=0, right=max(7.0, float(data['Max'].max()) * 1.1))
+        ax.xaxis.set_major_formatter(FuncFormatter(lambda days, _: f'{days:g}'))
+        return fig
+
+    # returns the distribution of the median days between the uploads of the podcasts of every genre.
+    # A hiatus is a gap of at least UploadCadence.HIATUS_DAYS days. Genre 'Unknown' is excluded
+    def upload_cadence_by_genre(self) -> AnalyzerResult:
+        data: DataFrame = self.__cadence_summary('Genre')
+
+        def render(result: AnalyzerResult) -> Figure:
+            return self.__render_cadence(result.get_data_frame(), 'Genre', 'Upload Cadence by Genre')
+
+        return AnalyzerResult(data, render, self._theme)
+
+    # returns the distribution of the median days between the uploads of the podcasts in the overall rankings by country
+    def upload_cadence_by_region(self) -> AnalyzerResult:
+        data: DataFrame = self.__cadence_summary('Country')
+
+        def render(result: AnalyzerResult) -> Figure:
+            return self.__render_cadence(result.get_data_frame(), 'Country', 'Upload Cadence of Ranked Podcasts by Region')
+
+        return AnalyzerResult(data, render, self._theme)
+
+    def __decomposition_with_regressions(self, dimension: str, year_lower_bound: int, year_upper_bound: int) -> DataFrame:
+        decomposition: UploadDecomposition = UploadDecomposition.for_backend(self._backend, year_lower_bound, year_upper_bound)
+        return decomposition.components(dimension).merge(decomposition.trend_regressions(dimension), on='Group', how='left')
@@ -1,12 +1,38 @@
+import json
 import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
 import requests
 import tqdm
 
+# an asset of a past release that is missing (or incomplete) in the local archive
+class ReleaseDownload:
+    # the tag (or id) of the release, the name of its directory in the archive
+    release: str
+    published_at: str
+    url: str
+    size: int
+    target_path: str
+
+    def __init__(self, release: str, published_at: str, url: str, size: int, target_path: str) -> None:
+        self.release = release
+        self.published_at = published_at
+        self.url = url
+        self.size = size
+        self.target_path = target_path
+
 class GitHubRelease:
     __repository_id: int
+    __api_url: str
+    __PAGE_SIZE: int = 100
+    __CHUNK_SIZE: int = 1024 * 1024
 
-    def __init__(self, repository_id: int) -> None:
+    # api_url can point to a stand-in of the GitHub API (e.g. a local HTTP server)
+    def __init__(self, repository_id: int, api_url: str = 'https://api.github.com') -> None:
         self.__repository_id = repository_id
+        self.__api_url = api_url.rstrip('/')
 
     def pull_latest_artifact(self, artifact_name: str, target_dir: str) -> None:
         print(f'Checking for new version of GitHub artifact \'{artifact_name}\'...')
@@ -19,7 +45,7 @@ class GitHubRelease:
         # check if there is a newer version available
         with open(version_file, 'r') as f:
             current_version = f.read()
-        r = requests.get(f'https://api.github.com/repositories/{self.__repository_id}/releases/latest')
+        r = requests.get(f'{self.__api_url}/repositories/{self.__repository_id}/releases/latest')
         # compare dates, and extract download link for artifact if there is a newer version available
         json = r.json()
         latest_version = json['published_at']
@@ -33,17 +59,158 @@ class GitHubRelease:
                     expected_size = int(asset['size'])
             if download_link is None:
                 raise Exception(f'Could not find download link for \'{artifact_name}\'. Check the GitHub release')
-            # download artifact
+            # download artifact next to the current one, which is only replaced once the download is complete, so
+            # that readers (e.g. a running daemon) never see a partial file
             r = requests.get(download_link, stream=True)
-            with open(os.path.join(target_dir, artifact_name), 'wb') as f:
+            download_path = os.path.join(target_dir, artifact_name + '.download')
+            with open(download_path, 'wb') as f:
                 bar_format = '{l_bar}{bar}| {n_fmt}/{total_fmt} [{elapsed}<{remaining}, {rate_fmt}{postfix}]'
                 with tqdm.tqdm(total=expected_size, unit='B', unit_scale=True, unit_divisor=1024, bar_format=bar_format) as pbar:
                     for chunk in r.iter_content(chunk_size=8192):
                         f.write(chunk)
                         pbar.update(len(chunk))
+            os.replace(download_path, os.path.join(target_dir, artifact_name))
             # update version file
             with open(version_file, 'w') as f:
                 f.write(json['published_at'])
             print('Successfully updated artifact')
         else:
-            print(f'Artifact \'{artifact_name}\' is up to date ({current_version})')
\ No newline at end of file
+            print(f'Artifact \'{artifact_name}\' is up to date ({current_version})')
+
+    # returns all releases (newest first), paging through the release list of the repository
+    def list_releases(self, session: Optional[requests.Session] = None) -> List[Dict[str, Any]]:
+        session = session if session is not None else requests.Session()
+        releases: List[Dict[str, Any]] = []
+        page: int = 1
+        while True:
+            r = session.get(f'{self.__api_url}/repositories/{self.__repository_id}/releases', params={'per_page': GitHubRelease.__PAGE_SIZE, 'page': page})
+            r.raise_for_status()
+            releases_page: List[Dict[str, Any]] = r.json()
+            releases.extend(releases_page)
+            if len(releases_page) < GitHubRelease.__PAGE_SIZE:
+                return releases
+            page += 1
+
+    # downloads the artifact of every past release into <target_dir>/<release tag>/<artifact_name> (next to its
+    # <artifact_name>.version), unless it has already been downloaded. Up to max_workers files are downloaded at once,
+    # every worker reusing its connections. Interrupted downloads are resumed from their partial file (<file>.part).
+    # Returns the paths of the artifacts of all releases that have one, newest first
+    def pull_release_history(self, artifact_name: str, target_dir: str, max_workers: int = 4) -> List[str]:
+        print(f'Checking the release history of GitHub artifact \'{artifact_name}\'...')
+        releases: List[Dict[str, Any]] = self.list_releases()
+        paths: List[str] = []
+        downloads: List[ReleaseDownload] = []
+        for release in releases:
+            asset: Optional[Dict[str, Any]] = next((asset for asset in release['assets'] if asset['name'] == artifact_name), None)
+            if asset is None:
+                continue
+            # tags may contain slashes, which must not create nested directories
+            name: str = re.sub(r'[^0-9A-Za-z_.-]', '-', release.get('tag_name') or str(release['id']))
+            target_path: str = os.path.join(target_dir, name, artifact_name)
+            paths.append(target_path)
+            if GitHubRelease.__read_version(target_path) != release['published_at'] or not os.path.exists(target_path):
+                downloads.append(ReleaseDownload(name, release['published_at'], asset['browser_download_url'], int(asset['size']), target_path))
+        if len(downloads) == 0:
+            print(f'All {len(paths)} releases of \'{artifact_name}\' are up to date')
+            return paths
+        print(f'Pulling {len(downloads)} of {len(paths)} releases of \'{artifact_name}\' with {min(max_workers, len(downloads))} workers...')
+        local = threading.local()
+        progress_lock = threading.Lock()
+        # the progress of all downloads, starting from what is already on disk
+        total: int = sum(download.size for download in downloads)
+        resumed: int = sum(min(GitHubRelease.__partial_size(download.target_path), download.size) for download in downloads)
+        bar_format = '{l_bar}{bar}| {n_fmt}/{total_fmt} [{elapsed}<{remaining}, {rate_fmt}{postfix}]'
+        with tqdm.tqdm(total=total, initial=resumed, unit='B', unit_scale=True, unit_divisor=1024, bar_format=bar_format) as pbar:
+            def advance(size: int) -> None:
+                with progress_lock:
+                    pbar.update(size)
+
+            def download(release_download: ReleaseDownload) -> None:
+                if not hasattr(local, 'session'):
+                    local.session = requests.Session()
+                GitHubRelease.__download(local.session, release_download, advance)
+
+            with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='release-download') as executor:
+                # list() re-raises the first failed download
+                list(executor.map(download, downloads))
+        print(f'Successfully pulled {len(downloads)} releases')
+        return paths
+
+    @staticmethod
+    def __read_version(target_path: str) -> Optional[str]:
+        if not os.path.exists(target_path + '.version'):
+            return None
+        with open(target_path + '.version', 'r') as f:
+            return f.read().strip()
+
+    @staticmethod
+    def __partial_size(target_path: str) -> int:
+        partial_path: str = target_path + '.part'
+        return os.path.getsize(partial_path) if os.path.exists(partial_path) else 0
+
+    # the validator of a partial file (<file>.part.validator): the release it belongs to, and the ETag and
+    # Last-Modified of the response it was started from, which a range request is made conditional on
+    @staticmethod
+    def __read_validator(partial_path: str) -> Dict[str, str]:
+        if not os.path.exists(partial_path + '.validator'):
+            return {}
+        with open(partial_path + '.validator', 'r') as f:
+            return json.load(f)
+
+    @staticmethod
+    def __write_validator(partial_path: str, published_at: str, response: requests.Response) -> None:
+        validator: Dict[str, str] = {'published_at': published_at}
+        for header in ['ETag', 'Last-Modified']:
+            if header in response.headers:
+                validator[header] = response.headers[header]
+        with open(partial_path + '.validator', 'w') as f:
+            json.dump(validator, f)
+
+    # returns the If-Range header a partial file can be resumed with: its (strong) ETag, or its Last-Modified date.
+    # None if the partial cannot be validated (e.g. it was started before validators were stored)
+    @staticmethod
+    def __if_range(validator: Dict[str, str]) -> Optional[str]:
+        etag: Optional[str] = validator.get('ETag')
+        # weak ETags must not be used in If-Range
+        if etag is not None and not etag.startswith('W/'):
+            return etag
+        return validator.get('Last-Modified')
+
+    # downloads the asset to <file>.part, continuing a partial file with a range request, and moves it into place
+    # once it is complete. The range request is conditional (If-Range) on the partial file still being a prefix of the
+    # same asset, so that the server sends the whole asset instead of the rest of the range if the asset has changed.
+    # Partial files of another release, or without a validator, are discarded. The version file is written last, so an
+    # interrupted download is retried on the next pull
+    @staticmethod
+    def __download(session: requests.Session, download: ReleaseDownload, advance: Callable[[int], None]) -> None:
+        os.makedirs(os.path.dirname(download.target_path), exist_ok=True)
+        partial_path: str = download.target_path + '.part'
+        offset: int = GitHubRelease.__partial_size(download.target_path)
+        validator: Dict[str, str] = GitHubRelease.__read_validator(partial_path)
+        if_range: Optional[str] = GitHubRelease.__if_range(validator)
+        if offset > download.size or (offset > 0 and (validator.get('published_at') != download.published_at or if_range is None)):
+            # a partial file of another version of the asset
+            os.remove(partial_path)
+            advance(-offset)
+            offset = 0
+        if offset < download.size or not os.path.exists(partial_path):
+            headers: Dict[str, str] = {'Range': f'bytes={offset}-', 'If-Range': if_range} if offset > 0 and if_range is not None else {}
+            with session.get(download.url, headers=headers, stream=True) as r:
+                r.raise_for_status()
+                if offset > 0 and r.status_code != 206:
+                    # the server ignored the range (or the asset has changed), start over
+                    advance(-offset)
+                    offset = 0
+                if offset == 0:
+                    GitHubRelease.__write_validator(partial_path, download.published_at, r)
+                with open(partial_path, 'ab' if offset > 0 else 'wb') as f:
+                    for chunk in r.iter_content(chunk_size=GitHubRelease.__CHUNK_SIZE):
+                        f.write(chunk)
+                        advance(len(chunk))
+        if os.path.getsize(partial_path) != download.size:
+            raise Exception(f'Download of release \'{download.release}\' is incomplete ({os.path.getsize(partial_path)} of {download.size} bytes)')
+        os.replace(partial_path, download.target_path)
+        if os.path.exists(partial_path + '.validator'):
+            os.remove(partial_path + '.validator')
+        with open(download.target_path + '.version', 'w') as f:
+            f.write(download.published_at)
@@ -1,15 +1,28 @@
 from os import path
+import argparse
+import functools
 import os
-from typing import Callable, List, Optional
-import pandas as pd
+import time
+from typing import Callable, Dict, List, Optional
 
-from sqlalchemy import Engine, create_engine
+from analyzers.models.classifier_evaluation import ClassifierEvaluation
 from analyzers.models.duration_genre_classifier_model import DurationGenreClassifierModel
 
 from analyzers.internals.analyzer_result import AnalyzerResultModel
 from github.github_release import GitHubRelease
+from server.results_server import ResultsServer
+from server.inference_server import InferenceServer
 from analyzers.podcast_analyzer import PodcastAnalyzer
 from analyzers.internals.analyzer_result import AnalyzerResult
+from analyzers.internals.query_backend import QueryBackend, create_query_backend, read_db_revision, read_db_version
+from analyzers.internals.query_catalog import QUERY_CATALOG
+from analyzers.internals.backend_conformance import check_backend_conformance, check_capability_conformance
+from analyzers.internals.bootstrap import CellBootstrap
+from analyzers.internals.preview_sample import PreviewEstimate, PreviewSample
+from analyzers.internals.result_sink import ResultSink
+from analyzers.internals.result_versions import ResultVersions, frame_fingerprint
+from analyzers.internals.release_trends import TREND_VIEWS, ReleaseTrends
+from analyzers.internals.work_queue import QueueWorker, WorkQueue
 import tqdm
 # keep these imports to allow python to do its reflection magic:
 import analyzers.podcast_duration_analyzer
@@ -17,29 +30,42 @@ import analyzers.podcast_genre_analyzer
 import analyzers.podcast_upload_analyzer
 import analyzers.podcast_episode_count_analyzer
 import analyzers.podcast_episode_time_analyzer
+import analyzers.podcast_distribution_analyzer
+import analyzers.podcast_keyword_analyzer
 
 class PodcastAnalytics:
     __data_dir: str
+    __db_file: str
     __output_dir: str
     __connection_string: str
     __theme: str = 'darkgrid'
     __palette: str = 'viridis'
     __github_release: GitHubRelease
+    # the query backend ('sqlite' or 'duckdb') all analyzers share
+    __backend_name: str = 'sqlite'
+    __backend: Optional[QueryBackend] = None
+    __in_memory: bool = False
+    __max_in_memory_mb: int = 1024
 
     __analyzers: Optional[List[PodcastAnalyzer]] = None
+    # preview mode: the analyzers run on a sample of the podcasts, and on every random group of the sample
+    __preview_fraction: Optional[float] = None
+    __preview_seed: int = 0
+    __preview_groups: int = 5
+    __preview: Optional[PreviewSample] = None
+    __group_analyzers: List[List[PodcastAnalyzer]] = []
 
-    def __init__(self, data_dir: str = './data', db_file: str = 'rankings.db', output_dir: str = './rendered-results') -> None:
+    # github_api_url can point to a stand-in of the GitHub API (e.g. a mirror or a local test server)
+    def __init__(self, data_dir: str = './data', db_file: str = 'rankings.db', output_dir: str = './rendered-results', github_api_url: str = 'https://api.github.com') -> None:
         self.__data_dir = data_dir
+        self.__db_file = db_file
         self.__output_dir = output_dir
         self.__connection_string = 'sqlite:///' + path.abspath(path.join(data_dir, db_file))
-        self.__github_release = GitHubRelease(repository_id=668823738)
+        self.__github_release = GitHubRelease(repository_id=668823738, api_url=github_api_url)
     
     def __to_out_dir(self, file_name: str) -> str:
         return path.abspath(path.join(self.__output_dir, file_name))
     
-    def __filename_from_capability(self, capability: Callable[[], AnalyzerResult]) -> str:
-        return self.__to_out_dir('podcast_' + capability.__name__ + '.png')
-    
     def __filename_from_name(self, name: str) -> str:
         return self.__to_out_dir('podcast_' + name + '.png')
 
@@ -47,6 +73,19 @@ class PodcastAnalytics:
         self.__theme = theme
         self.__palette = palette
 
+    def set_backend(self, backend: str) -> None:
+        if self.__analyzers is not None:
+            raise Exception('The query backend must be selected before initializing PodcastAnalytics')
+        self.__backend_name = backend
+
+    # enables preview mode: every capability is estimated from a stratified sample of the given fraction of the podcasts
+    def set_preview(self, fraction: Optional[float], seed: int = 0, groups: int = 5) -> None:
+        if self.__analyzers is not None:
+            raise Exception('The preview mode must be selected before initializing PodcastAnalytics')
+        self.__preview_fraction = fraction
+        self.__preview_seed = seed
+        self.__preview_groups = groups
+
     def theme(self) -> str:
         return self.__theme
     
@@ -56,76 +95,330 @@ class PodcastAnalytics:
     def connection_string(self) -> str:
         return self.__connection_string
 
-    def initialize(self) -> 'PodcastAnalytics':
+    # returns the version (GitHub release date) of the database the analyzers are running on
+    def db_version(self) -> str:
+        if self.__backend is not None:
+            # in preview mode, this is the version of the sample
+            return self.__backend.db_version()
+        return read_db_version(path.join(self.__data_dir, self.__db_file))
+
+    # like db_version, but tells databases without a version apart by their size and modification time
+    def db_revision(self) -> str:
+        return read_db_revision(self.__backend.db_path() if self.__backend is not None else path.join(self.__data_dir, self.__db_file))
+
+    def backend(self) -> QueryBackend:
+        if self.__backend is None:
+            raise Exception('PodcastAnalytics has not been initialized')
+        return self.__backend
+
+    # with in_memory, the database is loaded into memory for the rest of the run (if it is not larger than max_in_memory_mb)
+    def initialize(self, in_memory: bool = False, max_in_memory_mb: int = 1024) -> 'PodcastAnalytics':
         print('Initializing PodcastAnalytics...')
         self.__github_release.pull_latest_artifact('rankings.db', self.__data_dir)
         if not path.exists(self.__output_dir):
             os.makedirs(self.__output_dir)
+        self.__in_memory = in_memory
+        self.__max_in_memory_mb = max_in_memory_mb
         if self.__analyzers is None:
-            analyzers: List[type] = list(filter(lambda t: not t.__name__.startswith('__'), PodcastAnalyzer.__subclasses__()))
-            self.__analyzers = [analyzer(self.__connection_string, self.__theme, self.__palette) for analyzer in analyzers]
+            connection_string: str = self.__connection_string
+            if self.__preview_fraction is not None:
+                self.__preview = PreviewSample.create(path.join(self.__data_dir, self.__db_file), self.__preview_fraction, self.__preview_seed, self.__preview_groups)
+                self.__output_dir = path.join(self.__output_dir, 'preview')
+                if not path.exists(self.__output_dir):
+                    os.makedirs(self.__output_dir)
+                connection_string = 'sqlite:///' + self.__preview.sample_path()
+                self.__group_analyzers = [self.__create_analyzers('sqlite:///' + group_path, in_memory, max_in_memory_mb) for group_path in self.__preview.group_paths()]
+            self.__analyzers = self.__create_analyzers(connection_string, in_memory, max_in_memory_mb)
+            self.__backend = self.__analyzers[0]._backend if len(self.__analyzers) > 0 else create_query_backend(self.__backend_name, connection_string)
         return self
+
+    # re-creates the analyzers (and their backend) on the current version of the database
+    def __reload(self) -> None:
+        if self.__backend is not None:
+            self.__backend.dispose()
+        self.__analyzers = None
+        self.__backend = None
+        self.__analyzers = self.__create_analyzers(self.__connection_string, self.__in_memory, self.__max_in_memory_mb)
+        self.__backend = self.__analyzers[0]._backend if len(self.__analyzers) > 0 else create_query_backend(self.__backend_name, self.__connection_string)
+
+    # creates all analyzers, sharing one query backend
+    def __create_analyzers(self, connection_string: str, in_memory: bool, max_in_memory_mb: int) -> List[PodcastAnalyzer]:
+        backend: QueryBackend = create_query_backend(self.__backend_name, connection_string, in_memory, max_in_memory_mb * 1024 ** 2)
+        return [analyzer(connection_string, self.__theme, self.__palette, backend) for analyzer in PodcastAnalytics.__analyzer_types()]
+
+    @staticmethod
+    def __analyzer_types() -> List[type]:
+        return list(filter(lambda t: not t.__name__.startswith('__'), PodcastAnalyzer.__subclasses__()))
     
-    def run_analyzers(self, visualize: bool = False) -> None:
+    # returns all capabilities of all analyzers by name
+    def capabilities(self) -> Dict[str, Callable[[], AnalyzerResult]]:
+        if self.__analyzers is None:
+            raise Exception('PodcastAnalytics has not been initialized')
+        capabilities: Dict[str, Callable[[], AnalyzerResult]] = {}
+        for index, analyzer in enumerate(self.__analyzers):
+            for capability in analyzer.capabilities():
+                if self.__preview is not None:
+                    capability = self.__preview_capability(index, capability, analyzer.preview_estimates().get(capability.__name__, PreviewEstimate()))
+                capabilities[capability.__name__] = capability
+        return capabilities
+
+    # returns all capabilities of a separate set of analyzers running on the given backend (outside of preview mode),
+    # e.g. to compare the results of the backends
+    def backend_capabilities(self, backend: str) -> Dict[str, Callable[[], AnalyzerResult]]:
+        query_backend: QueryBackend = create_query_backend(backend, self.__connection_string)
+        analyzers: List[PodcastAnalyzer] = [analyzer(self.__connection_string, self.__theme, self.__palette, query_backend) for analyzer in PodcastAnalytics.__analyzer_types()]
+        return {capability.__name__: capability for analyzer in analyzers for capability in analyzer.capabilities()}
+
+    # wraps the capability of the analyzer at the given index, so that it returns the estimate from the preview sample
+    def __preview_capability(self, index: int, capability: Callable[[], AnalyzerResult], estimate: PreviewEstimate) -> Callable[[], AnalyzerResult]:
+        def preview() -> AnalyzerResult:
+            assert self.__preview is not None
+            result: AnalyzerResult = capability()
+            group_frames = [getattr(analyzers[index], capability.__name__)().get_data_frame() for analyzers in self.__group_analyzers]
+            return result.with_data_frame(self.__preview.estimate(result.get_data_frame(), group_frames, estimate))
+        return functools.update_wrapper(preview, capability)
+
+    # capabilities exceeding their memory budget (in MB, the default budget or the one given by capability name)
+    # are reported (see ResultSink)
+    def run_analyzers(self, visualize: bool = False, memory_budget_mb: Optional[float] = None, capability_budgets_mb: Optional[Dict[str, float]] = None) -> ResultSink:
         if self.__analyzers is None:
             raise Exception('PodcastAnalytics has not been initialized')
-        all_capabilities: List[Callable[[], AnalyzerResult]] = []
-        for analyzer in self.__analyzers:
-            all_capabilities.extend(analyzer.capabilities())
+        return self.__run_capabilities(lambda name: self.__filename_from_name(name), visualize, memory_budget_mb, capability_budgets_mb)
+
+    def __run_capabilities(self, file_name: Callable[[str], str], visualize: bool = False, memory_budget_mb: Optional[float] = None, capability_budgets_mb: Optional[Dict[str, float]] = None, reuse: Optional[Callable[[str, AnalyzerResult, List[str]], bool]] = None) -> ResultSink:
+        assert self.__analyzers is not None
+        all_capabilities: List[Callable[[], AnalyzerResult]] = list(self.capabilities().values())
         if len(all_capabilities) == 0:
             print('No analyzers to run')
-            return
+            return ResultSink(file_name)
         print(f'Running {len(self.__analyzers)} analyzers with {len(all_capabilities)} capabilities...')
         # sort by name and then run. use tdqm to show progress
         all_capabilities.sort(key=lambda capability: capability.__name__)
         description_padding: int = len("Running ...") + max([len(capability.__name__) for capability in all_capabilities])
+        sink = ResultSink(file_name, visualize, memory_budget_mb, capability_budgets_mb, reuse)
         with tqdm.tqdm(total=len(all_capabilities), unit='Cap') as pbar:
             for capability in all_capabilities:
                 pbar.set_description(f'Running {capability.__name__}...'.ljust(description_padding))
-                result: AnalyzerResult = capability()
-                with result.render() as rendered_result:
-                    if visualize:
-                        rendered_result.visualize()
-                    rendered_result.save(self.__filename_from_capability(capability))
-                model: Optional[AnalyzerResultModel] = result.get_model()
-                if model is not None:
-                    visualizations = model.get_visualizations()
-                    for visualization, name in visualizations:
-                        with visualization.render() as rendered_visualization:
-                            if visualize:
-                                rendered_visualization.visualize()
-                            rendered_visualization.save(self.__filename_from_name(name))
+                sink.persist(capability)
                 pbar.update(1)
+        return sink
+
+    # keeps the analyzers running and renders the results of every new version of the database to
+    # <output_dir>/versions/<version>, published as <output_dir>/current (see ResultVersions): pulls the latest release
+    # from GitHub every poll_minutes (0 to only watch the data directory, e.g. when another process pulls the releases)
+    # and checks the version of the database every watch_seconds. Every capability is computed again, from scratch, on a
+    # new version: the capabilities do not declare the data they depend on, and the structures shared by the analyzers
+    # are built per database revision (see DatabaseCache), so only the snapshot aggregates (which only aggregate the
+    # new snapshots) carry over. Only the figures of the capabilities whose frames have changed are rendered, the
+    # others are taken over from the current results. The current results stay available until all figures of the new
+    # version are complete
+    def run_daemon(self, poll_minutes: float = 60, watch_seconds: float = 10, visualize: bool = False, memory_budget_mb: Optional[float] = None, capability_budgets_mb: Optional[Dict[str, float]] = None) -> None:
+        if self.__analyzers is None:
+            raise Exception('PodcastAnalytics has not been initialized')
+        if self.__preview is not None:
+            raise Exception('The preview mode cannot run as a daemon')
+        versions = ResultVersions(self.__output_dir)
+        db_path: str = path.join(self.__data_dir, self.__db_file)
+        analyzed_version: str = self.db_version()
+        if versions.current_version() == analyzed_version:
+            print(f'The results of database version {analyzed_version} are up to date')
+        else:
+            self.__publish_version(versions, analyzed_version, visualize, memory_budget_mb, capability_budgets_mb)
+        print(f'Watching for new versions of the database (checking every {watch_seconds:g} s, pulling from GitHub {f"every {poll_minutes:g} min" if poll_minutes > 0 else "never"})...')
+        # initialize has just pulled the latest release
+        last_poll: float = time.monotonic()
+        try:
+            while True:
+                time.sleep(watch_seconds)
+                if poll_minutes > 0 and time.monotonic() - last_poll >= poll_minutes * 60:
+                    last_poll = time.monotonic()
+                    try:
+                        self.__github_release.pull_latest_artifact('rankings.db', self.__data_dir)
+                    except Exception as e:
+                        print(f'Failed to pull the latest release: {e}')
+                version: str = read_db_version(db_path)
+                if version == analyzed_version:
+                    continue
+                print(f'Found database version {version} (over {analyzed_version})')
+                # a failing version is not retried, the current results stay in place until the next version
+                analyzed_version = version
+                try:
+                    self.__reload()
+                    self.__publish_version(versions, version, visualize, memory_budget_mb, capability_budgets_mb)
+                except Exception as e:
+                    print(f'Failed to analyze database version {version}: {e}')
+        except KeyboardInterrupt:
+            print('Stopping the daemon')
+
+    # renders the results of the database version to its staging directory, taking over the figures of unchanged
+    # frames from the current results, and publishes them
+    def __publish_version(self, versions: ResultVersions, version: str, visualize: bool, memory_budget_mb: Optional[float], capability_budgets_mb: Optional[Dict[str, float]]) -> None:
+        staging_dir: str = versions.stage(version)
+        previous: Dict[str, str] = versions.current_fingerprints()
+        fingerprints: Dict[str, str] = {}
+        reused: List[str] = []
+        file_name: Callable[[str], str] = lambda name: path.join(staging_dir, path.basename(self.__filename_from_name(name)))
+        def reuse(name: str, result: AnalyzerResult, names: List[str]) -> bool:
+            # the figures also depend on the style
+            fingerprints[name] = f'{self.__theme}/{self.__palette}/{frame_fingerprint(result.get_data_frame())}'
+            if previous.get(name) != fingerprints[name] or not versions.reuse(staging_dir, [path.basename(file_name(figure)) for figure in names]):
+                return False
+            reused.append(name)
+            return True
+        try:
+            self.__run_capabilities(file_name, visualize, memory_budget_mb, capability_budgets_mb, reuse)
+            versions.publish(staging_dir, version, fingerprints)
+        except BaseException:
+            versions.discard(staging_dir)
+            raise
+        print(f'Published the results of database version {version} to {versions.current_link()} ({len(fingerprints) - len(reused)} capabilities rendered, {len(reused)} unchanged)')
+
+    # runs the capabilities (by default those with a trend view) on every given release of the rankings database in
+    # parallel processes and saves their trends over the releases (see ReleaseTrends). Needs no initialization,
+    # the releases are read as they are (nothing is pulled from GitHub). With a work queue, the releases are computed
+    # by the queue workers instead, and only what they failed to compute is computed locally
+    def analyze_releases(self, db_paths: List[str], capability_names: Optional[List[str]] = None, workers: Optional[int] = None, visualize: bool = False, queue: Optional[WorkQueue] = None) -> ReleaseTrends:
+        if capability_names is None or len(capability_names) == 0:
+            capability_names = list(dict.fromkeys(view.capability for view in TREND_VIEWS))
+        cache_dir: str = path.join(self.__data_dir, 'releases')
+        if queue is not None:
+            for db_path in db_paths:
+                queue.publish(capability_names, db_path, read_db_version(db_path), self.__theme, self.__palette)
+            self.__wait_for_queue(queue)
+            cache_dir = queue.results_dir()
+        trends: ReleaseTrends = ReleaseTrends.run(db_paths, PodcastAnalytics.__analyzer_types(), capability_names, cache_dir, self.__backend_name, self.__theme, self.__palette, workers)
+        if not path.exists(self.__output_dir):
+            os.makedirs(self.__output_dir)
+        sink = ResultSink(lambda name: self.__filename_from_name(name), visualize)
+        for trend in trends.trends().values():
+            sink.persist(trend)
+        return trends
+
+    # downloads every past release of the rankings database that is missing in <data_dir>/history (see
+    # GitHubRelease.pull_release_history) and returns their paths, newest first
+    def pull_release_history(self, max_workers: int = 4) -> List[str]:
+        return self.__github_release.pull_release_history('rankings.db', path.join(self.__data_dir, 'history'), max_workers)
+
+    # publishes all capabilities of the database to the work queue and waits for the workers to compute them
+    # (see WorkQueue). The results are written to the shared storage of the queue, not to the output directory
+    def run_distributed(self, queue: WorkQueue) -> Dict[str, int]:
+        if self.__preview is not None:
+            raise Exception('The preview mode cannot be distributed to a work queue')
+        published: int = queue.publish(list(self.capabilities().keys()), path.join(self.__data_dir, self.__db_file), self.db_version(), self.__theme, self.__palette)
+        print(f'Published {published} new capability tasks (database version {self.db_version()})')
+        return self.__wait_for_queue(queue)
+
+    def __wait_for_queue(self, queue: WorkQueue) -> Dict[str, int]:
+        print('Waiting for the queue workers...')
+        counts: Dict[str, int] = queue.wait()
+        for capability, version, error in queue.failures():
+            print(f'[FAILED] {capability} of database version {version}: {error}')
+        print(f'{counts.get("done", 0)} tasks done, {counts.get("failed", 0)} failed')
+        return counts
+
+    # computes the capability tasks of the work queue until it is empty (with wait, until interrupted).
+    # Needs no initialization, the databases are given by the tasks
+    def run_queue_worker(self, queue: WorkQueue, wait: bool = False) -> int:
+        worker = QueueWorker(queue, PodcastAnalytics.__analyzer_types(), self.__backend_name)
+        return worker.run(wait)
+
+    # serves the results of all capabilities over HTTP until interrupted
+    def serve(self, host: str = '127.0.0.1', port: int = 8080, max_concurrency: int = 2) -> None:
+        if self.__analyzers is None:
+            raise Exception('PodcastAnalytics has not been initialized')
+        server = ResultsServer(self.capabilities, self.db_revision, f'{self.__theme}/{self.__palette}', host, port, max_concurrency)
+        server.serve_forever()
+
+    # serves the genre classifier over HTTP (and/or a Unix socket), classifying the requests in micro-batches.
+    # Needs no initialization: the model is loaded from the model store, the database is only opened to fit it
+    def serve_classifier(self, host: Optional[str] = '127.0.0.1', port: int = 8081, unix_socket: Optional[str] = None, max_batch_size: int = 256, max_batch_delay_ms: float = 2.0) -> None:
+        if self.__backend is None:
+            self.__github_release.pull_latest_artifact('rankings.db', self.__data_dir)
+        classifier: DurationGenreClassifierModel = DurationGenreClassifierModel.initialize_from_database(self.__connection_string, self.__backend)
+        server = InferenceServer(classifier, host, port, unix_socket, max_batch_size, max_batch_delay_ms)
+        server.serve_forever()
 
 if __name__ == '__main__':
-    spotify = PodcastAnalytics()
+    parser = argparse.ArgumentParser(description='Analyzes the Spotify podcast rankings')
+    parser.add_argument('--serve', action='store_true', help='serve the results over HTTP instead of rendering them to the output directory')
+    parser.add_argument('--host', default='127.0.0.1', help='the host to bind the results server to')
+    parser.add_argument('--port', type=int, default=8080, help='the port to bind the results server to')
+    parser.add_argument('--max-concurrency', type=int, default=2, help='the maximum number of capabilities the results server computes at once')
+    parser.add_argument('--serve-classifier', action='store_true', help='serve the genre classifier over HTTP instead of running the analyzers')
+    parser.add_argument('--classifier-port', type=int, default=8081, help='the port to bind the classifier server to (0 to only serve on the Unix socket)')
+    parser.add_argument('--unix-socket', help='additionally serve the genre classifier on this Unix socket')
+    parser.add_argument('--max-batch-size', type=int, default=256, help='the maximum number of classifications the classifier server batches together')
+    parser.add_argument('--max-batch-delay-ms', type=float, default=2.0, help='the maximum time a classification waits for its batch to fill up')
+    parser.add_argument('--backend', choices=['sqlite', 'duckdb'], default='sqlite', help='the query backend to run the analyzer queries on')
+    parser.add_argument('--in-memory', action='store_true', help='load the database into memory before running the analyzers (sqlite backend only)')
+    parser.add_argument('--max-in-memory-mb', type=int, default=1024, help='databases larger than this are queried from the memory-mapped file instead')
+    parser.add_argument('--preview', type=float, metavar='FRACTION', help='estimate all capabilities from a stratified sample of this fraction of the podcasts')
+    parser.add_argument('--preview-seed', type=int, default=0, help='the seed of the preview sample')
+    parser.add_argument('--preview-groups', type=int, default=5, help='the number of random groups the confidence intervals of the preview are estimated from')
+    parser.add_argument('--folds', type=int, default=5, help='the number of cross-validation folds the genre classifier is evaluated with')
+    parser.add_argument('--evaluation-workers', type=int, help='the number of processes evaluating the folds (defaults to one per fold, at most one per CPU)')
+    parser.add_argument('--bootstrap-resamples', type=int, default=10000, help='the number of bootstrap resamples of the confidence intervals of the genre and region averages (0 to omit the intervals)')
+    parser.add_argument('--bootstrap-confidence', type=float, default=0.95, help='the confidence level of the bootstrap intervals')
+    parser.add_argument('--bootstrap-workers', type=int, help='the number of processes resampling large sets of cells (defaults to one per CPU)')
+    parser.add_argument('--query-statistics', action='store_true', help='print the execution statistics of the catalog queries after the run')
+    parser.add_argument('--memory-budget-mb', type=float, help='the memory budget of every capability (capabilities exceeding it are reported)')
+    parser.add_argument('--capability-budget', action='append', default=[], metavar='NAME=MB', help='the memory budget of a single capability (can be repeated)')
+    parser.add_argument('--releases', nargs='+', metavar='DB_FILE', help='analyze the trends across these releases of the rankings database (each with a <file>.version) instead of the latest release')
+    parser.add_argument('--release-history', action='store_true', help='pull all past releases of the rankings database and analyze the trends across them (and the --releases)')
+    parser.add_argument('--github-api-url', default='https://api.github.com', help='the GitHub API the releases of the rankings database are pulled from')
+    parser.add_argument('--download-workers', type=int, default=4, help='the number of releases downloaded at once')
+    parser.add_argument('--release-capability', action='append', default=[], metavar='NAME', help='a capability to analyze across the releases (can be repeated, defaults to all capabilities with a trend view)')
+    parser.add_argument('--release-workers', type=int, help='the number of processes analyzing the releases (defaults to one per release, at most one per CPU)')
+    parser.add_argument('--work-queue', metavar='DIR', help='distribute the capabilities to the workers of the work queue in this (shared) directory')
+    parser.add_argument('--queue-worker', action='store_true', help='compute the tasks of the --work-queue until it is empty')
+    parser.add_argument('--worker-wait', action='store_true', help='keep the queue worker polling for new tasks instead of exiting once the queue is empty')
+    parser.add_argument('--daemon', action='store_true', help='keep running and render the results of every new version of the database to <output_dir>/versions, published as <output_dir>/current')
+    parser.add_argument('--poll-minutes', type=float, default=60, help='how often the daemon pulls the latest release from GitHub (0 to only watch the database version file)')
+    parser.add_argument('--watch-seconds', type=float, default=10, help='how often the daemon checks the version of the database for changes')
+    parser.add_argument('--check-backends', action='store_true', help='run every catalog query and every capability on both backends and compare the results')
+    args = parser.parse_args()
+
+    CellBootstrap.configure(args.bootstrap_resamples, args.bootstrap_confidence, workers=args.bootstrap_workers)
+    spotify = PodcastAnalytics(github_api_url=args.github_api_url)
     spotify.set_style('darkgrid', 'viridis')
-    spotify.initialize()
-    spotify.run_analyzers()
-
-    # attempt prediction
-    classifier: DurationGenreClassifierModel = DurationGenreClassifierModel.initialize_from_database(spotify.connection_string())
-    engine: Engine = create_engine(spotify.connection_string())
-    data = pd.read_sql_query('''
-        SELECT 
-            PodcastId,
-            ShowName,
-            Genre,
-            ShowDescription,
-            COUNT(*) AS EpisodeCount, 
-            AVG(Episodes.DurationMs) AS AvgDurationMs
-        FROM Episodes
-        INNER JOIN Podcasts ON Episodes.PodcastId = Podcasts.Id
-        WHERE Podcasts.Genre <> 'Unknown'
-        GROUP BY PodcastId
-    ''', engine)
-    total = len(data)
-    correct = 0
-
-    for i, row in data.iterrows():
-        genre, confidence = classifier.classify(row['AvgDurationMs'], row['EpisodeCount'])
-        if genre == row['Genre']:
-            correct += 1
-        print(f'{i}/{total} - {row["ShowName"]} - {row["Genre"]} - {genre} - {confidence}')
-
-    print(f'Correct: {correct}/{total} - {correct / total * 100}%')
+    spotify.set_backend(args.backend)
+    queue: Optional[WorkQueue] = WorkQueue(args.work_queue) if args.work_queue is not None else None
+    if args.queue_worker:
+        if queue is None:
+            raise Exception('--queue-worker needs a --work-queue')
+        spotify.run_queue_worker(queue, args.worker_wait)
+        exit(0)
+    if args.releases is not None or args.release_history:
+        releases: List[str] = list(args.releases or [])
+        if args.release_history:
+            releases += spotify.pull_release_history(args.download_workers)
+        spotify.analyze_releases(releases, args.release_capability, args.release_workers, queue=queue)
+        exit(0)
+    if args.serve_classifier:
+        spotify.serve_classifier(args.host if args.classifier_port != 0 else None, args.classifier_port, args.unix_socket, args.max_batch_size, args.max_batch_delay_ms)
+        exit(0)
+    spotify.set_preview(args.preview, args.preview_seed, args.preview_groups)
+    spotify.initialize(args.in_memory, args.max_in_memory_mb)
+    if args.check_backends:
+        mismatches: List[str] = check_backend_conformance(create_query_backend('sqlite', spotify.connection_string()), create_query_backend('duckdb', spotify.connection_string()))
+        mismatches += check_capability_conformance(spotify.backend_capabilities('sqlite'), spotify.backend_capabilities('duckdb'))
+        exit(1 if len(mismatches) > 0 else 0)
+    if queue is not None:
+        counts: Dict[str, int] = spotify.run_distributed(queue)
+        exit(1 if counts.get('failed', 0) > 0 else 0)
+    if args.serve:
+        spotify.serve(args.host, args.port, args.max_concurrency)
+        exit(0)
+    capability_budgets: Dict[str, float] = {name: float(budget) for name, _, budget in [entry.partition('=') for entry in args.capability_budget]}
+    if args.daemon:
+        spotify.run_daemon(args.poll_minutes, args.watch_seconds, memory_budget_mb=args.memory_budget_mb, capability_budgets_mb=capability_budgets)
+        exit(0)
+    sink: ResultSink = spotify.run_analyzers(memory_budget_mb=args.memory_budget_mb, capability_budgets_mb=capability_budgets)
+    if args.memory_budget_mb is not None or len(capability_budgets) > 0:
+        sink.print_report()
+    if args.query_statistics:
+        QUERY_CATALOG.print_statistics()
+
+    # evaluate the genre classifier
+    evaluation: ClassifierEvaluation = ClassifierEvaluation.run(spotify.backend(), args.folds, workers=args.evaluation_workers)
+    evaluation.print_report()
@@ -0,0 +1,115 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional
+from urllib.parse import urlsplit
+
+# a single HTTP response, ready to be written to the client
+class HttpResponse:
+    status: int
+    reason: str
+    headers: Dict[str, str]
+    body: bytes
+
+    def __init__(self, status: int, reason: str, body: bytes = b'', content_type: Optional[str] = None, headers: Optional[Dict[str, str]] = None) -> None:
+        self.status = status
+        self.reason = reason
+        self.body = body
+        self.headers = dict(headers) if headers is not None else {}
+        if content_type is not None:
+            self.headers['Content-Type'] = content_type
+
+    def encode(self, include_body: bool, keep_alive: bool) -> bytes:
+        headers: Dict[str, str] = dict(self.headers)
+        headers['Content-Length'] = str(len(self.body))
+        headers['Connection'] = 'keep-alive' if keep_alive else 'close'
+        head: str = f'HTTP/1.1 {self.status} {self.reason}\r\n'
+        head += ''.join(f'{name}: {value}\r\n' for name, value in headers.items())
+        head += '\r\n'
+        return head.encode('latin-1') + (self.body if include_body else b'')
+
+    @staticmethod
+    def text(status: int, reason: str, message: str) -> 'HttpResponse':
+        return HttpResponse(status, reason, message.encode('utf-8'), 'text/plain; charset=utf-8')
+
+# a request read from an HTTP connection. The path is the target without its query string and trailing slashes
+class HttpRequest:
+    method: str
+    target: str
+    path: str
+    # lower-case header names
+    headers: Dict[str, str]
+    body: bytes
+
+    def __init__(self, method: str, target: str, headers: Dict[str, str], body: bytes) -> None:
+        self.method = method
+        self.target = target
+        self.path = urlsplit(target).path.rstrip('/')
+        self.headers = headers
+        self.body = body
+
+# answers the requests of a (keep-alive) HTTP/1.1 connection one after another with the handler, until the client
+# closes it or asks to. Request lines and headers longer than the limit of the stream reader are answered with
+# 414 and 431. Without max_body_bytes, request bodies are discarded as they arrive (so that they are never read as
+# the next request), and chunked bodies close the connection after the response. With max_body_bytes, bodies are
+# read for the handler: larger ones are answered with 413, chunked ones with 411, and the connection is closed
+async def serve_http_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, handler: Callable[[HttpRequest], Awaitable[HttpResponse]], max_body_bytes: Optional[int] = None) -> None:
+    try:
+        while True:
+            try:
+                request_line: bytes = await reader.readline()
+            except ValueError:
+                # the request line exceeds the limit of the stream reader
+                writer.write(HttpResponse.text(414, 'URI Too Long', 'The request line is too long').encode(True, False))
+                break
+            if not request_line:
+                break
+            parts: List[str] = request_line.decode('latin-1').strip().split()
+            headers: Dict[str, str] = {}
+            try:
+                while True:
+                    line: bytes = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+            except ValueError:
+                writer.write(HttpResponse.text(431, 'Request Header Fields Too Large', 'A header line is too long').encode(True, False))
+                break
+            if len(parts) != 3:
+                writer.write(HttpResponse.text(400, 'Bad Request', 'Malformed request line').encode(True, False))
+                break
+            method, target, http_version = parts
+            keep_alive: bool = headers.get('connection', '').lower() != 'close' and http_version == 'HTTP/1.1'
+            body: bytes = b''
+            if 'transfer-encoding' in headers:
+                if max_body_bytes is not None:
+                    writer.write(HttpResponse.text(411, 'Length Required', 'Chunked request bodies are not supported').encode(True, False))
+                    break
+                keep_alive = False
+            else:
+                try:
+                    content_length: int = int(headers.get('content-length', '0'))
+                    if content_length < 0:
+                        raise ValueError(content_length)
+                except ValueError:
+                    writer.write(HttpResponse.text(400, 'Bad Request', 'Malformed Content-Length').encode(True, False))
+                    break
+                if max_body_bytes is None:
+                    while content_length > 0:
+                        discarded: bytes = await reader.read(min(content_length, 65536))
+                        if not discarded:
+                            raise asyncio.IncompleteReadError(discarded, content_length)
+                        content_length -= len(discarded)
+                elif content_length > max_body_bytes:
+                    writer.write(HttpResponse.text(413, 'Payload Too Large', f'Request bodies are limited to {max_body_bytes} bytes').encode(True, False))
+                    break
+                else:
+                    body = await reader.readexactly(content_length)
+            response: HttpResponse = await handler(HttpRequest(method, target, headers, body))
+            writer.write(response.encode(method != 'HEAD', keep_alive))
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
@@ -0,0 +1,190 @@
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+import numpy as np
+from analyzers.models.duration_genre_classifier_model import DurationGenreClassifierModel
+from server.http_connection import HttpResponse, serve_http_connection
+
+# latencies and batch sizes of the inference server. Latencies are kept for the most recent requests only,
+# batch sizes are counted in power-of-two buckets (1, 2, 3-4, 5-8, ...)
+class InferenceMetrics:
+    __latencies: Deque[float]
+    __batch_sizes: Dict[int, int]
+    __requests: int
+    __batches: int
+
+    def __init__(self, max_samples: int = 10000) -> None:
+        self.__latencies = deque(maxlen=max_samples)
+        self.__batch_sizes = {}
+        self.__requests = 0
+        self.__batches = 0
+
+    def record_batch(self, size: int, latencies: List[float]) -> None:
+        self.__batches += 1
+        self.__requests += size
+        bucket: int = 1 << max(0, (size - 1).bit_length())
+        self.__batch_sizes[bucket] = self.__batch_sizes.get(bucket, 0) + 1
+        self.__latencies.extend(latencies)
+
+    def to_dict(self) -> Dict[str, Any]:
+        latencies: np.ndarray = np.array(self.__latencies, dtype=np.float64) * 1000
+        percentiles: Dict[str, Optional[float]] = {
+            name: (float(np.percentile(latencies, q)) if len(latencies) > 0 else None)
+            for name, q in [('p50', 50), ('p90', 90), ('p99', 99), ('p999', 99.9), ('max', 100)]
+        }
+        return {
+            'requests': self.__requests,
+            'batches': self.__batches,
+            'mean_batch_size': self.__requests / self.__batches if self.__batches > 0 else None,
+            'latency_ms': percentiles,
+            # upper bound of the bucket -> number of batches
+            'batch_size_histogram': {str(bucket): count for bucket, count in sorted(self.__batch_sizes.items())}
+        }
+
+# a request waiting to be classified in the next batch
+class PendingClassification:
+    duration_ms: float
+    episodes: float
+    future: asyncio.Future
+    enqueued_at: float
+
+    def __init__(self, duration_ms: float, episodes: float, future: asyncio.Future) -> None:
+        self.duration_ms = duration_ms
+        self.episodes = episodes
+        self.future = future
+        self.enqueued_at = time.perf_counter()
+
+# serves the genre classifier over HTTP (on a TCP port and/or a Unix socket). Incoming requests are queued and
+# classified together (DurationGenreClassifierModel.classify_many) as soon as max_batch_size requests are waiting,
+# or max_batch_delay_ms after the first request of the batch arrived, whichever comes first.
+# Routes:
+#   POST /classify  -> body {"duration_ms": ..., "episodes": ...} (or a list of them),
+#                      answers {"genre": ..., "confidence": ...} (or a list of them)
+#   GET /metrics    -> JSON latency percentiles and the batch size histogram
+class InferenceServer:
+    __model: DurationGenreClassifierModel
+    __host: Optional[str]
+    __port: int
+    __unix_socket: Optional[str]
+    __max_batch_size: int
+    __max_batch_delay: float
+    # the largest request body read (larger ones are rejected)
+    __max_body_bytes: int
+    __queue: Optional['asyncio.Queue[PendingClassification]'] = None
+    __metrics: InferenceMetrics
+
+    # host None only serves on the Unix socket
+    def __init__(self, model: DurationGenreClassifierModel, host: Optional[str] = '127.0.0.1', port: int = 8081, unix_socket: Optional[str] = None, max_batch_size: int = 256, max_batch_delay_ms: float = 2.0, max_body_bytes: int = 16 * 1024 ** 2) -> None:
+        if max_batch_size < 1:
+            raise Exception('max_batch_size must be at least 1')
+        if host is None and unix_socket is None:
+            raise Exception('The inference server needs a host or a Unix socket to listen on')
+        self.__model = model
+        self.__host = host
+        self.__port = port
+        self.__unix_socket = unix_socket
+        self.__max_batch_size = max_batch_size
+        self.__max_batch_delay = max_batch_delay_ms / 1000
+        self.__max_body_bytes = max_body_bytes
+        self.__metrics = InferenceMetrics()
+
+    def metrics(self) -> InferenceMetrics:
+        return self.__metrics
+
+    def serve_forever(self) -> None:
+        try:
+            asyncio.run(self.__serve())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if self.__unix_socket is not None and os.path.exists(self.__unix_socket):
+                os.remove(self.__unix_socket)
+
+    async def __serve(self) -> None:
+        self.__queue = asyncio.Queue()
+        servers: List[asyncio.AbstractServer] = []
+        if self.__host is not None:
+            servers.append(await asyncio.start_server(self.__handle_connection, self.__host, self.__port))
+            print(f'Serving the genre classifier on http://{self.__host}:{self.__port}/classify')
+        if self.__unix_socket is not None:
+            if os.path.exists(self.__unix_socket):
+                os.remove(self.__unix_socket)
+            servers.append(await asyncio.start_unix_server(self.__handle_connection, self.__unix_socket))
+            print(f'Serving the genre classifier on unix:{self.__unix_socket}')
+        print(f'Batching up to {self.__max_batch_size} requests within {self.__max_batch_delay * 1000:g} ms')
+        batcher: asyncio.Task = asyncio.create_task(self.__run_batches())
+        try:
+            await asyncio.gather(*[server.serve_forever() for server in servers])
+        finally:
+            batcher.cancel()
+
+    # collects requests until the batch is full or its deadline has passed, then classifies the whole batch at once
+    async def __run_batches(self) -> None:
+        assert self.__queue is not None
+        loop = asyncio.get_running_loop()
+        while True:
+            batch: List[PendingClassification] = [await self.__queue.get()]
+            deadline: float = loop.time() + self.__max_batch_delay
+            while len(batch) < self.__max_batch_size:
+                # take everything that is already waiting without yielding to the event loop
+                while len(batch) < self.__max_batch_size and not self.__queue.empty():
+                    batch.append(self.__queue.get_nowait())
+                remaining: float = deadline - loop.time()
+                if len(batch) >= self.__max_batch_size or remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.__queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            self.__classify(batch)
+
+    def __classify(self, batch: List[PendingClassification]) -> None:
+        try:
+            genres, confidences = self.__model.classify_many(
+                np.array([pending.duration_ms for pending in batch], dtype=np.float64),
+                np.array([pending.episodes for pending in batch], dtype=np.float64))
+        except Exception as e:
+            for pending in batch:
+                if not pending.future.done():
+                    pending.future.set_exception(e)
+            return
+        finished: float = time.perf_counter()
+        for pending, genre, confidence in zip(batch, genres, confidences):
+            # the client may have disconnected in the meantime
+            if not pending.future.done():
+                pending.future.set_result((str(genre), float(confidence)))
+        self.__metrics.record_batch(len(batch), [finished - pending.enqueued_at for pending in batch])
+
+    async def __classify_one(self, duration_ms: float, episodes: float) -> Tuple[str, float]:
+        assert self.__queue is not None
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.__queue.put_nowait(PendingClassification(duration_ms, episodes, future))
+        return await future
+
+    async def __handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        await serve_http_connection(reader, writer, lambda request: self.__dispatch(request.method, request.path, request.body), self.__max_body_bytes)
+
+    async def __dispatch(self, method: str, path: str, body: bytes) -> HttpResponse:
+        if path == '/metrics':
+            if method not in ('GET', 'HEAD'):
+                return HttpResponse(405, 'Method Not Allowed', headers={'Allow': 'GET, HEAD'})
+            return HttpResponse(200, 'OK', json.dumps(self.__metrics.to_dict(), indent=2).encode('utf-8'), 'application/json', {'Cache-Control': 'no-store'})
+        if path != '/classify':
+            return HttpResponse.text(404, 'Not Found', f'Unknown resource {path}')
+        if method != 'POST':
+            return HttpResponse(405, 'Method Not Allowed', headers={'Allow': 'POST'})
+        try:
+            request = json.loads(body)
+            podcasts: List[Dict[str, Any]] = request if isinstance(request, list) else [request]
+            inputs: List[Tuple[float, float]] = [(float(podcast['duration_ms']), float(podcast['episodes'])) for podcast in podcasts]
+        except (ValueError, TypeError, KeyError):
+            return HttpResponse.text(400, 'Bad Request', 'Expected {"duration_ms": <number>, "episodes": <number>} or a list of them')
+        try:
+            results: List[Tuple[str, float]] = await asyncio.gather(*[self.__classify_one(duration_ms, episodes) for duration_ms, episodes in inputs])
+        except Exception as e:
+            return HttpResponse.text(500, 'Internal Server Error', f'Failed to classify: {e}')
+        answers: List[Dict[str, Any]] = [{'genre': genre, 'confidence': confidence} for genre, confidence in results]
+        return HttpResponse(200, 'OK', json.dumps(answers if isinstance(request, list) else answers[0]).encode('utf-8'), 'application/json')
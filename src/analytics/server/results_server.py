@@ -0,0 +1,227 @@
+import asyncio
+import hashlib
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple, TypeVar
+from urllib.parse import unquote
+from pandas import DataFrame
+from analyzers.internals.analyzer_result import AnalyzerResult, AnalyzerResultModel
+from server.http_connection import HttpRequest, HttpResponse, serve_http_connection
+
+T = TypeVar('T')
+
+# the computed (and not yet serialized) result of a capability for one database version
+class CachedCapability:
+    result: AnalyzerResult
+    # serialized representations of the result by format (png, json, arrow, or '<visualization>.png')
+    encoded: Dict[str, bytes]
+
+    def __init__(self, result: AnalyzerResult) -> None:
+        self.result = result
+        self.encoded = {}
+
+# serves the results of all capabilities of a PodcastAnalytics instance over HTTP.
+# results are computed on demand, cached in memory per database version and answered
+# with an ETag, so clients re-polling with If-None-Match get a 304 without any computation.
+# Routes:
+#   GET /capabilities                           -> JSON list of all capabilities
+#   GET /results/<capability>.png               -> the rendered figure
+#   GET /results/<capability>.json              -> the data frame as JSON records
+#   GET /results/<capability>.arrow             -> the data frame as an Arrow IPC stream (requires pyarrow)
+#   GET /results/<capability>/<visualization>.png -> a model visualization of the capability
+class ResultsServer:
+    __capabilities: Callable[[], Dict[str, Callable[[], AnalyzerResult]]]
+    __db_version: Callable[[], str]
+    __style: str
+    __host: str
+    __port: int
+    __max_concurrency: int
+    __executor: ThreadPoolExecutor
+    __semaphore: Optional[asyncio.Semaphore] = None
+    __cache: Dict[str, CachedCapability]
+    __cache_version: Optional[str] = None
+    # in-flight computations, keyed by '<capability>' or '<capability>/<format>' so that concurrent requests share one computation
+    __pending: Dict[str, asyncio.Future]
+
+    def __init__(self, capabilities: Callable[[], Dict[str, Callable[[], AnalyzerResult]]], db_version: Callable[[], str], style: str, host: str = '127.0.0.1', port: int = 8080, max_concurrency: int = 2) -> None:
+        if max_concurrency < 1:
+            raise Exception('max_concurrency must be at least 1')
+        self.__capabilities = capabilities
+        self.__db_version = db_version
+        self.__style = style
+        self.__host = host
+        self.__port = port
+        self.__max_concurrency = max_concurrency
+        self.__executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='results-server')
+        self.__cache = {}
+        self.__pending = {}
+
+    def serve_forever(self) -> None:
+        try:
+            asyncio.run(self.__serve())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.__executor.shutdown(wait=False, cancel_futures=True)
+
+    async def __serve(self) -> None:
+        self.__semaphore = asyncio.Semaphore(self.__max_concurrency)
+        server = await asyncio.start_server(self.__handle_connection, self.__host, self.__port)
+        print(f'Serving results on http://{self.__host}:{self.__port}/capabilities (max. {self.__max_concurrency} concurrent computations)')
+        async with server:
+            await server.serve_forever()
+
+    async def __handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        await serve_http_connection(reader, writer, self.__handle_request)
+
+    async def __handle_request(self, request: HttpRequest) -> HttpResponse:
+        if request.method not in ('GET', 'HEAD'):
+            response = HttpResponse.text(405, 'Method Not Allowed', f'Method {request.method} is not supported')
+            response.headers['Allow'] = 'GET, HEAD'
+            return response
+        return await self.__dispatch(request.path, request.headers)
+
+    async def __dispatch(self, path: str, headers: Dict[str, str]) -> HttpResponse:
+        segments: List[str] = [unquote(segment) for segment in path.strip('/').split('/') if segment != '']
+        if len(segments) == 0 or segments == ['capabilities']:
+            return self.__list_capabilities(headers)
+        if segments[0] != 'results' or len(segments) not in (2, 3):
+            return HttpResponse.text(404, 'Not Found', f'Unknown resource {path}')
+        name, _, format = segments[1].rpartition('.')
+        if len(segments) == 3:
+            # model visualizations are only available as images
+            visualization, _, visualization_format = segments[2].rpartition('.')
+            name, format = segments[1], f'{visualization}.{visualization_format}'
+            if visualization_format != 'png':
+                return HttpResponse.text(404, 'Not Found', f'Unknown resource {path}')
+        elif format not in ('png', 'json', 'arrow'):
+            return HttpResponse.text(404, 'Not Found', f'Unknown format \'{format}\'')
+        if name not in self.__capabilities():
+            return HttpResponse.text(404, 'Not Found', f'Unknown capability \'{name}\'')
+        version: str = self.__db_version()
+        etag: str = self.__etag(name, format, version)
+        # unchanged results are answered without touching the cache or the database
+        if self.__not_modified(headers, etag):
+            return HttpResponse(304, 'Not Modified', headers={'ETag': etag})
+        try:
+            body: bytes = await self.__get_or_compute(name, format, version)
+        except LookupError as e:
+            return HttpResponse.text(404, 'Not Found', str(e))
+        except ImportError as e:
+            return HttpResponse.text(501, 'Not Implemented', str(e))
+        except Exception as e:
+            return HttpResponse.text(500, 'Internal Server Error', f'Failed to compute \'{name}\': {e}')
+        return HttpResponse(200, 'OK', body, self.__content_type(format), {'ETag': etag, 'Cache-Control': 'no-cache'})
+
+    def __list_capabilities(self, headers: Dict[str, str]) -> HttpResponse:
+        version: str = self.__db_version()
+        etag: str = self.__etag('capabilities', 'json', version)
+        if self.__not_modified(headers, etag):
+            return HttpResponse(304, 'Not Modified', headers={'ETag': etag})
+        capabilities = [{
+            'name': name,
+            'png': f'/results/{name}.png',
+            'json': f'/results/{name}.json',
+            'arrow': f'/results/{name}.arrow'
+        } for name in sorted(self.__capabilities().keys())]
+        body: bytes = json.dumps({'version': version, 'capabilities': capabilities}, indent=2).encode('utf-8')
+        return HttpResponse(200, 'OK', body, 'application/json', {'ETag': etag})
+
+    def __not_modified(self, headers: Dict[str, str], etag: str) -> bool:
+        return etag in [tag.strip() for tag in headers.get('if-none-match', '').split(',')]
+
+    def __etag(self, name: str, format: str, version: str) -> str:
+        # results are a pure function of the capability, the database version and the style
+        digest: str = hashlib.sha1(f'{version}|{self.__style}|{name}|{format}'.encode('utf-8')).hexdigest()
+        return f'"{digest[:20]}"'
+
+    def __content_type(self, format: str) -> str:
+        if format == 'json':
+            return 'application/json'
+        if format == 'arrow':
+            return 'application/vnd.apache.arrow.stream'
+        return 'image/png'
+
+    async def __get_or_compute(self, name: str, format: str, version: str) -> bytes:
+        if self.__cache_version != version:
+            # a new database version invalidates every cached result
+            self.__cache.clear()
+            self.__cache_version = version
+        cached: Optional[CachedCapability] = self.__cache.get(name)
+        # requests for another database version never join a computation of the version they were not made for
+        if cached is None:
+            cached = await self.__single_flight(f'{version}/{name}', lambda: self.__compute(name, version))
+        if format not in cached.encoded:
+            capability: CachedCapability = cached
+            await self.__single_flight(f'{version}/{name}/{format}', lambda: self.__encode(name, capability, format))
+        return cached.encoded[format]
+
+    # runs func on a worker thread, unless a computation with the same key is already running.
+    # In that case the result of the running computation is awaited instead of computing it twice
+    async def __single_flight(self, key: str, func: Callable[[], T]) -> T:
+        pending: Optional[asyncio.Future] = self.__pending.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.__pending[key] = future
+        try:
+            assert self.__semaphore is not None
+            async with self.__semaphore:
+                result: T = await asyncio.get_running_loop().run_in_executor(self.__executor, func)
+            future.set_result(result)
+        except BaseException as e:
+            future.set_exception(e)
+            # the exception is re-raised below, mark it as retrieved in case nobody else is waiting
+            future.exception()
+            raise
+        finally:
+            del self.__pending[key]
+        return result
+
+    # runs on a worker thread
+    def __compute(self, name: str, version: str) -> CachedCapability:
+        cached = CachedCapability(self.__capabilities()[name]())
+        # only cache results that still belong to the current database version
+        if self.__cache_version == version:
+            self.__cache[name] = cached
+        return cached
+
+    # runs on a worker thread
+    def __encode(self, name: str, cached: CachedCapability, format: str) -> None:
+        if format == 'json':
+            encoded: bytes = self.__to_json(cached.result.get_data_frame())
+        elif format == 'arrow':
+            encoded = self.__to_arrow(cached.result.get_data_frame())
+        elif format == 'png':
+            encoded = self.__render(cached.result)
+        else:
+            encoded = self.__render_visualization(name, cached.result, format.rpartition('.')[0])
+        cached.encoded[format] = encoded
+
+    def __render(self, result: AnalyzerResult) -> bytes:
+        # figures are rendered without pyplot, so requests are rendered concurrently (see FigureStyle)
+        with result.render() as rendered_result:
+            return rendered_result.to_bytes('png')
+
+    def __render_visualization(self, name: str, result: AnalyzerResult, visualization_name: str) -> bytes:
+        model: Optional[AnalyzerResultModel] = result.get_model()
+        visualizations: List[Tuple[AnalyzerResult, str]] = model.get_visualizations() if model is not None else []
+        for visualization, visualization_name_candidate in visualizations:
+            if visualization_name_candidate == visualization_name:
+                return self.__render(visualization)
+        raise LookupError(f'Capability \'{name}\' has no visualization \'{visualization_name}\'')
+
+    def __to_json(self, data: DataFrame) -> bytes:
+        return data.to_json(orient='records', date_format='iso').encode('utf-8')
+
+    def __to_arrow(self, data: DataFrame) -> bytes:
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise ImportError('Arrow output requires the optional \'pyarrow\' package')
+        table = pa.Table.from_pandas(data, preserve_index=False)
+        sink = io.BytesIO()
+        with pa.ipc.new_stream(sink, table.schema) as stream:
+            stream.write_table(table)
+        return sink.getvalue()